@@ -0,0 +1,202 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import traceback
+import pandas as pd
+
+## Run simulate and calibrate jobs for many workbooks on a pool of worker
+## processes. The manifest is a JSON file with a list of jobs, or an object
+## with "defaults" applied to every job and a "jobs" list:
+##
+## {"defaults" : {"task" : "calibrate", "method" : "Nelder-Mead", "maxiter" : 500},
+##  "jobs" : [{"name" : "mwi", "workbook" : "inputs/mwi-2023-inputs.xlsx",
+##             "ancprev" : "inputs/mwi-2023-anc-prev.csv", "svyprev" : "inputs/mwi-2023-hiv-prev.csv"},
+##            {"name" : "example", "task" : "simulate", "workbook" : "inputs/example-inputs.xlsx"}]}
+##
+## Job fields:
+##   name      output subdirectory name (default: workbook file name and job number).
+##             Names must be unique and may not contain path separators or ".."
+##   task      "simulate" or "calibrate" (default "simulate")
+##   workbook  Excel model input workbook
+##   ancprev, svyprev, alldeaths  calibration data CSV files (calibrate only)
+##   method, maxiter              optimization options (calibrate only)
+##   plots     true to save fit plots (calibrate only, default false). Figures are
+##             rendered by separate processes so they do not hold up other jobs.
+##   plot_formats, plot_dpi       figure file formats (default ["tiff"]) and resolution (default 600)
+##   store     results store directory to add projection outputs to, with the job
+##             name as the scenario (simulate only; see src/goals_store.py)
+##
+## Each worker imports the model and analysis packages once when it starts,
+## and keeps the raw inputs and fitting parameters of each workbook it reads, so
+## jobs that share a workbook do not parse it again on the same worker.
+
+TASKS = ('simulate', 'calibrate')
+
+_inputs = {} # (workbook path, modification time) -> raw inputs, per worker
+_fitting = {} # (workbook path, modification time) -> fitting parameters, per worker
+
+def init_worker():
+    global calibrate, simulate, Model, Plots, Store
+    import calibrate
+    import simulate
+    import src.goals_plots as Plots
+    import src.goals_store as Store
+    from src.goals_model import Model
+
+def read_inputs(xlsx_name):
+    """! Read raw inputs from a workbook, reusing earlier reads by this worker"""
+    key = (os.path.abspath(xlsx_name), os.path.getmtime(xlsx_name))
+    if key not in _inputs:
+        _inputs[key] = Model().read_xlsx(xlsx_name)
+    return _inputs[key]
+
+def read_fitting(xlsx_name):
+    """! Read fitting parameters from a workbook, reusing earlier reads by this worker"""
+    key = (os.path.abspath(xlsx_name), os.path.getmtime(xlsx_name))
+    if key not in _fitting:
+        _fitting[key] = calibrate.read_fitting_pars(xlsx_name)
+    return _fitting[key]
+
+def run_simulate(job, job_path):
+    model = Model()
+    model.init_from_inputs(read_inputs(job['workbook']))
+    model.project(model.year_final)
+    if job.get('store'):
+        Store.ResultsStore(job['store']).add(model, scenario=job['name'], workbook=job['workbook'])
+    else:
+        simulate.write_frames(simulate.build_frames(model), job_path)
+
+def run_calibrate(job, job_path):
+    fitter = calibrate.GoalsFitter(job['workbook'], job.get('ancprev'), job.get('svyprev'), job.get('alldeaths'),
+                                   inputs=read_inputs(job['workbook']), fitting=read_fitting(job['workbook']))
+    pars, diag = fitter.calibrate(method=job.get('method', 'Nelder-Mead'), maxiter=job.get('maxiter'))
+    fitter.likelihood(diag.x) # leave the model projected at the fitted parameters
+    pd.DataFrame({'Parameter' : list(pars.keys()),
+                  'Value'     : [val.fitted_value for val in pars.values()]}).to_csv(os.path.join(job_path, 'fitted-parameters.csv'), index=False)
+    with open(os.path.join(job_path, 'fit-summary.json'), 'w') as fh:
+        json.dump({'posterior' : -float(diag.fun), 'evaluations' : int(diag.nfev), 'converged' : bool(diag.success)}, fh, indent=2)
+    if job.get('plots'):
+        bundle_name = os.path.join(job_path, 'fit-plots.pkl')
+        Plots.write_bundle(fitter.plot_bundle(), bundle_name)
+        return bundle_name
+
+def run_job(job, output_path):
+    """! Worker task: run one job and report its outcome. Exceptions are caught
+    and reported so that one failed job does not stop the batch.
+    @return a dict with the job name, status, wall time, worker process id, error message
+    and the name of the figure bundle to render, if any
+    """
+    time_start = time.perf_counter()
+    status, error, bundle = 'ok', '', None
+    try:
+        job_path = os.path.join(output_path, job['name'])
+        os.makedirs(job_path, exist_ok=True)
+        if job['task'] == 'simulate':
+            run_simulate(job, job_path)
+        else:
+            bundle = run_calibrate(job, job_path)
+    except Exception:
+        status, error = 'failed', traceback.format_exc()
+    return {'name'    : job['name'],
+            'task'    : job['task'],
+            'status'  : status,
+            'seconds' : time.perf_counter() - time_start,
+            'pid'     : os.getpid(),
+            'error'   : error,
+            'bundle'  : bundle}
+
+def valid_name(name):
+    """! Check that a job name is a single directory name, so job outputs stay inside the output path"""
+    return (isinstance(name, str) and name not in ('', '.') and '..' not in name
+            and not any(sep in name for sep in ('/', '\\')))
+
+def load_manifest(manifest_name):
+    """! Read a manifest and fill in job defaults
+    @return a list of job dicts
+    """
+    with open(manifest_name) as fh:
+        manifest = json.load(fh)
+    defaults = {}
+    if isinstance(manifest, dict):
+        defaults = manifest.get('defaults', {})
+        manifest = manifest['jobs']
+
+    jobs = []
+    for k, entry in enumerate(manifest):
+        job = {'task' : 'simulate'} | defaults | entry
+        if 'workbook' not in job:
+            raise ValueError('Job %d has no workbook' % (k))
+        if job['task'] not in TASKS:
+            raise ValueError('Job %d has unrecognized task %s' % (k, job['task']))
+        job.setdefault('name', '%s-%d' % (os.path.splitext(os.path.basename(job['workbook']))[0], k))
+        if not valid_name(job['name']):
+            raise ValueError('Job %d name %r cannot be used as a directory name' % (k, job['name']))
+        jobs.append(job)
+
+    names = [job['name'] for job in jobs]
+    if len(set(names)) < len(names):
+        raise ValueError('Job names must be unique')
+    return jobs
+
+def setup_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('manifest',    help="JSON file listing the jobs to run")
+    parser.add_argument('output_path', help="Directory to write job outputs and the batch summary to")
+    parser.add_argument('--jobs',      help="Maximum number of jobs to run at once (default: one per CPU)", type=int)
+    parser.add_argument('--renderers', help="Number of processes rendering fit figures", type=int, default=1)
+    return parser
+
+def main(manifest_name, output_path, max_jobs=None, num_renderers=1):
+    jobs = load_manifest(manifest_name)
+    os.makedirs(output_path, exist_ok=True)
+
+    # Submit jobs grouped by workbook so that workers are more likely to reuse inputs they have read
+    jobs = sorted(jobs, key=lambda job : os.path.abspath(job['workbook']))
+
+    time_start = time.perf_counter()
+    results = []
+    renders = {}
+    renderer = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_jobs, initializer=init_worker) as executor:
+        futures = {executor.submit(run_job, job, output_path) : job for job in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception: # the worker process died
+                result = {'name' : job['name'], 'task' : job['task'], 'status' : 'failed', 'seconds' : float('nan'), 'pid' : -1,
+                          'error' : traceback.format_exc(), 'bundle' : None}
+            sys.stdout.write("%-32s %-10s %-7s %8.1fs\n" % (result['name'], result['task'], result['status'], result['seconds']))
+            results.append(result)
+            if result['bundle'] is not None:
+                if renderer is None:
+                    import src.goals_plots as Plots # deferred so batches without figures skip plotting packages
+                    renderer = Plots.PlotRenderer(num_renderers)
+                renders[renderer.submit(result['bundle'], os.path.dirname(result['bundle']),
+                                        job.get('plot_formats', ('tiff',)), job.get('plot_dpi', 600))] = result
+
+    if renderer is not None:
+        for future in concurrent.futures.as_completed(renders):
+            if future.exception() is not None:
+                result = renders[future]
+                result['status'] = 'failed'
+                result['error'] = 'Rendering fit figures failed: %r' % (future.exception())
+        renderer.close()
+
+    summary = pd.DataFrame(results).sort_values('name')
+    summary.to_csv(os.path.join(output_path, 'batch-summary.csv'), index=False)
+
+    num_failed = (summary['status'] != 'ok').sum()
+    sys.stdout.write("%d jobs, %d failed, %0.1fs elapsed, %0.1fs total job time\n"
+                     % (len(summary), num_failed, time.perf_counter() - time_start, summary['seconds'].sum()))
+    for row in summary[summary['status'] != 'ok'].itertuples():
+        sys.stderr.write("+=+ %s failed +=+\n%s\n" % (row.name, row.error))
+    return 1 if num_failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.stderr.write("Process %d\n" % (os.getpid()))
+    args = setup_parser().parse_args()
+    sys.exit(main(args.manifest, args.output_path, args.jobs, args.renderers))
@@ -0,0 +1,209 @@
+import argparse
+import functools
+import os
+import pandas as pd
+import pickle
+import subprocess
+import sys
+import tempfile
+import openpyxl as xlsx
+import src.goals_batch as Batch
+import src.goals_bench as Bench
+import src.goals_const as CONST
+import src.goals_utils as Utils
+import src.goals_window as Window
+import src.goals_proj.x64.Release.goals_proj as GoalsProj
+from src.goals_model import Model
+
+## Benchmark suite for the projection and calibration hot paths. Cases run
+## against the bundled input files. Typical use:
+##   python benchmark.py --save bench-baseline.json      # record a baseline
+##   python benchmark.py --compare bench-baseline.json   # check for regressions
+## Baselines are machine-specific, so record one on the machine used to compare.
+
+XLSX_PARTNER = "inputs/example-inputs.xlsx"         # mechanistic (partnership-based) incidence
+XLSX_DIRECT  = "tests/test-external-clhiv.xlsx"     # direct incidence
+XLSX_FIT     = "inputs/mwi-2023-inputs.xlsx"
+CSV_ANC      = "inputs/mwi-2023-anc-prev.csv"
+CSV_HIV      = "inputs/mwi-2023-hiv-prev.csv"
+BATCH_SIZE   = 16                                   # models per batch in project/batch_* cases
+
+## Each xlsx_load_* function paired with the workbook tab it reads
+XLSX_LOADERS = [(Utils.xlsx_load_config,          CONST.XLSX_TAB_CONFIG),
+                (Utils.xlsx_load_epi,             CONST.XLSX_TAB_EPI),
+                (Utils.xlsx_load_popsize,         CONST.XLSX_TAB_POPSIZE),
+                (Utils.xlsx_load_pasfrs,          CONST.XLSX_TAB_PASFRS),
+                (Utils.xlsx_load_migr,            CONST.XLSX_TAB_MIGR),
+                (Utils.xlsx_load_inci,            CONST.XLSX_TAB_INCI),
+                (Utils.xlsx_load_partner_rates,   CONST.XLSX_TAB_PARTNER),
+                (Utils.xlsx_load_partner_prefs,   CONST.XLSX_TAB_PARTNER),
+                (Utils.xlsx_load_mixing_levels,   CONST.XLSX_TAB_MIXNG_MATRIX),
+                (Utils.xlsx_load_contact_params,  CONST.XLSX_TAB_CONTACT),
+                (Utils.xlsx_load_sti_prev,        CONST.XLSX_TAB_STIPREV),
+                (Utils.xlsx_load_direct_clhiv,    CONST.XLSX_TAB_DIRECT_CLHIV),
+                (Utils.xlsx_load_hiv_fert,        CONST.XLSX_TAB_HIV_FERT),
+                (Utils.xlsx_load_adult_prog,      CONST.XLSX_TAB_ADULT_PROG),
+                (Utils.xlsx_load_adult_art,       CONST.XLSX_TAB_ADULT_ART),
+                (Utils.xlsx_load_mc_uptake,       CONST.XLSX_TAB_MALE_CIRC),
+                (Utils.xlsx_load_likelihood_pars, CONST.XLSX_TAB_LIKELIHOOD),
+                (Utils.xlsx_load_fitting_pars,    CONST.XLSX_TAB_FITTING)]
+
+## Expensive fixtures are created on first use and shared across cases so
+## that only the cases selected on the command line pay for them.
+@functools.cache
+def fixture_model(xlsx_name):
+    model = Model()
+    model.init_from_xlsx(xlsx_name)
+    return model
+
+@functools.cache
+def fixture_projected(xlsx_name):
+    model = fixture_model(xlsx_name)
+    model.invalidate(-1)
+    model.project(model.year_final)
+    return model
+
+@functools.cache
+def fixture_batch(xlsx_name):
+    batch = Batch.BatchModel(BATCH_SIZE)
+    batch.init_from_xlsx(xlsx_name)
+    return batch
+
+@functools.cache
+def fixture_workbook(xlsx_name):
+    return xlsx.load_workbook(filename=xlsx_name, read_only=True)
+
+@functools.cache
+def fixture_config(xlsx_name):
+    return Utils.xlsx_load_config(fixture_workbook(xlsx_name)[CONST.XLSX_TAB_CONFIG])
+
+@functools.cache
+def fixture_fitter():
+    import calibrate # deferred so that projection-only runs do not need the likelihood packages
+    return calibrate.GoalsFitter(XLSX_FIT, CSV_ANC, CSV_HIV, None)
+
+def fixture_hivprev_template():
+    template = pd.read_csv(CSV_HIV)[['Population', 'Gender', 'Year', 'AgeMin', 'AgeMax']]
+    template = template[template['Year'] <= fixture_config(XLSX_FIT)[CONST.CFG_FINAL_YEAR]].reset_index(drop=True)
+    template['Prevalence'] = 0.0
+    return template
+
+def load_tab(loader, tab):
+    loader(fixture_workbook(XLSX_PARTNER)[tab])
+
+def reset_projection(xlsx_name):
+    model = fixture_model(xlsx_name)
+    model.invalidate(-1)
+    return model
+
+def reset_batch(xlsx_name):
+    batch = fixture_batch(xlsx_name)
+    batch.invalidate(-1)
+    return batch
+
+def project_windowed(xlsx_name):
+    inputs = Model().read_xlsx(xlsx_name)
+    store = Window.OutputStore.from_inputs(None, inputs)
+    model = Model()
+    model.init_from_inputs(inputs, store.outputs)
+    Window.project_windowed(model, store, model.year_final, 5)
+    store.close()
+
+def project_serial(batch):
+    for model in batch:
+        model.project(model.year_final)
+
+def pickle_roundtrip(xlsx_name):
+    buffers = []
+    data = pickle.dumps(fixture_model(xlsx_name), protocol=5, buffer_callback=buffers.append)
+    pickle.loads(data, buffers=buffers)
+
+def import_modules(*names):
+    # Fresh interpreter each time: measures worker startup, not cached imports
+    subprocess.run([sys.executable, "-c", "import " + ", ".join(names)], check=True)
+
+def upd_initialize(xlsx_name):
+    cfg_opts = fixture_config(xlsx_name)
+    proj = GoalsProj.Projection(cfg_opts[CONST.CFG_FIRST_YEAR], cfg_opts[CONST.CFG_FINAL_YEAR])
+    proj.initialize(cfg_opts[CONST.CFG_UPD_NAME])
+
+def fill_template(template):
+    import calibrate
+    calibrate.fill_hivprev_template(fixture_projected(XLSX_FIT), template)
+
+def fit_likelihood():
+    fitter = fixture_fitter()
+    p_init = [fitter._pardat[key].initial_value for key in fitter._par_keys]
+    fitter.likelihood(p_init)
+
+def export_csv(xlsx_name):
+    import simulate
+    with tempfile.TemporaryDirectory() as data_path:
+        simulate.write_frames(simulate.build_frames(fixture_projected(xlsx_name)), data_path)
+
+def partner_rates(xlsx_name):
+    model = fixture_model(xlsx_name)
+    model.calc_partner_rates(model.partner_time_trend, model.partner_age_params, model.partner_pop_ratios)
+
+def update_partner_rates(xlsx_name):
+    model = fixture_model(xlsx_name)
+    model.partner_pop_ratios[CONST.POP_FSW-1,CONST.SEX_FEMALE] *= 1.0001 # one calibrated scalar changes
+    model.update_partner_rates()
+
+def partner_prefs(xlsx_name):
+    age_prefs, pop_prefs, p_married = Utils.xlsx_load_partner_prefs(fixture_workbook(xlsx_name)[CONST.XLSX_TAB_PARTNER])
+    fixture_model(xlsx_name).calc_partner_prefs(age_prefs)
+
+def setup_cases():
+    cases = [Bench.Case("init_from_xlsx/partnership", lambda : Model().init_from_xlsx(XLSX_PARTNER), repeat=3),
+             Bench.Case("init_from_xlsx/direct_inci", lambda : Model().init_from_xlsx(XLSX_DIRECT),  repeat=3),
+             Bench.Case("upd_initialize",             lambda : upd_initialize(XLSX_PARTNER)),
+             Bench.Case("pickle_roundtrip",           lambda : pickle_roundtrip(XLSX_PARTNER)),
+             Bench.Case("startup/core",               lambda : import_modules("src.goals_model", "src.goals_results"), repeat=5),
+             Bench.Case("startup/calibrate",          lambda : import_modules("calibrate"), repeat=5)]
+
+    for loader, tab in XLSX_LOADERS:
+        cases.append(Bench.Case(loader.__name__, functools.partial(load_tab, loader, tab)))
+
+    cases += [Bench.Case("project/partnership",  lambda m : m.project(m.year_final), setup=lambda : reset_projection(XLSX_PARTNER)),
+              Bench.Case("project/direct_inci",  lambda m : m.project(m.year_final), setup=lambda : reset_projection(XLSX_DIRECT)),
+              Bench.Case("invalidate",           lambda m : m.invalidate(-1), setup=lambda : fixture_model(XLSX_PARTNER)),
+              Bench.Case("project/windowed",     lambda : project_windowed(XLSX_PARTNER), repeat=3),
+              Bench.Case("project/batch_serial", project_serial, setup=lambda : reset_batch(XLSX_PARTNER), repeat=3),
+              Bench.Case("project/batch",        lambda b : b.project(b.year_final), setup=lambda : reset_batch(XLSX_PARTNER), repeat=3),
+              Bench.Case("calc_partner_rates",   lambda : partner_rates(XLSX_PARTNER)),
+              Bench.Case("update_partner_rates", lambda : update_partner_rates(XLSX_PARTNER)),
+              Bench.Case("calc_partner_prefs",   lambda : partner_prefs(XLSX_PARTNER)),
+              Bench.Case("fill_hivprev_template", fill_template, setup=fixture_hivprev_template),
+              Bench.Case("likelihood",           fit_likelihood),
+              Bench.Case("export_csv",           lambda : export_csv(XLSX_PARTNER), repeat=1)]
+    return cases
+
+def setup_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k",          help="Only run cases whose names contain this string", dest="pattern")
+    parser.add_argument("--repeat",    help="Timed repetitions per case", type=int, default=5)
+    parser.add_argument("--save",      help="Store results as a baseline in this JSON file")
+    parser.add_argument("--compare",   help="Compare results to the baseline in this JSON file")
+    parser.add_argument("--tolerance", help="Relative slowdown allowed before flagging a regression", type=float, default=0.2)
+    return parser
+
+def main(pattern, repeat, save_name, compare_name, tolerance):
+    results = Bench.run_cases(setup_cases(), repeat=repeat, pattern=pattern, stream=sys.stdout)
+
+    if save_name:
+        Bench.save_baseline(save_name, results)
+
+    if compare_name:
+        num_slow = 0
+        print("\n%-40s %10s %10s %8s" % ("Case", "Baseline", "Current", "Ratio"))
+        for name, base, curr, ratio, status in Bench.compare(results, Bench.load_baseline(compare_name), tolerance):
+            print("%-40s %9.4fs %9.4fs %8.2f %s" % (name, base, curr, ratio, status))
+            num_slow += status == 'REGRESSION'
+        return 1 if num_slow > 0 else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.stderr.write("Process %d\n" % (os.getpid()))
+    args = setup_parser().parse_args()
+    sys.exit(main(args.pattern, args.repeat, args.save, args.compare, args.tolerance))
@@ -0,0 +1,55 @@
+import argparse
+import functools
+import numpy as np
+import os
+import pandas as pd
+import sys
+import time
+import calibrate
+import src.goals_ensemble as Ensemble
+import src.goals_workers as Workers
+
+QUANTILES = (0.025, 0.25, 0.5, 0.75, 0.975)
+
+def summary_frame(summary, quantiles=QUANTILES):
+    """! Convert an EnsembleSummary to a long-format data frame by indicator, year and sex"""
+    frames = []
+    for name, stats in summary.summary(quantiles).items():
+        num_years, num_sex = stats['mean'].shape
+        frame = pd.DataFrame({'Indicator' : name,
+                              'Year' : np.repeat(np.arange(summary.year_first, summary.year_first + num_years), num_sex),
+                              'Sex'  : np.tile(['Female', 'Male'], num_years),
+                              'Mean' : stats['mean'].flatten(),
+                              'SD'   : stats['sd'].flatten()})
+        for q, val in zip(quantiles, stats['quantiles']):
+            frame['Q%g' % (100 * q)] = val.flatten()
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def setup_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_xlsx',  help="Excel model input workbook")
+    parser.add_argument('output_csv',  help="CSV file to write ensemble summaries to")
+    parser.add_argument('--draws',     help="Number of Latin hypercube draws from the calibration priors", type=int, default=100)
+    parser.add_argument('--samples',   help="Use parameter vectors from this .npy file (e.g., posterior samples) instead of prior draws")
+    parser.add_argument('--workers',   help="Worker processes (default: one per CPU)", type=int)
+    parser.add_argument('--seed',      help="Random number generator seed", type=int)
+    parser.add_argument('--sketch-k',  help="Quantile sketch capacity; larger values are more accurate", type=int, default=128)
+    return parser
+
+def main(par_file, output_csv, num_draws=100, samples_file=None, num_workers=None, seed=None, k=128):
+    time_start = time.time()
+    factory = functools.partial(calibrate.GoalsFitter, par_file, None, None, None)
+    with Workers.FitterPool(factory, num_workers) as pool:
+        if samples_file:
+            draws = np.load(samples_file)
+        else:
+            draws = pool.submit(Ensemble.prior_draws, num_draws, seed).result()
+        summary = Ensemble.run_ensemble(pool, draws, k=k, seed=seed)
+    summary_frame(summary).to_csv(output_csv, index=False)
+    print("%d runs on %d workers in %0.1fs" % (summary.count, pool.num_workers, time.time() - time_start))
+
+if __name__ == "__main__":
+    sys.stderr.write("Process %d\n" % (os.getpid()))
+    args = setup_parser().parse_args()
+    main(args.input_xlsx, args.output_csv, args.draws, args.samples, args.workers, args.seed, args.sketch_k)
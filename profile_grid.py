@@ -0,0 +1,53 @@
+import argparse
+import functools
+import numpy as np
+import os
+import sys
+import time
+import calibrate
+import src.goals_workers as Workers
+
+## Profile likelihood over 1-D or 2-D parameter grids, for checking whether
+## calibrated parameters are identifiable from the data. For example,
+##   python profile_grid.py inputs/mwi-2023-inputs.xlsx grid.jsonl --ancprev inputs/mwi-2023-anc-prev.csv
+##          --grid transmit.f2m=0.001:0.01:10 --grid seed.prev=0.0001:0.01:10
+## Results stream to the output file; rerun the same command to finish an interrupted grid.
+
+def parse_axis(text):
+    """! Parse a grid axis given as name=lo:hi:n or name=v1,v2,..."""
+    name, _, spec = text.partition('=')
+    if ':' in spec:
+        lo, hi, num = spec.split(':')
+        return name, np.linspace(float(lo), float(hi), int(num))
+    return name, np.array([float(val) for val in spec.split(',')])
+
+def setup_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_xlsx',  help="Excel model input workbook")
+    parser.add_argument('output',      help="JSON lines file to stream grid results to")
+    parser.add_argument('--grid',      help="Grid axis as name=lo:hi:n or name=v1,v2,... (repeat for 2-D grids)", action='append', required=True)
+    parser.add_argument("--ancprev",   help="CSV file with HIV prevalence from ANC surveillance")
+    parser.add_argument("--svyprev",   help="CSV file with HIV prevalence from surveys")
+    parser.add_argument("--alldeaths", help="CSV file with all-cause deaths counts")
+    parser.add_argument('--objective', help="Profile the 'posterior' or the 'likelihood'", default='posterior')
+    parser.add_argument('--method',    help="Inner optimization method (see scipy.optimize.minimize)", default='Nelder-Mead')
+    parser.add_argument('--maxiter',   help="Maximum inner optimization iterations per grid point", type=int)
+    parser.add_argument('--workers',   help="Worker processes (default: one per CPU)", type=int)
+    return parser
+
+def main(par_file, output, grid, anc_file=None, hiv_file=None, deaths_file=None, objective='posterior', method='Nelder-Mead',
+         maxiter=None, num_workers=None):
+    time_start = time.time()
+    factory = functools.partial(calibrate.GoalsFitter, par_file, anc_file, hiv_file, deaths_file)
+    Fitter = factory()
+    with Workers.FitterPool(factory, num_workers) as pool:
+        frame = Fitter.profile_grid(pool, grid, output, objective=objective, method=method, maxiter=maxiter)
+    print(frame.to_string(index=False, columns=list(grid.keys()) + ['posterior', 'lhood', 'nfev']))
+    print("%d grid points on %d workers in %0.1fs" % (len(frame.index), pool.num_workers, time.time() - time_start))
+
+if __name__ == "__main__":
+    sys.stderr.write("Process %d\n" % (os.getpid()))
+    args = setup_parser().parse_args()
+    grid = dict(parse_axis(text) for text in args.grid)
+    main(args.input_xlsx, args.output, grid, args.ancprev, args.svyprev, args.alldeaths, args.objective, args.method,
+         args.maxiter, args.workers)
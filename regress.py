@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+import src.goals_golden as Golden
+from src.goals_model import Model
+
+## Golden-output regression check for the bundled workbooks. Record reference
+## outputs once on a trusted build, then check every change against them:
+##   python regress.py --record   # write tests/golden/<workbook>.json
+##   python regress.py            # compare, exit nonzero if any output diverged
+## References hold per-year checksums and summary statistics of every output
+## array, so a check reports the first year and array that differ.
+
+WORKBOOKS   = ["inputs/example-inputs.xlsx", "inputs/mwi-2023-inputs.xlsx", "tests/test-external-clhiv.xlsx"]
+GOLDEN_PATH = "tests/golden"
+
+def golden_name(golden_path, xlsx_name):
+    return os.path.join(golden_path, os.path.splitext(os.path.basename(xlsx_name))[0] + ".json")
+
+def project(xlsx_name):
+    model = Model()
+    model.init_from_xlsx(xlsx_name)
+    model.project(model.year_final)
+    return model
+
+def setup_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workbooks",     help="Workbooks to check (default: the bundled workbooks)", nargs="*")
+    parser.add_argument("--record",      help="Record new reference outputs instead of checking", action="store_true")
+    parser.add_argument("--golden-path", help="Directory holding reference outputs", default=GOLDEN_PATH)
+    parser.add_argument("--rtol",        help="Relative tolerance for summary statistics", type=float, default=1e-9)
+    parser.add_argument("--atol",        help="Absolute tolerance for summary statistics", type=float, default=1e-6)
+    return parser
+
+def main(workbooks, record, golden_path, rtol, atol):
+    os.makedirs(golden_path, exist_ok=True)
+    num_diverged = 0
+    for xlsx_name in workbooks:
+        time_start = time.perf_counter()
+        fp = Golden.fingerprint(project(xlsx_name))
+        file_name = golden_name(golden_path, xlsx_name)
+        if record:
+            Golden.write_fingerprint(fp, file_name)
+            sys.stdout.write("%-36s recorded %s (%0.1fs)\n" % (xlsx_name, file_name, time.perf_counter() - time_start))
+        elif not os.path.exists(file_name):
+            sys.stdout.write("%-36s no reference outputs in %s\n" % (xlsx_name, file_name))
+            num_diverged += 1
+        else:
+            result = Golden.compare(Golden.read_fingerprint(file_name), fp, rtol, atol)
+            sys.stdout.write("%-36s %s (%0.1fs)\n" % (xlsx_name, result.report(), time.perf_counter() - time_start))
+            num_diverged += result.status == Golden.DIVERGED
+    return 1 if num_diverged > 0 else 0
+
+if __name__ == "__main__":
+    args = setup_parser().parse_args()
+    sys.exit(main(args.workbooks or WORKBOOKS, args.record, args.golden_path, args.rtol, args.atol))
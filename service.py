@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import os
+import sys
+import src.goals_service as Service
+
+## Serve scenario projections from warm models on localhost. Example:
+##   python service.py inputs/example-inputs.xlsx --models 4 --port 8765
+## then POST JSON scenarios to http://127.0.0.1:8765/project (see
+## src/goals_service.py for the request format and a Python client helper).
+
+def setup_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('workbooks', help="Excel model input workbooks to serve", nargs='+')
+    parser.add_argument('--models',  help="Initialized models per workbook", type=int, default=2)
+    parser.add_argument('--host',    help="Address to listen on", default='127.0.0.1')
+    parser.add_argument('--port',    help="Port to listen on", type=int, default=8765)
+    return parser
+
+async def serve(pools, host, port):
+    service = Service.ProjectionService(pools)
+    port = await service.start(host, port)
+    sys.stderr.write("Serving %s on http://%s:%d\n" % (", ".join(pools), host, port))
+    await service.serve_forever()
+
+def main(workbooks, num_models, host, port):
+    pools = {}
+    for xlsx_name in workbooks:
+        sys.stderr.write("Initializing %d models from %s\n" % (num_models, xlsx_name))
+        pools[xlsx_name] = Service.ModelPool(xlsx_name, num_models)
+    try:
+        asyncio.run(serve(pools, host, port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.stderr.write("Process %d\n" % (os.getpid()))
+    args = setup_parser().parse_args()
+    main(args.workbooks, args.models, args.host, args.port)
@@ -17,6 +17,31 @@ def array2frame(array, names):
         array_frame = pd.DataFrame({'Value' : array}, index=array_index)['Value']
     return array_frame
 
+def build_frames(model):
+    """! Convert projection outputs to long data frames
+    @param model a projected Goals model
+    @return a dict mapping output CSV file names to data frames
+    """
+    return {"births.csv"           : array2frame(model.births, ['Year', 'Sex']),
+            "births-exposed.csv"   : array2frame(model.births_exposed, ['Year']),
+            "child-neg.csv"        : array2frame(model.pop_child_neg, ['Year', 'Sex', 'Age']),
+            "child-hiv.csv"        : array2frame(model.pop_child_hiv, ['Year', 'Sex', 'Age', 'CD4', 'ART']),
+            "adult-neg.csv"        : array2frame(model.pop_adult_neg, ['Year', 'Sex', 'Age', 'Risk']),
+            "adult-hiv.csv"        : array2frame(model.pop_adult_hiv, ['Year', 'Sex', 'Age', 'Risk', 'CD4', 'ART']),
+            "deaths-child-neg.csv" : array2frame(model.deaths_child_neg, ['Year', 'Sex', 'Age']),
+            "deaths-child-hiv.csv" : array2frame(model.deaths_child_hiv, ['Year', 'Sex', 'Age', 'CD4', 'ART']),
+            "deaths-adult-neg.csv" : array2frame(model.deaths_adult_neg, ['Year', 'Sex', 'Age', 'Risk']),
+            "deaths-adult-hiv.csv" : array2frame(model.deaths_adult_hiv, ['Year', 'Sex', 'Age', 'Risk', 'CD4', 'ART']),
+            "new-hiv.csv"          : array2frame(model.new_infections, ['Year', 'Sex', 'Age', 'Risk'])}
+
+def write_frames(frames, data_path):
+    """! Write data frames from build_frames(...) to CSV files
+    @param frames a dict mapping CSV file names to data frames
+    @param data_path Path to write output CSV files
+    """
+    for csv_name, frame in frames.items():
+        frame.to_csv(data_path + "/" + csv_name)
+
 def main(xlsx_name, data_path):
     """! Main program entry point
     @param xlsx_name Excel file with Goals ARM inputs
@@ -30,30 +55,10 @@ def main(xlsx_name, data_path):
     model.project(model.year_final)
     t3 = time.time()
 
-    birth_all_frame = array2frame(model.births, ['Year', 'Sex'])
-    birth_exp_frame = array2frame(model.births_exposed, ['Year'])
-    pop_child_neg = array2frame(model.pop_child_neg, ['Year', 'Sex', 'Age'])
-    pop_child_hiv = array2frame(model.pop_child_hiv, ['Year', 'Sex', 'Age', 'CD4', 'ART'])
-    pop_adult_neg = array2frame(model.pop_adult_neg, ['Year', 'Sex', 'Age', 'Risk'])
-    pop_adult_hiv = array2frame(model.pop_adult_hiv, ['Year', 'Sex', 'Age', 'Risk', 'CD4', 'ART'])
-    deaths_child_neg = array2frame(model.deaths_child_neg, ['Year', 'Sex', 'Age'])
-    deaths_child_hiv = array2frame(model.deaths_child_hiv, ['Year', 'Sex', 'Age', 'CD4', 'ART'])
-    deaths_adult_neg = array2frame(model.deaths_adult_neg, ['Year', 'Sex', 'Age', 'Risk'])
-    deaths_adult_hiv = array2frame(model.deaths_adult_hiv, ['Year', 'Sex', 'Age', 'Risk', 'CD4', 'ART'])
-    new_hiv = array2frame(model.new_infections, ['Year', 'Sex', 'Age', 'Risk'])
+    frames = build_frames(model)
     t4 = time.time()
 
-    birth_all_frame.to_csv(data_path + "/births.csv")
-    birth_exp_frame.to_csv(data_path + "/births-exposed.csv")
-    pop_child_neg.to_csv(data_path + "/child-neg.csv")
-    pop_child_hiv.to_csv(data_path + "/child-hiv.csv")
-    pop_adult_neg.to_csv(data_path + "/adult-neg.csv")
-    pop_adult_hiv.to_csv(data_path + "/adult-hiv.csv")
-    deaths_child_neg.to_csv(data_path + "/deaths-child-neg.csv")
-    deaths_child_hiv.to_csv(data_path + "/deaths-child-hiv.csv")
-    deaths_adult_neg.to_csv(data_path + "/deaths-adult-neg.csv")
-    deaths_adult_hiv.to_csv(data_path + "/deaths-adult-hiv.csv")
-    new_hiv.to_csv(data_path + "/new-hiv.csv")
+    write_frames(frames, data_path)
     t5 = time.time()
 
     sys.stdout.write("Construct\t%0.2fs\nInitialize\t%0.2fs\nProject\t\t%0.2fs\nAnalysis\t%0.2fs\nCSV write\t%0.2fs\n" % (t1-t0, t2-t1, t3-t2, t4-t3, t5-t4))
@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+import threading
+import src.goals_model as Goals
+
+def year_outputs(model, year):
+    """! Views of one year's slice of each model output array
+    @param model a Model projected at least through year
+    @param year the year to view
+    @return a dict mapping output names (see goals_model.output_shapes) to array views
+    """
+    t = year - model.year_first
+    return {name : getattr(model, name)[t] for name in Goals.output_shapes(0)}
+
+class ProjectionTask:
+    """! A projection running on a background thread, advanced one year at a time.
+
+    The callback, if given, is called on the projection thread after each year
+    as callback(year, outputs), where outputs holds views of that year's slice
+    of the model outputs (see year_outputs). Views stay valid until the model is
+    invalidated from that year; copy them to keep them longer. The model must
+    not be used by other threads until the task is done.
+    """
+
+    def __init__(self, model, year_stop, callback=None):
+        """! Start projecting
+        @param model an initialized Model
+        @param year_stop the last year to project
+        @param callback optional callable(year, outputs) run after each year is projected
+        """
+        self.model = model
+        self.year_stop = year_stop
+        self.future = concurrent.futures.Future()
+        self._callback = callback
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.future.set_running_or_notify_cancel()
+        try:
+            year = max(self.model.last_valid_year(), self.model.year_first - 1)
+            while year < self.year_stop and not self._cancel.is_set():
+                year += 1
+                self.model.project(year) # resumes from the last year calculated
+                if self._callback is not None:
+                    self._callback(year, year_outputs(self.model, year))
+            self.future.set_result(self.model.last_valid_year())
+        except BaseException as err:
+            self.future.set_exception(err)
+
+    def cancel(self):
+        """! Stop after the year in progress. The model stays valid through the last
+        year completed, so a later project(...) call resumes from there."""
+        self._cancel.set()
+
+    def cancelled(self):
+        """! True if the task was cancelled before reaching year_stop"""
+        return self._cancel.is_set() and self.model.last_valid_year() < self.year_stop
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """! Wait for the task to finish
+        @return the last year projected
+        """
+        return self.future.result(timeout)
+
+def project_async(model, year_stop, callback=None):
+    """! Start projecting model through year_stop on a background thread
+    @return a ProjectionTask
+    """
+    return ProjectionTask(model, year_stop, callback)
+
+async def project_years(model, year_stop):
+    """! Asynchronously project a model, yielding after each year
+    @param model an initialized Model
+    @param year_stop the last year to project
+    @return an async iterator of (year, outputs) pairs; see ProjectionTask for outputs.
+    Leaving the loop early cancels the projection after the year in progress.
+
+    async for year, outputs in project_years(model, 2030):
+        if outputs['new_infections'].sum() > limit:
+            break
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    ready = threading.Semaphore(0) # the projection thread waits until the consumer has seen each year
+
+    def callback(year, outputs):
+        loop.call_soon_threadsafe(queue.put_nowait, (year, outputs))
+        ready.acquire()
+
+    task = ProjectionTask(model, year_stop, callback)
+    task.future.add_done_callback(lambda f : loop.call_soon_threadsafe(queue.put_nowait, done))
+    try:
+        while (item := await queue.get()) is not done:
+            yield item
+            ready.release()
+    finally:
+        task.cancel()
+        ready.release()
+        await asyncio.wrap_future(task.future)
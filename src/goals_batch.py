@@ -0,0 +1,76 @@
+import numpy as np
+import src.goals_const as CONST
+import src.goals_model as Goals
+
+class BatchModel:
+    """! A batch of Goals models that share one set of raw inputs. Outputs are
+    stored in arrays with a leading batch axis, so batch.pop_adult_hiv[b] holds
+    the adult HIV population of model b. Each model writes directly into its
+    slice of these arrays, so ensemble results need no gathering or copying.
+
+    Workbooks are read once per batch rather than once per model, and
+    project(...) advances all models together on native threads. Models are
+    accessed by index to modify their inputs, for example
+    batch[b].epi_pars[CONST.EPI_TRANSMIT_F2M] = value.
+    """
+
+    def __init__(self, batch_size, profiler=None):
+        """! Create an uninitialized batch
+        @param batch_size number of models in the batch
+        @param profiler optional goals_profile.Profiler shared by all models in the batch
+        """
+        self.batch_size = batch_size
+        self._profiler = profiler
+        self._dtype = np.float64
+        self._order = "C"
+        self.models = []
+
+    def init_from_xlsx(self, xlsx_name):
+        """! Initialize every model in the batch from inputs stored in Excel
+        @param xlsx_name An Excel workbook with Goals ARM inputs
+        """
+        self.init_from_inputs(Goals.Model(profiler=self._profiler).read_xlsx(xlsx_name))
+
+    def init_from_inputs(self, inputs):
+        """! Initialize every model in the batch from raw inputs
+        @param inputs a dict of raw inputs returned by Model.read_xlsx(...)
+        """
+        cfg_opts = inputs['config']
+        self.year_first = cfg_opts[CONST.CFG_FIRST_YEAR]
+        self.year_final = cfg_opts[CONST.CFG_FINAL_YEAR]
+        num_years = self.year_final - self.year_first + 1
+
+        shapes = Goals.output_shapes(num_years)
+        for name, shape in shapes.items():
+            setattr(self, name, np.zeros((self.batch_size,) + shape, dtype=self._dtype, order=self._order))
+
+        self.models = []
+        for b in range(self.batch_size):
+            model = Goals.Model(profiler=self._profiler)
+            model.init_from_inputs(inputs, {name : getattr(self, name)[b] for name in shapes})
+            self.models.append(model)
+
+    def __len__(self):
+        return len(self.models)
+
+    def __getitem__(self, b):
+        return self.models[b]
+
+    def __iter__(self):
+        return iter(self.models)
+
+    def last_valid_year(self):
+        """! Return the latest year that every model in the batch has been calculated through, or -1"""
+        return min([model.last_valid_year() for model in self.models], default=-1)
+
+    def project(self, year_stop, num_threads=0):
+        """! Calculate all projections in the batch through year_stop
+        @param year_stop the last year to project
+        @param num_threads number of threads to use (0 to use one per hardware thread)
+        """
+        Goals.project_many(self.models, year_stop, num_threads)
+
+    def invalidate(self, year):
+        """! Invalidate all projections in the batch from a given year onward"""
+        for model in self.models:
+            model.invalidate(year)
@@ -0,0 +1,105 @@
+import json
+import time
+import numpy as np
+
+class Case:
+    """! A named benchmark case. The setup callable is run before every timed
+    repetition and its return value is passed to func, so that state consumed
+    by func (e.g., an already-calculated projection) can be reset untimed.
+    """
+
+    def __init__(self, name, func, setup=None, repeat=None):
+        """! Define a benchmark case
+        @param name case name, used to match results against baselines
+        @param func callable to time. func() if setup is None, func(setup()) otherwise
+        @param setup optional callable run untimed before each repetition
+        @param repeat optional case-specific number of repetitions
+        """
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.repeat = repeat
+
+    def run(self, repeat):
+        """! Time the case
+        @param repeat number of timed repetitions, overridden by self.repeat if set
+        @return a numpy array of wall times in seconds, one per repetition
+        """
+        n = self.repeat if self.repeat is not None else repeat
+        times = np.zeros(n)
+        for k in range(n):
+            if self.setup is None:
+                t0 = time.perf_counter()
+                self.func()
+                times[k] = time.perf_counter() - t0
+            else:
+                arg = self.setup()
+                t0 = time.perf_counter()
+                self.func(arg)
+                times[k] = time.perf_counter() - t0
+        return times
+
+def summarize(times):
+    """! Summarize benchmark timings
+    @param times array of wall times in seconds
+    @return a dict of summary statistics
+    """
+    return {'repeat' : len(times),
+            'min'    : float(times.min()),
+            'median' : float(np.median(times)),
+            'mean'   : float(times.mean()),
+            'max'    : float(times.max())}
+
+def run_cases(cases, repeat=5, pattern=None, stream=None):
+    """! Run a list of benchmark cases
+    @param cases list of Case objects
+    @param repeat default number of timed repetitions per case
+    @param pattern if not None, only run cases whose names contain this substring
+    @param stream if not None, progress is written here as each case finishes
+    @return a dict mapping case names to summary statistics
+    """
+    results = {}
+    for case in cases:
+        if pattern is not None and pattern not in case.name:
+            continue
+        results[case.name] = summarize(case.run(repeat))
+        if stream is not None:
+            stream.write("%-40s %10.4fs (median of %d)\n" % (case.name, results[case.name]['median'], results[case.name]['repeat']))
+    return results
+
+def save_baseline(json_name, results):
+    """! Store benchmark results as a baseline for later comparison
+    @param json_name output file name
+    @param results a dict returned by run_cases(...)
+    """
+    with open(json_name, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+def load_baseline(json_name):
+    """! Load baseline results stored by save_baseline(...)"""
+    with open(json_name, 'r') as fh:
+        return json.load(fh)
+
+def compare(results, baseline, tolerance=0.2):
+    """! Compare benchmark results to a baseline using median times
+    @param results a dict returned by run_cases(...)
+    @param baseline a dict returned by load_baseline(...)
+    @param tolerance relative slowdown allowed before a case is flagged as a regression
+    @return a list of (name, baseline median, current median, ratio, status) tuples,
+    where status is one of 'ok', 'faster', 'REGRESSION' or 'new'
+    """
+    rval = []
+    for name, stats in results.items():
+        if name not in baseline:
+            rval.append((name, np.nan, stats['median'], np.nan, 'new'))
+            continue
+        base = baseline[name]['median']
+        ratio = stats['median'] / base if base > 0.0 else np.inf
+        if ratio > 1.0 + tolerance:
+            status = 'REGRESSION'
+        elif ratio < 1.0 / (1.0 + tolerance):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rval.append((name, base, stats['median'], ratio, status))
+    return rval
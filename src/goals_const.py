@@ -82,6 +82,10 @@ FIT_ANCRT_BIAS          = LHOOD_ANCRT_BIAS
 FIT_VARINFL_SITE        = LHOOD_VARINFL_SITE
 FIT_VARINFL_CENSUS      = LHOOD_VARINFL_CENSUS
 
+## Fitted parameters that only enter likelihood calculations. Changing these
+## does not require recalculating the projection.
+FIT_LIKELIHOOD_ONLY = [FIT_ANCSS_BIAS, FIT_ANCRT_BIAS, FIT_VARINFL_SITE, FIT_VARINFL_CENSUS]
+
 ## +===+ Model constants +=====================================================+
 ## Model constants are aligned with values in GoalsARM_Core DPConst.H
 
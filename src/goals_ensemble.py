@@ -0,0 +1,110 @@
+import concurrent.futures
+import numpy as np
+import src.goals_results as Results
+import src.goals_sensitivity as Sensitivity
+import src.goals_stats as Stats
+
+class EnsembleSummary:
+    """! Streaming summary of model indicators across ensemble runs. Each
+    indicator keeps a goals_stats.RunningMoments and a goals_stats.QuantileSketch
+    over its year-by-sex array, so memory does not grow with the number of runs.
+    Summaries from different workers are combined with merge(...).
+    """
+
+    def __init__(self, shapes, year_first=None, k=128, seed=None):
+        """! Create an empty summary
+        @param shapes dict mapping indicator names to array shapes
+        @param year_first first year of the indicator arrays
+        @param k quantile sketch capacity (see goals_stats.QuantileSketch)
+        @param seed seed for quantile sketch compaction
+        """
+        self.count = 0
+        self.year_first = year_first
+        self.moments = {name : Stats.RunningMoments(shape) for name, shape in shapes.items()}
+        self.sketches = {name : Stats.QuantileSketch(shape, k=k, seed=seed) for name, shape in shapes.items()}
+
+    def add(self, values):
+        """! Add one run
+        @param values dict mapping indicator names to arrays
+        """
+        for name, val in values.items():
+            self.moments[name].add(val)
+            self.sketches[name].add(val)
+        self.count += 1
+
+    def merge(self, other):
+        """! Add all runs summarized by another EnsembleSummary"""
+        for name in self.moments:
+            self.moments[name].merge(other.moments[name])
+            self.sketches[name].merge(other.sketches[name])
+        self.count += other.count
+
+    def summary(self, quantiles=(0.025, 0.5, 0.975)):
+        """! Summary statistics by indicator
+        @param quantiles probabilities of the quantiles to report
+        @return a dict mapping indicator names to dicts with entries 'mean', 'sd'
+        and 'quantiles' (an array by quantile, year and sex)
+        """
+        return {name : {'mean'      : self.moments[name].mean,
+                        'sd'        : self.moments[name].std(),
+                        'quantiles' : self.sketches[name].quantile(quantiles)} for name in self.moments}
+
+def run_chunk(fitter, draws, indicators, k, seed):
+    """! Worker task: project each parameter vector in draws and summarize indicators
+    @param fitter a GoalsFitter
+    @param draws array of parameter vectors by run and parameter
+    @param indicators names of indicators (keys of goals_sensitivity.INDICATORS)
+    @param k quantile sketch capacity
+    @param seed seed for quantile sketch compaction
+    @return an EnsembleSummary of the runs in draws
+    """
+    summary = None
+    for params in draws:
+        fitter.project(params)
+        res = Results.Results(fitter.hivsim)
+        values = {name : Sensitivity.INDICATORS[name](res) for name in indicators}
+        if summary is None:
+            summary = EnsembleSummary({name : val.shape for name, val in values.items()}, fitter.year_first, k=k, seed=seed)
+        summary.add(values)
+    return summary
+
+def prior_draws(fitter, num_draws, seed=None):
+    """! Worker task: draw parameter vectors from the calibration priors by Latin hypercube sampling
+    @param fitter a GoalsFitter
+    @param num_draws number of parameter vectors to draw
+    @param seed random number generator seed
+    @return an array of parameter vectors by draw and parameter
+    """
+    return fitter.prior_quantile(Stats.latin_hypercube(num_draws, len(fitter.parameter_names()), seed))
+
+def run_ensemble(pool, draws, indicators=('prevalence', 'incidence', 'deaths'), k=128, chunk_size=None, seed=None):
+    """! Project an ensemble of parameter vectors in parallel and summarize indicators
+    @param pool a goals_workers.FitterPool
+    @param draws array of parameter vectors by run and parameter, e.g., from prior_draws(...)
+    or posterior samples
+    @param indicators names of indicators (keys of goals_sensitivity.INDICATORS) to summarize
+    @param k quantile sketch capacity
+    @param chunk_size number of runs per worker task (None: about four tasks per worker)
+    @param seed seed for quantile sketch compaction
+    @return an EnsembleSummary
+    """
+    draws = np.asarray(draws, dtype=np.float64)
+    if len(draws) == 0:
+        raise ValueError('run_ensemble requires at least one parameter vector')
+    if chunk_size is None:
+        chunk_size = max(1, int(np.ceil(len(draws) / (4 * pool.num_workers))))
+
+    futures = []
+    for b, first in enumerate(range(0, len(draws), chunk_size)):
+        task_seed = None if seed is None else seed + b
+        futures.append(pool.submit(run_chunk, draws[first:first+chunk_size], tuple(indicators), k, task_seed))
+
+    # Merge summaries as chunks finish. Each summary has constant size, so
+    # memory depends on the number of chunks rather than the number of runs.
+    rval = None
+    for future in concurrent.futures.as_completed(futures):
+        if rval is None:
+            rval = future.result()
+        else:
+            rval.merge(future.result())
+    return rval
@@ -0,0 +1,99 @@
+import numpy as np
+import src.goals_const as CONST
+
+## Model sex and behavioral risk group ranges for the Gender and Population
+## values used in calibration data, as (first, last + 1) pairs
+SEX_RANGES = {'All'   : (CONST.SEX_MC_MIN, CONST.SEX_MC_MAX + 1),
+              'Women' : (CONST.SEX_FEMALE, CONST.SEX_FEMALE + 1),
+              'Men'   : (CONST.SEX_MALE_U, CONST.SEX_MALE_C + 1)}
+
+POP_RANGES = {'All'     : (CONST.POP_MIN,  CONST.POP_MAX + 1),
+              'FSW'     : (CONST.POP_FSW,  CONST.POP_FSW + 1),
+              'MSM'     : (CONST.POP_MSM,  CONST.POP_MSM + 1),
+              'TGW'     : (CONST.POP_TGW,  CONST.POP_TGW + 1),
+              'PWID'    : (CONST.POP_PWID, CONST.POP_PWID + 1),
+              'Clients' : (CONST.POP_CSW,  CONST.POP_CSW + 1)}
+
+def _indicator(ranges, size):
+    """! Convert (first, last + 1) ranges to rows of 0-1 weights of length size"""
+    rval = np.zeros((len(ranges), size))
+    for row, (lo, hi) in enumerate(ranges):
+        rval[row, lo:hi] = 1.0
+    return rval
+
+def _lookup(table, values, kind):
+    try:
+        return [table[val] for val in values]
+    except KeyError as err:
+        raise ValueError('Unrecognized %s %s' % (kind, err.args[0]))
+
+class _TemplateIndex:
+    """! Row-by-row model strata of a calibration data template, stored as flat arrays
+    so that model estimates for every row can be calculated at once"""
+
+    def __init__(self, template, year_first, sex_ranges):
+        self.num_rows = len(template['Year'])
+        # Estimates only need model outputs for years with data
+        self._years, self._year = np.unique(np.array(template['Year'], dtype=int) - year_first, return_inverse=True)
+        self._sex = _indicator(sex_ranges, CONST.N_SEX_MC)
+
+        # Age bounds follow Python slice rules, so that estimates match slicing
+        # model outputs by [AgeMin - 15 : AgeMax - 14]
+        ages = [slice(lo, hi).indices(CONST.N_AGE_ADULT)[:2] for lo, hi in
+                zip(np.array(template['AgeMin'], dtype=int) - CONST.AGE_ADULT_MIN,
+                    np.array(template['AgeMax'], dtype=int) - CONST.AGE_ADULT_MIN + 1)]
+        self._age_min = np.array([lo for lo, hi in ages], dtype=int)
+        self._age_max = np.array([max(lo, hi) for lo, hi in ages], dtype=int)
+
+    def _age_sums(self, values):
+        """! Sum values (year x sex x age [x pop], for years in self._years) over each row's ages
+        @return an array by row, sex [and pop]
+        """
+        csum = np.zeros(values.shape[:2] + (values.shape[2] + 1,) + values.shape[3:])
+        np.cumsum(values, axis=2, out=csum[:,:,1:])
+        return csum[self._year,:,self._age_max] - csum[self._year,:,self._age_min]
+
+class HivPrevIndex(_TemplateIndex):
+    """! Model HIV prevalence estimates for an HIV prevalence data template"""
+
+    def __init__(self, template, year_first):
+        """! Index a template
+        @param template a data frame, or dict of sequences, with Population, Gender, Year, AgeMin and AgeMax columns
+        @param year_first first year of projection
+        """
+        pops = list(template['Population'])
+        sexes = _lookup(SEX_RANGES, template['Gender'], 'gender')
+        # Model compartments track people by assigned sex at birth to speed up
+        # behavioral risk group dynamics calculations.
+        sexes = [SEX_RANGES['Men'] if pop == 'TGW' else sex for pop, sex in zip(pops, sexes)]
+        super().__init__(template, year_first, sexes)
+        self._pop = _indicator(_lookup(POP_RANGES, pops, 'population'), CONST.N_POP)
+
+    def estimate(self, model):
+        """! Calculate HIV prevalence for every template row
+        @param model a projected Model
+        @return an array of prevalence estimates, one per row
+        """
+        pop_hiv = self._age_sums(model.pop_adult_hiv[self._years].sum((4,5)))
+        pop_neg = self._age_sums(model.pop_adult_neg[self._years])
+        pop_hiv = np.einsum('rsp,rs,rp->r', pop_hiv, self._sex, self._pop)
+        pop_neg = np.einsum('rsp,rs,rp->r', pop_neg, self._sex, self._pop)
+        return pop_hiv / (pop_hiv + pop_neg)
+
+class DeathsIndex(_TemplateIndex):
+    """! Model all-cause adult death estimates for a deaths data template"""
+
+    def __init__(self, template, year_first):
+        """! Index a template
+        @param template a data frame, or dict of sequences, with Gender, Year, AgeMin and AgeMax columns
+        @param year_first first year of projection
+        """
+        super().__init__(template, year_first, _lookup(SEX_RANGES, template['Gender'], 'gender'))
+
+    def estimate(self, model):
+        """! Calculate deaths for every template row
+        @param model a projected Model
+        @return an array of death estimates, one per row
+        """
+        deaths = model.deaths_adult_hiv[self._years].sum((3,4,5)) + model.deaths_adult_neg[self._years].sum((3))
+        return np.einsum('rs,rs->r', self._age_sums(deaths), self._sex)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import numpy as np
+import src.goals_model as Goals
+
+## Status of a comparison against golden outputs, from best to worst
+IDENTICAL = 'identical'               # every year of every output is bitwise identical
+WITHIN_TOLERANCE = 'within tolerance' # some values differ, but all summary statistics are within tolerance
+DIVERGED = 'diverged'                 # some summary statistics are outside tolerance
+
+def _checksum(values):
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float64).tobytes(), digest_size=8).hexdigest()
+
+def _margins(arr):
+    """! Sums of an output by year over all dimensions after the second and third (usually sex and age)
+    @return an array by year and flattened sex and age
+    """
+    return arr.reshape(arr.shape[:3] + (-1,)).sum(axis=-1).reshape(arr.shape[0], -1)
+
+def fingerprint(model):
+    """! Compact per-year summary of a projected model's outputs
+    @param model a projected Model, or any object with Model's output attributes
+    @return a JSON-serializable dict with, for each output array and year, a checksum
+    of the year's values, their sum and Euclidean norm, and their sums by sex and age
+    """
+    outputs = {}
+    for name in Goals.output_shapes(0):
+        arr = getattr(model, name)
+        flat = arr.reshape(arr.shape[0], -1)
+        outputs[name] = {'checksum' : [_checksum(row) for row in flat],
+                         'sum'      : flat.sum(axis=1).tolist(),
+                         'norm'     : np.sqrt((flat * flat).sum(axis=1)).tolist(),
+                         'margin'   : _margins(arr).tolist()}
+    return {'year_first' : model.year_first,
+            'year_final' : model.year_final,
+            'outputs'    : outputs}
+
+def write_fingerprint(fp, file_name):
+    with open(file_name, 'w') as fh:
+        json.dump(fp, fh, indent=1)
+
+def read_fingerprint(file_name):
+    with open(file_name) as fh:
+        return json.load(fh)
+
+class Comparison:
+    """! Differences between a reference fingerprint and a new one"""
+
+    def __init__(self, status, differences):
+        """! @param status IDENTICAL, WITHIN_TOLERANCE or DIVERGED
+        @param differences list of dicts with keys output, year, statistic, reference, current and
+        within_tolerance, ordered by year then output
+        """
+        self.status = status
+        self.differences = differences
+
+    def first_divergence(self):
+        """! The earliest difference outside tolerance, or None"""
+        return next((diff for diff in self.differences if not diff['within_tolerance']), None)
+
+    def report(self, max_lines=20):
+        """! Describe the comparison as text"""
+        lines = [self.status]
+        first = self.first_divergence()
+        if first is not None:
+            lines.append('first divergence: %s in %d (%s %.10g, reference %.10g)'
+                         % (first['output'], first['year'], first['statistic'], first['current'], first['reference']))
+        for diff in self.differences[:max_lines]:
+            lines.append('  %-18s %d %-8s reference %-18.10g current %-18.10g %s'
+                         % (diff['output'], diff['year'], diff['statistic'], diff['reference'], diff['current'],
+                            'ok' if diff['within_tolerance'] else 'DIVERGED'))
+        if len(self.differences) > max_lines:
+            lines.append('  ... %d more differences' % (len(self.differences) - max_lines))
+        return '\n'.join(lines)
+
+def compare(reference, current, rtol=1e-9, atol=1e-6):
+    """! Compare fingerprints. Years whose checksums match are identical. Otherwise the
+    year's sum and norm, and each of its sums by sex and age, are compared with
+    numpy.isclose(current, reference, rtol, atol). The margin statistic reports the sex
+    and age sum furthest outside tolerance, so changes that move values between ages
+    or sexes without changing the year's sum and norm are still detected.
+    @param reference fingerprint of the golden outputs
+    @param current fingerprint of the outputs to check
+    @return a Comparison
+    """
+    if (reference['year_first'], reference['year_final']) != (current['year_first'], current['year_final']):
+        raise ValueError('Fingerprints cover different years (%d-%d and %d-%d)'
+                         % (reference['year_first'], reference['year_final'], current['year_first'], current['year_final']))
+    year_first = reference['year_first']
+    differences = []
+    for name, ref in reference['outputs'].items():
+        cur = current['outputs'][name]
+        for t, (ref_sum, cur_sum) in enumerate(zip(ref['checksum'], cur['checksum'])):
+            if ref_sum == cur_sum:
+                continue
+            for stat in ('sum', 'norm'):
+                differences.append({'output'           : name,
+                                    'year'             : year_first + t,
+                                    'statistic'        : stat,
+                                    'reference'        : ref[stat][t],
+                                    'current'          : cur[stat][t],
+                                    'within_tolerance' : bool(np.isclose(cur[stat][t], ref[stat][t], rtol=rtol, atol=atol))})
+            ref_margin, cur_margin = np.array(ref['margin'][t]), np.array(cur['margin'][t])
+            k = np.argmax(np.abs(cur_margin - ref_margin) - rtol * np.abs(ref_margin))
+            differences.append({'output'           : name,
+                                'year'             : year_first + t,
+                                'statistic'        : 'margin',
+                                'reference'        : float(ref_margin[k]),
+                                'current'          : float(cur_margin[k]),
+                                'within_tolerance' : bool(np.allclose(cur_margin, ref_margin, rtol=rtol, atol=atol))})
+    differences.sort(key=lambda diff : diff['year'])
+    if len(differences) == 0:
+        status = IDENTICAL
+    elif all(diff['within_tolerance'] for diff in differences):
+        status = WITHIN_TOLERANCE
+    else:
+        status = DIVERGED
+    return Comparison(status, differences)
@@ -0,0 +1,184 @@
+import concurrent.futures
+import itertools
+import json
+import os
+import numpy as np
+import src.goals_lazy as Lazy
+import src.goals_sensitivity as Sensitivity
+
+optimize = Lazy.lazy_import('scipy.optimize')
+pd       = Lazy.lazy_import('pandas')
+
+def optimize_point(fitter, fixed_idx, fixed_val, x_start, objective='posterior', method='Nelder-Mead', maxiter=None, tol=None):
+    """! Worker task: hold some parameters fixed and optimize the rest
+    @param fitter a GoalsFitter
+    @param fixed_idx indices of the fixed parameters in parameter vectors
+    @param fixed_val values of the fixed parameters
+    @param x_start parameter vector to start the optimization from
+    @param objective 'posterior' to maximize the log-posterior, or 'likelihood' for the log-likelihood
+    @param method, maxiter, tol see scipy.optimize.minimize
+    @return a dict with the optimized parameters, log-posterior, log-prior, likelihood
+    components (see goals_sensitivity.LIKELIHOOD_NAMES), evaluation count and convergence flag
+    """
+    params = np.array(x_start, dtype=np.float64)
+    params[fixed_idx] = fixed_val
+    free = np.setdiff1d(np.arange(len(params)), fixed_idx)
+    lower, upper = fitter.bounds()
+    if objective == 'posterior':
+        value = fitter.posterior
+    elif objective == 'likelihood':
+        value = lambda p : fitter.likelihood(p)[0]
+    else:
+        raise ValueError('Unrecognized objective %s' % (objective))
+
+    def negative(p_free):
+        params[free] = p_free
+        return -value(params)
+
+    nfev, success = 0, True
+    if len(free) > 0:
+        options = {} if maxiter is None else {'maxiter' : maxiter}
+        optres = optimize.minimize(negative, params[free], method=method, bounds=optimize.Bounds(lb=lower[free], ub=upper[free]),
+                                   tol=tol, options=options)
+        params[free] = optres.x
+        nfev, success = int(optres.nfev), bool(optres.success)
+    lhood = [float(val) for val in fitter.likelihood(params)]
+    prior = float(fitter.prior(params))
+    return {'params'    : params.tolist(),
+            'posterior' : lhood[0] + prior,
+            'prior'     : prior,
+            'lhood'     : lhood,
+            'nfev'      : nfev,
+            'success'   : success}
+
+class ProfileGrid:
+    """! Profile likelihood over a grid of values of one or more parameters.
+
+    At each grid point, the gridded parameters are fixed and the remaining
+    parameters are re-optimized. Grid points are optimized in parallel on a
+    goals_workers.FitterPool. Each optimization starts from the result at the
+    nearest completed grid point, so points are scheduled outward from the
+    starting point to keep warm starts close.
+
+    Results are appended to a JSON lines file as each point completes, so a
+    partial grid can be read with read_grid(...) while the rest is running, and
+    an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, par_names, grid, x_init):
+        """! Define a grid
+        @param par_names names of all calibrated parameters, in parameter vector order
+        @param grid dict mapping the names of gridded parameters to sequences of values
+        @param x_init parameter vector that inner optimizations start from when no
+        grid point has completed yet, usually the calibrated parameter values
+        """
+        self.par_names = list(par_names)
+        self.names = list(grid.keys())
+        for name in self.names:
+            if name not in self.par_names:
+                raise ValueError('Unrecognized parameter %s' % (name))
+        self.fixed_idx = np.array([self.par_names.index(name) for name in self.names], dtype=int)
+        self.axes = [np.array(grid[name], dtype=np.float64) for name in self.names]
+        self.x_init = np.array(x_init, dtype=np.float64)
+
+        # Grid points by position along each axis, and their values
+        self.index = np.array(list(itertools.product(*[range(len(axis)) for axis in self.axes])), dtype=int).reshape(-1, len(self.axes))
+        self.values = np.array([[axis[i] for axis, i in zip(self.axes, row)] for row in self.index]).reshape(-1, len(self.axes))
+
+        # Scheduling starts at the grid point closest to x_init
+        span = np.array([max(axis.max() - axis.min(), 1e-12) for axis in self.axes])
+        self._origin = np.argmin((((self.values - self.x_init[self.fixed_idx]) / span)**2).sum(axis=1))
+        self.results = {}
+
+    def _load(self, file_name):
+        """! Read completed points from an earlier run with the same grid"""
+        lookup = {tuple(row) : k for k, row in enumerate(self.index)}
+        for record in _read_records(file_name):
+            k = lookup.get(tuple(record['index']))
+            if k is not None and np.allclose(self.values[k], [record['values'][name] for name in self.names]):
+                self.results[k] = record
+
+    def _next_point(self, pending, started):
+        """! Choose the pending point nearest to a started or completed point
+        @return the point, and the completed point to warm-start from, or None for x_init
+        """
+        pending = np.array(sorted(pending), dtype=int)
+        anchors = np.array(sorted(started), dtype=int) if len(started) > 0 else np.array([self._origin])
+        dist = ((self.index[pending,np.newaxis,:] - self.index[np.newaxis,anchors,:])**2).sum(axis=2)
+        k = pending[np.argmin(dist.min(axis=1))]
+        done = np.array(sorted(self.results), dtype=int)
+        if len(done) == 0:
+            return k, None
+        return k, done[np.argmin(((self.index[done] - self.index[k])**2).sum(axis=1))]
+
+    def run(self, pool, file_name, objective='posterior', method='Nelder-Mead', maxiter=None, tol=None):
+        """! Optimize every grid point not already in file_name
+        @param pool a goals_workers.FitterPool
+        @param file_name JSON lines file that results are appended to
+        @param objective 'posterior' or 'likelihood' (see optimize_point)
+        @param method, maxiter, tol inner optimizer settings (see scipy.optimize.minimize)
+        @return a data frame of results (see read_grid)
+        """
+        if os.path.exists(file_name):
+            self._load(file_name)
+            with open(file_name, 'rb+') as fh:
+                if fh.seek(0, os.SEEK_END) > 0:
+                    fh.seek(-1, os.SEEK_END)
+                    if fh.read(1) != b'\n':
+                        fh.write(b'\n') # end a line cut short by an interrupted run
+        pending = set(range(len(self.index))) - set(self.results)
+        started = set(self.results)
+        running = {}
+        with open(file_name, 'a') as fh:
+            while len(pending) > 0 or len(running) > 0:
+                while len(pending) > 0 and len(running) < pool.num_workers:
+                    k, source = self._next_point(pending, started)
+                    x_start = self.x_init if source is None else self.results[source]['params']
+                    future = pool.submit(optimize_point, self.fixed_idx, self.values[k], x_start, objective, method, maxiter, tol)
+                    running[future] = (k, source)
+                    pending.discard(k)
+                    started.add(k)
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    k, source = running.pop(future)
+                    record = future.result()
+                    record['index'] = self.index[k].tolist()
+                    record['values'] = {name : float(val) for name, val in zip(self.names, self.values[k])}
+                    record['start'] = None if source is None else self.index[source].tolist()
+                    self.results[k] = record
+                    fh.write(json.dumps(record) + '\n')
+                    fh.flush()
+        return _records_frame(self.results.values(), self.names, self.par_names)
+
+def _read_records(file_name):
+    records = []
+    with open(file_name) as fh:
+        for line in fh:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass # a line cut short by an interrupted run
+    return records
+
+def _records_frame(records, names, par_names):
+    rows = []
+    for record in records:
+        row = dict(record['values'])
+        row.update({'posterior' : record['posterior'], 'prior' : record['prior'], 'nfev' : record['nfev'], 'success' : record['success']})
+        row.update(zip(Sensitivity.LIKELIHOOD_NAMES, record['lhood']))
+        if par_names is not None:
+            row.update(zip(par_names, record['params']))
+        rows.append(row)
+    frame = pd.DataFrame(rows)
+    return frame.sort_values(names, ignore_index=True) if len(rows) > 0 else frame
+
+def read_grid(file_name, par_names=None):
+    """! Read profile likelihood results, including partial results of a grid still running
+    @param file_name JSON lines file written by ProfileGrid.run
+    @param par_names optional parameter names, to include optimized parameter values as columns
+    @return a data frame with one row per completed grid point: the gridded parameter values,
+    posterior, prior, likelihood components, evaluation count and convergence flag
+    """
+    records = _read_records(file_name)
+    names = list(records[0]['values'].keys()) if len(records) > 0 else []
+    return _records_frame(records, names, par_names)
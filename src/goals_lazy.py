@@ -0,0 +1,19 @@
+import importlib
+import types
+
+class _LazyModule(types.ModuleType):
+    """! Placeholder that imports the named module on first attribute access"""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__) # later lookups find attributes directly
+        return getattr(module, attr)
+
+def lazy_import(name):
+    """! Return a module object that defers importing name until one of its
+    attributes is used. Use this at module level for heavy dependencies that
+    only some code paths need, e.g. stats = lazy_import('scipy.stats').
+    Import errors, such as a missing optional package, are raised on first use.
+    @param name absolute module name
+    """
+    return _LazyModule(name)
@@ -0,0 +1,111 @@
+import csv
+import numpy as np
+import src.goals_const as CONST
+import src.goals_estimates as Estimates
+import src.goals_lazy as Lazy
+
+special = Lazy.lazy_import('scipy.special')
+
+## Array likelihoods for calibration data, intended to match the percussion
+## likelihoods. Observations are read once into flat arrays, and each evaluation
+## calculates model estimates for every observation at once, without building
+## or indexing data frames.
+##
+## These have not yet been checked against percussion. Until reference values
+## recorded with percussion are committed (see tests/test_goals_likelihood.py),
+## they are only available through GoalsFitter(array_likelihood=True).
+##
+## HIV prevalence surveys  binomial: NumTested people tested, Value * NumTested positive
+## ANC prevalence          normal on the probit scale. Observation variance is the
+##                         delta-method binomial variance 2*pi*exp(w^2)*p*(1-p)/N at
+##                         w = probit(p), plus variance inflation (var.infl.site for
+##                         clinic sites, var.infl.census for Site "Census"). The model
+##                         mean is shifted by ancss.bias (Type "SS") or ancrt.bias (Type "RT").
+##                         Observations are treated as independent: there are no
+##                         site-level random effects.
+## All-cause deaths        normal, with standard deviation from the 95% interval (Lower, Upper)
+##
+## Rows with UseDataInFit FALSE are dropped.
+
+## Standard normal quantile at 0.975, for converting 95% intervals to standard deviations
+Z975 = 1.959963984540054
+
+def read_data(csv_name):
+    """! Read a calibration data CSV file
+    @param csv_name CSV file with a header row
+    @return a dict mapping column names to lists of strings, for rows used in fitting
+    """
+    with open(csv_name, newline='') as fh:
+        reader = csv.DictReader(fh)
+        rows = [row for row in reader if row.get('UseDataInFit', 'TRUE').strip().upper() in ('TRUE', '1')]
+    return {name : [row[name] for row in rows] for name in reader.fieldnames}
+
+def _floats(data, name):
+    return np.array(data[name], dtype=np.float64)
+
+def _normal(x, mean, var):
+    """! Sum of normal log-densities"""
+    return np.sum(-0.5 * (np.log(2.0 * np.pi * var) + (x - mean)**2 / var))
+
+class HivPrevLikelihood:
+    """! Binomial likelihood of HIV prevalence survey data"""
+
+    def __init__(self, csv_name, year_first):
+        """! Read survey data
+        @param csv_name CSV file with Population, Gender, AgeMin, AgeMax, Year, Value and NumTested columns
+        @param year_first first year of projection
+        """
+        data = read_data(csv_name)
+        self._index = Estimates.HivPrevIndex(data, year_first)
+        num = _floats(data, 'NumTested')
+        self._pos = _floats(data, 'Value') * num
+        self._neg = num - self._pos
+        self._const = np.sum(special.gammaln(num + 1.0) - special.gammaln(self._pos + 1.0) - special.gammaln(self._neg + 1.0))
+
+    def likelihood(self, model):
+        """! Log-likelihood at a projected model's prevalence estimates"""
+        prev = self._index.estimate(model)
+        return self._const + np.sum(special.xlogy(self._pos, prev) + special.xlogy(self._neg, 1.0 - prev))
+
+class AncPrevLikelihood:
+    """! Probit-scale normal likelihood of ANC HIV prevalence data, with bias and
+    variance inflation terms from model.likelihood_par"""
+
+    def __init__(self, csv_name, year_first):
+        """! Read ANC data
+        @param csv_name CSV file with Site, Type, Year, Prevalence and N columns
+        @param year_first first year of projection
+        """
+        data = read_data(csv_name)
+        prev = _floats(data, 'Prevalence')
+        self._years, self._year = np.unique(np.array(data['Year'], dtype=int) - year_first, return_inverse=True)
+        self._probit = special.ndtri(prev)
+        self._var = 2.0 * np.pi * np.exp(self._probit**2) * prev * (1.0 - prev) / _floats(data, 'N')
+        self._ss = np.array([kind == 'SS' for kind in data['Type']], dtype=bool)
+        self._census = np.array([site == 'Census' for site in data['Site']], dtype=bool)
+
+    def likelihood(self, model):
+        """! Log-likelihood at a projected model's prevalence among pregnant women"""
+        par = model.likelihood_par
+        with np.errstate(divide='ignore', invalid='ignore'): # births are zero after a truncated projection
+            prev = model.births_exposed[self._years] / model.births[self._years].sum((1))
+        mean = special.ndtri(prev)[self._year] + np.where(self._ss, par[CONST.LHOOD_ANCSS_BIAS], par[CONST.LHOOD_ANCRT_BIAS])
+        var = self._var + np.where(self._census, par[CONST.LHOOD_VARINFL_CENSUS], par[CONST.LHOOD_VARINFL_SITE])
+        return _normal(self._probit, mean, var)
+
+class DeathsLikelihood:
+    """! Normal likelihood of all-cause adult deaths data"""
+
+    def __init__(self, csv_name, year_first):
+        """! Read deaths data
+        @param csv_name CSV file with Gender, AgeMin, AgeMax, Year, Value, Lower and Upper columns
+        @param year_first first year of projection
+        """
+        data = read_data(csv_name)
+        self._index = Estimates.DeathsIndex(data, year_first)
+        self._deaths = _floats(data, 'Value')
+        self._var = ((_floats(data, 'Upper') - _floats(data, 'Lower')) / (2.0 * Z975))**2
+
+    def likelihood(self, model):
+        """! Log-likelihood at a projected model's death estimates"""
+        return _normal(self._deaths, self._index.estimate(model), self._var)
@@ -1,28 +1,155 @@
+import copy
 import math
 import numpy as np
-import scipy as sp
-import openpyxl as xlsx
 import src.goals_const as CONST
+import src.goals_lazy as Lazy
 import src.goals_utils as Utils
+import src.goals_profile as Profile
 import src.goals_proj.x64.Release.goals_proj as Goals
 
+## Excel reading and input transformations load these on first use, so
+## processes that only project models initialized from raw inputs or pickles
+## import just NumPy and the calculation engine.
+sp = Lazy.lazy_import('scipy')
+xlsx = Lazy.lazy_import('openpyxl')
+
 ## TODO:
-## Create an Excel reader that just loads the raw inputs from Excel into member
-## variables. Then the Model here would be responsible for doing any
-## transformations on those variables before passing them to the calculation
-## engine. The C++ transfer layer and calculation engine ideally should not do
-## any input transformations.
+## Model.read_xlsx loads raw inputs and Model.init_from_inputs transforms them
+## before passing them to the calculation engine. The C++ transfer layer and
+## calculation engine ideally should not do any input transformations.
+
+## Model inputs shared with the calculation engine. These may be modified in
+## place, followed by refresh_input(name, year) with the first year changed, and are
+## preserved when a model is pickled.
+SHARED_INPUTS = ('partner_rate', 'age_mixing', 'pop_assort', 'pwid_force', 'needle_sharing', 'condom_freq', 'sti_prev',
+                 'art_num', 'art_prop', 'art_exit_rate', 'art_suppressed', 'uptake_mc')
+
+## Model parameters copied into the calculation engine at initialization.
+## These are preserved when a model is pickled and passed to the engine again
+## on unpickling.
+COPIED_INPUTS = ('epi_pars', 'hiv_frr', 'likelihood_par', 'partner_time_trend', 'partner_age_params', 'partner_pop_ratios')
+
+## Methods that pass raw inputs to the calculation engine, in initialization order,
+## each with the names of the inputs (see Model.read_xlsx) it uses. Model.reload
+## calls only the methods whose inputs have changed.
+INPUT_INITS = [(('epi',),             '_init_epi'),
+               (('popsize',),         '_init_popsize'),
+               (('pasfrs',),          '_init_pasfrs'),
+               (('migr',),            '_init_migr'),
+               (('inci',),            '_init_inci'),
+               (('partner_rates', 'partner_prefs', 'mixing_levels', 'contact_params', 'sti_prev'), '_init_partnership'),
+               (('direct_clhiv',),    '_init_direct_clhiv'),
+               (('hiv_fert',),        '_init_hiv_fert'),
+               (('adult_prog',),      '_init_adult_prog'),
+               (('adult_prog', 'adult_art'), '_init_adult_art_mort'),
+               (('adult_art',),       '_init_adult_art'),
+               (('mc_uptake',),       '_init_mc_uptake'),
+               (('likelihood_pars',), '_init_likelihood_pars')]
+
+## Which parts of each raw input have year as their leading dimension. True marks
+## an array whose first row is the first year of projection, and a year marks an
+## array whose first row is that year; tuples and dicts mark the parts of tuple and
+## dict inputs. Changes to inputs or parts not listed here affect every year.
+YEAR_INDEXED_INPUTS = {'pasfrs'         : True,
+                       'migr'           : (True, True, True),
+                       'inci'           : (True, True, True, True, True, True),
+                       'contact_params' : (False, True, True, True),
+                       'sti_prev'       : (CONST.XLSX_FIRST_YEAR, False),
+                       'direct_clhiv'   : True,
+                       'hiv_fert'       : {'age' : True},
+                       'adult_art'      : (True, True, True, True, True, True),
+                       'mc_uptake'      : True}
+
+def _input_tabs(cfg_opts):
+    """! Return a dict mapping the names of inputs used with configuration cfg_opts
+    to their goals_utils.xlsx_load_* function and workbook tab"""
+    loaders = [(Utils.xlsx_load_epi,     CONST.XLSX_TAB_EPI),
+               (Utils.xlsx_load_popsize, CONST.XLSX_TAB_POPSIZE)]
+    if not cfg_opts[CONST.CFG_USE_UPD_PASFRS]:
+        loaders.append((Utils.xlsx_load_pasfrs, CONST.XLSX_TAB_PASFRS))
+    if not cfg_opts[CONST.CFG_USE_UPD_MIGR]:
+        loaders.append((Utils.xlsx_load_migr, CONST.XLSX_TAB_MIGR))
+    if cfg_opts[CONST.CFG_USE_DIRECT_INCI]:
+        loaders.append((Utils.xlsx_load_inci, CONST.XLSX_TAB_INCI))
+    else:
+        loaders += [(Utils.xlsx_load_partner_rates,  CONST.XLSX_TAB_PARTNER),
+                    (Utils.xlsx_load_partner_prefs,  CONST.XLSX_TAB_PARTNER),
+                    (Utils.xlsx_load_mixing_levels,  CONST.XLSX_TAB_MIXNG_MATRIX),
+                    (Utils.xlsx_load_contact_params, CONST.XLSX_TAB_CONTACT),
+                    (Utils.xlsx_load_sti_prev,       CONST.XLSX_TAB_STIPREV)]
+    if cfg_opts[CONST.CFG_USE_DIRECT_CLHIV]:
+        loaders.append((Utils.xlsx_load_direct_clhiv, CONST.XLSX_TAB_DIRECT_CLHIV))
+    loaders += [(Utils.xlsx_load_hiv_fert,        CONST.XLSX_TAB_HIV_FERT),
+                (Utils.xlsx_load_adult_prog,      CONST.XLSX_TAB_ADULT_PROG),
+                (Utils.xlsx_load_adult_art,       CONST.XLSX_TAB_ADULT_ART),
+                (Utils.xlsx_load_mc_uptake,       CONST.XLSX_TAB_MALE_CIRC),
+                (Utils.xlsx_load_likelihood_pars, CONST.XLSX_TAB_LIKELIHOOD)]
+    return {loader.__name__.removeprefix('xlsx_load_') : (loader, tab) for loader, tab in loaders}
+
+def _values_equal(old, new):
+    if isinstance(old, dict) and isinstance(new, dict):
+        return old.keys() == new.keys() and all(_values_equal(old[key], new[key]) for key in old)
+    if isinstance(old, (tuple, list)) and isinstance(new, (tuple, list)):
+        return len(old) == len(new) and all(_values_equal(a, b) for a, b in zip(old, new))
+    if isinstance(old, np.ndarray) or isinstance(new, np.ndarray):
+        return np.array_equal(old, new, equal_nan=np.asarray(old).dtype.kind == 'f')
+    return old == new or (old != old and new != new) # NaN is unchanged
+
+def _first_changed_year(old, new, by_year, year_first):
+    """! First projection year whose inputs differ between two raw input values, or None if they are equal
+    @param by_year which parts of the values are year-indexed (see YEAR_INDEXED_INPUTS)
+    @param year_first first year of projection
+    """
+    if isinstance(by_year, dict):
+        changed = [_first_changed_year(old.get(key), new.get(key), by_year.get(key, False), year_first) for key in old.keys() | new.keys()]
+    elif isinstance(by_year, tuple):
+        changed = [_first_changed_year(a, b, flag, year_first) for a, b, flag in zip(old, new, by_year)]
+    elif by_year is not False and np.shape(old) == np.shape(new):
+        a, b = np.asarray(old), np.asarray(new)
+        differs = (a != b) & ~(np.isnan(a) & np.isnan(b)) if a.dtype.kind == 'f' else (a != b)
+        rows = np.flatnonzero(differs.reshape(len(a), -1).any(axis=1))
+        origin = year_first if by_year is True else by_year
+        changed = [max(origin + int(rows[0]), year_first) if len(rows) else None]
+    else:
+        changed = [None if _values_equal(old, new) else year_first]
+    changed = [t for t in changed if t is not None]
+    return min(changed) if changed else None
+
+def output_shapes(num_years):
+    """! Return a dict mapping the names of Model output arrays to their shapes
+    @param num_years number of years projected
+    """
+    shp_adult_neg = (num_years, CONST.N_SEX_MC, CONST.N_AGE_ADULT, CONST.N_POP)
+    shp_adult_hiv = (num_years, CONST.N_SEX_MC, CONST.N_AGE_ADULT, CONST.N_POP, CONST.N_HIV_ADULT, CONST.N_DTX)
+    shp_child_neg = (num_years, CONST.N_SEX_MC, CONST.N_AGE_CHILD)
+    shp_child_hiv = (num_years, CONST.N_SEX_MC, CONST.N_AGE_CHILD, CONST.N_HIV_CHILD, CONST.N_DTX)
+    return {'pop_adult_neg'    : shp_adult_neg,
+            'pop_adult_hiv'    : shp_adult_hiv,
+            'pop_child_neg'    : shp_child_neg,
+            'pop_child_hiv'    : shp_child_hiv,
+            'deaths_adult_neg' : shp_adult_neg,
+            'deaths_adult_hiv' : shp_adult_hiv,
+            'deaths_child_neg' : shp_child_neg,
+            'deaths_child_hiv' : shp_child_hiv,
+            'births'           : (num_years, CONST.N_SEX),
+            'births_exposed'   : (num_years,),
+            'new_infections'   : (num_years, CONST.N_SEX_MC, CONST.N_AGE, CONST.N_POP)}
 
 class Model:
     """! Goals model class. This is wraps an external Goals ARM core projection object
     so that calling applications should not need to care about the Python-C++ API
     """
 
-    def __init__(self):
+    def __init__(self, profiler=None):
+        """! Create an uninitialized model
+        @param profiler optional goals_profile.Profiler used to time initialization and projection
+        """
+        self._profiler = Profile.DISABLED if profiler is None else profiler
         self._dtype = np.float64
         self._order = "C"
         self._initialized = False # True if projection inputs have been initialized, False otherwise
         self._projected   = -1    # The latest year that the projection has been calculated through (-1 if not done)
+        self._tab_hashes  = None  # Workbook tab hashes, set if initialized from a workbook (see reload)
     
     def is_initialized(self):
         """! Check if the projection has been initialized"""
@@ -32,164 +159,347 @@ class Model:
         """! Return the latest year for which the projection has been calculated, or -1 if uncalculated"""
         return self._projected
     
+    def set_profiler(self, profiler):
+        """! Time subsequent model calculations using a goals_profile.Profiler"""
+        self._profiler = profiler
+
     def init_from_xlsx(self, xlsx_name):
         """! Create and initialize a Goals ARM model instance from inputs stored in Excel
         @param xlsx_name An Excel workbook with Goals ARM inputs
         @return An initialized Goals ARM model instance
         """
 
+        with self._profiler.timer("Model.init_from_xlsx"):
+            self.init_from_inputs(self.read_xlsx(xlsx_name))
+            self._tab_hashes = Utils.xlsx_tab_hashes(xlsx_name)
+
+    def reload(self, xlsx_name):
+        """! Update the model after its input workbook has been edited. Only tabs whose
+        contents changed since the last init_from_xlsx(...) or reload(...) are read
+        again, only the inputs read from them are passed to the calculation engine,
+        and the projection is invalidated from the first year whose inputs differ.
+        Changes to the configuration tab, or a model not initialized from a workbook,
+        require full reinitialization, which reload does in that case. Inputs
+        modified in place are overwritten only if they are read again.
+        @param xlsx_name An Excel workbook with Goals ARM inputs
+        @return the first year invalidated, or None if no inputs changed
+        """
+        with self._profiler.timer("Model.reload"):
+            hashes = Utils.xlsx_tab_hashes(xlsx_name)
+            old_hashes = self._tab_hashes
+            if not self._initialized or old_hashes is None or hashes.get(CONST.XLSX_TAB_CONFIG) != old_hashes.get(CONST.XLSX_TAB_CONFIG):
+                self.init_from_xlsx(xlsx_name)
+                return self.year_first
+
+            tabs = _input_tabs(self._config)
+            names = [name for name, (loader, tab) in tabs.items() if hashes.get(tab) != old_hashes.get(tab)]
+            self._tab_hashes = hashes
+            if len(names) == 0:
+                return None
+
+            new_inputs = self.read_xlsx(xlsx_name, names)
+            changed = {}
+            for name in names:
+                t = _first_changed_year(self._inputs[name], new_inputs[name], YEAR_INDEXED_INPUTS.get(name, False), self.year_first)
+                if t is not None:
+                    changed[name] = t
+            if len(changed) == 0:
+                return None
+
+            self._inputs = self._inputs | {name : new_inputs[name] for name in changed}
+            groups = [(group, method) for group, method in INPUT_INITS if any(name in changed for name in group)]
+            inputs = copy.deepcopy({name : self._inputs[name] for group, method in groups for name in group})
+            for group, method in groups:
+                getattr(self, method)(inputs)
+
+            year = min(changed.values())
+            self.invalidate(year)
+        return year
+
+    def read_xlsx(self, xlsx_name, names=None):
+        """! Read raw inputs from Excel without initializing the model. Reading is
+        much slower than initialization, so applications that need several models
+        with the same inputs should read once and pass the result to each model's
+        init_from_inputs(...).
+        @param xlsx_name An Excel workbook with Goals ARM inputs
+        @param names optional collection of input names to read. Configuration options are always read.
+        @return a dict mapping input names to the values returned by goals_utils.xlsx_load_<name>(...)
+        """
         wb = xlsx.load_workbook(filename=xlsx_name, read_only=True)
-        cfg_opts = Utils.xlsx_load_config(wb[CONST.XLSX_TAB_CONFIG])
-        self.epi_pars = Utils.xlsx_load_epi(wb[CONST.XLSX_TAB_EPI])
+        cfg_opts = self._xlsx_load(wb, Utils.xlsx_load_config, CONST.XLSX_TAB_CONFIG)
+        inputs = {'config' : cfg_opts}
 
-        # Conver % epi parameters to proportions
-        self.epi_pars[CONST.EPI_INITIAL_PREV   ] *= 0.01
-        self.epi_pars[CONST.EPI_TRANSMIT_F2M   ] *= 0.01
-        self.epi_pars[CONST.EPI_EFFECT_VMMC    ] *= 0.01
-        self.epi_pars[CONST.EPI_EFFECT_CONDOM  ] *= 0.01
-        self.epi_pars[CONST.EPI_ART_MORT_WEIGHT] *= 0.01
+        for name, (loader, tab) in _input_tabs(cfg_opts).items():
+            if names is None or name in names:
+                inputs[name] = self._xlsx_load(wb, loader, tab)
+        wb.close()
+        return inputs
+
+    def _xlsx_load(self, wb, loader, tab):
+        """! Load inputs from one workbook tab, timing the read per tab"""
+        with self._profiler.timer("Model.read_xlsx/" + tab):
+            return loader(wb[tab])
+
+    def init_from_inputs(self, inputs, outputs=None):
+        """! Initialize the model from raw inputs returned by read_xlsx(...). The model
+        works on its own copy of inputs, so the same inputs can initialize many models.
+        @param inputs a dict of raw inputs returned by read_xlsx(...)
+        @param outputs optional dict mapping output names in output_shapes(...) to
+        preallocated C-style arrays for the model to store its results in. Outputs not
+        included are allocated by the model.
+        """
+        with self._profiler.timer("Model.init_from_inputs"):
+            self._init_from_inputs(copy.deepcopy(inputs), {} if outputs is None else outputs)
+        self._inputs = inputs # kept unmodified for pickling and reloading
+        self._tab_hashes = None
+
+    def __getstate__(self):
+        """! Pickle raw inputs and modifiable inputs rather than the engine. Outputs are
+        not pickled. With pickle protocol 5 and a buffer_callback, arrays are passed as
+        out-of-band buffers."""
+        if not self._initialized:
+            return {'initialized' : False}
+        return {'initialized' : True,
+                'inputs'      : self._inputs,
+                'shared'      : {name : getattr(self, name) for name in SHARED_INPUTS if hasattr(self, name)},
+                'copied'      : {name : getattr(self, name) for name in COPIED_INPUTS if hasattr(self, name)},
+                'year_timing' : hasattr(self, 'year_time')}
+
+    def __setstate__(self, state):
+        """! Rebuild the engine from pickled raw inputs. Workbooks are not read again,
+        but the engine reads its UPD file during initialization. The restored model
+        has not been projected."""
+        self.__init__()
+        if not state['initialized']:
+            return
+        self.init_from_inputs(state['inputs'])
+        for name, val in state['shared'].items():
+            getattr(self, name)[:] = val
+            self.refresh_input(name, self.year_first)
+        for name, val in state['copied'].items():
+            setattr(self, name, copy.deepcopy(val)) # copied so that arrays from read-only buffers become writable
+        self._send_copied_inputs()
+        self.invalidate(-1)
+        if state['year_timing']:
+            self.enable_year_timing()
+
+    def _send_copied_inputs(self):
+        """! Pass inputs that the engine copies at initialization to it again"""
+        self._send_epi_pars()
+        self._send_hiv_fert()
+
+    def _send_epi_pars(self):
+        """! Pass epidemiological parameters to the engine"""
+        self._proj.init_effect_vmmc(self.epi_pars[CONST.EPI_EFFECT_VMMC])
+        self._proj.init_effect_condom(self.epi_pars[CONST.EPI_EFFECT_CONDOM])
+        self._proj.init_adult_art_allocation(self.epi_pars[CONST.EPI_ART_MORT_WEIGHT])
+        if not self._config[CONST.CFG_USE_DIRECT_INCI]:
+            self._proj.init_epidemic_seed(self.epi_pars[CONST.EPI_INITIAL_YEAR] - self.year_first, self.epi_pars[CONST.EPI_INITIAL_PREV])
+            self._proj.init_transmission(
+                self.epi_pars[CONST.EPI_TRANSMIT_F2M],
+                self.epi_pars[CONST.EPI_TRANSMIT_M2F],
+                self.epi_pars[CONST.EPI_TRANSMIT_M2M],
+                self.epi_pars[CONST.EPI_TRANSMIT_PRIMARY],
+                self.epi_pars[CONST.EPI_TRANSMIT_CHRONIC],
+                self.epi_pars[CONST.EPI_TRANSMIT_SYMPTOM],
+                self.epi_pars[CONST.EPI_TRANSMIT_ART_VS],
+                self.epi_pars[CONST.EPI_TRANSMIT_ART_VF],
+                self.epi_pars[CONST.EPI_TRANSMIT_STI_POS],
+                self.epi_pars[CONST.EPI_TRANSMIT_STI_NEG])
 
-        self.year_first = cfg_opts[CONST.CFG_FIRST_YEAR]
-        self.year_final = cfg_opts[CONST.CFG_FINAL_YEAR]
+    def _send_hiv_fert(self):
+        """! Pass HIV-related fertility inputs to the engine"""
+        frr_age = self.hiv_frr['age'] * self.hiv_frr['laf']
+        frr_art = self.hiv_frr['art'] * self.hiv_frr['laf']
+        self._proj.init_hiv_fertility(frr_age[self._year_range(),:], self.hiv_frr['cd4'], frr_art)
 
-        num_years = self.year_final - self.year_first + 1
-        year_range = range(0, num_years)
+    def _allocate_outputs(self, num_years, outputs):
+        for name, shape in output_shapes(num_years).items():
+            if name in outputs:
+                setattr(self, name, outputs[name])
+            else:
+                setattr(self, name, np.zeros(shape, dtype=self._dtype, order=self._order))
 
-        shp_adult_neg = (num_years, CONST.N_SEX_MC, CONST.N_AGE_ADULT, CONST.N_POP)
-        shp_adult_hiv = (num_years, CONST.N_SEX_MC, CONST.N_AGE_ADULT, CONST.N_POP, CONST.N_HIV_ADULT, CONST.N_DTX)
-        shp_child_neg = (num_years, CONST.N_SEX_MC, CONST.N_AGE_CHILD)
-        shp_child_hiv = (num_years, CONST.N_SEX_MC, CONST.N_AGE_CHILD, CONST.N_HIV_CHILD, CONST.N_DTX)
+    def _year_range(self):
+        return range(0, self.year_final - self.year_first + 1)
 
-        self.pop_adult_neg = np.zeros(shp_adult_neg, dtype=self._dtype, order=self._order)
-        self.pop_adult_hiv = np.zeros(shp_adult_hiv, dtype=self._dtype, order=self._order)
-        self.pop_child_neg = np.zeros(shp_child_neg, dtype=self._dtype, order=self._order)
-        self.pop_child_hiv = np.zeros(shp_child_hiv, dtype=self._dtype, order=self._order)
+    def _init_from_inputs(self, inputs, outputs):
+        cfg_opts = inputs['config']
+        self._config = cfg_opts
 
-        self.deaths_adult_neg = np.zeros(shp_adult_neg, dtype=self._dtype, order=self._order)
-        self.deaths_adult_hiv = np.zeros(shp_adult_hiv, dtype=self._dtype, order=self._order)
-        self.deaths_child_neg = np.zeros(shp_child_neg, dtype=self._dtype, order=self._order)
-        self.deaths_child_hiv = np.zeros(shp_child_hiv, dtype=self._dtype, order=self._order)
+        self.year_first = cfg_opts[CONST.CFG_FIRST_YEAR]
+        self.year_final = cfg_opts[CONST.CFG_FINAL_YEAR]
 
-        self.births = np.zeros((num_years, CONST.N_SEX), dtype=self._dtype, order=self._order)
-        self.births_exposed = np.zeros((num_years), dtype=self._dtype, order=self._order)
+        num_years = self.year_final - self.year_first + 1
 
-        self.new_infections = np.zeros((num_years, CONST.N_SEX_MC, CONST.N_AGE, CONST.N_POP), dtype=self._dtype, order=self._order)
+        self._allocate_outputs(num_years, outputs)
 
         self._proj = Goals.Projection(self.year_first, self.year_final)
-        self._proj.initialize(cfg_opts[CONST.CFG_UPD_NAME])
+        with self._profiler.timer("Model.init_from_inputs/upd"):
+            self._proj.initialize(cfg_opts[CONST.CFG_UPD_NAME])
         self._proj.share_output_population(self.pop_adult_neg, self.pop_adult_hiv, self.pop_child_neg, self.pop_child_hiv)
         self._proj.share_output_births(self.births)
         self._proj.share_output_deaths(self.deaths_adult_neg, self.deaths_adult_hiv, self.deaths_child_neg, self.deaths_child_hiv)
         self._proj.share_output_new_infections(self.new_infections)
         self._proj.share_output_births_exposed(self.births_exposed)
 
-        med_age_debut, med_age_union, avg_dur_union, kp_size, kp_stay, kp_turnover = Utils.xlsx_load_popsize(wb[CONST.XLSX_TAB_POPSIZE])
-        self._initialize_population_sizes(med_age_debut, med_age_union, avg_dur_union, kp_size, kp_stay, kp_turnover)
+        names = _input_tabs(cfg_opts)
+        for group, method in INPUT_INITS:
+            if any(name in names for name in group):
+                getattr(self, method)(inputs)
+        self._initialized = True
 
-        if not cfg_opts[CONST.CFG_USE_UPD_PASFRS]:
-            pasfrs = Utils.xlsx_load_pasfrs(wb[CONST.XLSX_TAB_PASFRS])
-            self._proj.init_pasfrs_from_5yr(pasfrs[year_range,:])
+    def _init_epi(self, inputs):
+        self.epi_pars = inputs['epi']
 
-        if not cfg_opts[CONST.CFG_USE_UPD_MIGR]:
-            migr_net, migr_dist_m, migr_dist_f = Utils.xlsx_load_migr(wb[CONST.XLSX_TAB_MIGR])
-            self._proj.init_migr_from_5yr(migr_net[year_range,:], migr_dist_f[year_range,:], migr_dist_m[year_range,:])
+        # Conver % epi parameters to proportions
+        self.epi_pars[CONST.EPI_INITIAL_PREV   ] *= 0.01
+        self.epi_pars[CONST.EPI_TRANSMIT_F2M   ] *= 0.01
+        self.epi_pars[CONST.EPI_EFFECT_VMMC    ] *= 0.01
+        self.epi_pars[CONST.EPI_EFFECT_CONDOM  ] *= 0.01
+        self.epi_pars[CONST.EPI_ART_MORT_WEIGHT] *= 0.01
 
-        self._proj.init_effect_vmmc(self.epi_pars[CONST.EPI_EFFECT_VMMC])
-        self._proj.init_effect_condom(self.epi_pars[CONST.EPI_EFFECT_CONDOM])
-        if cfg_opts[CONST.CFG_USE_DIRECT_INCI]:
-            inci, sirr, airr_m, airr_f, rirr_m, rirr_f = Utils.xlsx_load_inci(wb[CONST.XLSX_TAB_INCI])
-            self._proj.use_direct_incidence(True)
-            self._proj.init_direct_incidence(0.01 * inci[year_range], sirr[year_range], airr_f[year_range,:], airr_m[year_range,:], rirr_f[year_range,:], rirr_m[year_range,:])
-        else:
-            self.partner_time_trend, self.partner_age_params, self.partner_pop_ratios = Utils.xlsx_load_partner_rates(wb[CONST.XLSX_TAB_PARTNER])
-            age_prefs, pop_prefs, self.p_married = Utils.xlsx_load_partner_prefs(wb[CONST.XLSX_TAB_PARTNER])
-            mix_raw = Utils.xlsx_load_mixing_levels(wb[CONST.XLSX_TAB_MIXNG_MATRIX])
-            self.sex_acts, condom_freq, self.pwid_force, needle_sharing = Utils.xlsx_load_contact_params(wb[CONST.XLSX_TAB_CONTACT])
-            self.partner_rate = self.calc_partner_rates(self.partner_time_trend, self.partner_age_params, self.partner_pop_ratios)
-            self.age_mixing = self.calc_partner_prefs(age_prefs)
-            self.pop_assort = self.calc_pop_assort(pop_prefs)
-            self.mix_levels = self.calc_mix_levels(mix_raw)
-            self.condom_freq = 0.01 * condom_freq
-            self.needle_sharing = 0.01 * needle_sharing
-            self.p_married = 0.01 * np.array([self.p_married[CONST.SEX_FEMALE, CONST.POP_PWID - CONST.POP_KEY_MIN],
-                                              self.p_married[CONST.SEX_MALE,   CONST.POP_PWID - CONST.POP_KEY_MIN],
-                                              self.p_married[CONST.SEX_FEMALE, CONST.POP_FSW  - CONST.POP_KEY_MIN],
-                                              self.p_married[CONST.SEX_MALE,   CONST.POP_CSW  - CONST.POP_KEY_MIN],
-                                              self.p_married[CONST.SEX_MALE,   CONST.POP_MSM  - CONST.POP_KEY_MIN],
-                                              self.p_married[CONST.SEX_FEMALE, CONST.POP_TGW  - CONST.POP_KEY_MIN]])            
-            sti_trend, sti_age = Utils.xlsx_load_sti_prev(wb[CONST.XLSX_TAB_STIPREV])
-            self.sti_prev = self.calc_sti_prev(sti_trend, sti_age)
-            
-            # Resize arrays before sharing memory with the calculation engine, otherwise
-            # modifying self.pwid_force or self.needle_sharing won't change the inputs
-            # the calculation engine uses.
-            self.pwid_force = self.pwid_force[year_range,:]
-            self.needle_sharing = self.needle_sharing[year_range]
-
-            self._proj.share_input_partner_rate(self.partner_rate)
-            self._proj.share_input_age_mixing(self.age_mixing)
-            self._proj.share_input_pop_assort(self.pop_assort)
-            self._proj.share_input_pwid_risk(self.pwid_force, self.needle_sharing)
-            self._proj.use_direct_incidence(False)
-            self._proj.init_epidemic_seed(self.epi_pars[CONST.EPI_INITIAL_YEAR] - self.year_first, self.epi_pars[CONST.EPI_INITIAL_PREV])
-            self._proj.init_transmission(
-                self.epi_pars[CONST.EPI_TRANSMIT_F2M],
-                self.epi_pars[CONST.EPI_TRANSMIT_M2F],
-                self.epi_pars[CONST.EPI_TRANSMIT_M2M],
-                self.epi_pars[CONST.EPI_TRANSMIT_PRIMARY],
-                self.epi_pars[CONST.EPI_TRANSMIT_CHRONIC],
-                self.epi_pars[CONST.EPI_TRANSMIT_SYMPTOM],
-                self.epi_pars[CONST.EPI_TRANSMIT_ART_VS],
-                self.epi_pars[CONST.EPI_TRANSMIT_ART_VF],
-                self.epi_pars[CONST.EPI_TRANSMIT_STI_POS],
-                self.epi_pars[CONST.EPI_TRANSMIT_STI_NEG])
-            self._proj.init_keypop_married(self.p_married)
-            self._proj.init_mixing_matrix(self.mix_levels)
-            self._proj.init_sex_acts(self.sex_acts)
-            self._proj.init_condom_freq(self.condom_freq[year_range,:])
-            self._proj.init_sti_prev(self.sti_prev)
+        self._send_epi_pars()
 
-        if cfg_opts[CONST.CFG_USE_DIRECT_CLHIV]:
-            direct_clhiv = Utils.xlsx_load_direct_clhiv(wb[CONST.XLSX_TAB_DIRECT_CLHIV])
-            self._proj.init_clhiv_agein(direct_clhiv[year_range,:])
+    def _init_popsize(self, inputs):
+        med_age_debut, med_age_union, avg_dur_union, kp_size, kp_stay, kp_turnover = inputs['popsize']
+        self._initialize_population_sizes(med_age_debut, med_age_union, avg_dur_union, kp_size, kp_stay, kp_turnover)
 
-        self.hiv_frr = Utils.xlsx_load_hiv_fert(wb[CONST.XLSX_TAB_HIV_FERT])
-        dist, prog, mort, art1, art2, art3 = Utils.xlsx_load_adult_prog(wb[CONST.XLSX_TAB_ADULT_PROG])
-        art_elig, art_num, art_pct, art_stop, art_mrr, art_vs = Utils.xlsx_load_adult_art(wb[CONST.XLSX_TAB_ADULT_ART])
-        uptake_mc = Utils.xlsx_load_mc_uptake(wb[CONST.XLSX_TAB_MALE_CIRC])
+    def _init_pasfrs(self, inputs):
+        pasfrs = inputs['pasfrs']
+        self._proj.init_pasfrs_from_5yr(pasfrs[self._year_range(),:])
+
+    def _init_migr(self, inputs):
+        year_range = self._year_range()
+        migr_net, migr_dist_m, migr_dist_f = inputs['migr']
+        self._proj.init_migr_from_5yr(migr_net[year_range,:], migr_dist_f[year_range,:], migr_dist_m[year_range,:])
+
+    def _init_inci(self, inputs):
+        year_range = self._year_range()
+        inci, sirr, airr_m, airr_f, rirr_m, rirr_f = inputs['inci']
+        self._proj.use_direct_incidence(True)
+        self._proj.init_direct_incidence(0.01 * inci[year_range], sirr[year_range], airr_f[year_range,:], airr_m[year_range,:], rirr_f[year_range,:], rirr_m[year_range,:])
+
+    def _init_partnership(self, inputs):
+        year_range = self._year_range()
+        self.partner_time_trend, self.partner_age_params, self.partner_pop_ratios = inputs['partner_rates']
+        age_prefs, pop_prefs, self.p_married = inputs['partner_prefs']
+        mix_raw = inputs['mixing_levels']
+        self.sex_acts, condom_freq, self.pwid_force, needle_sharing = inputs['contact_params']
+        self.partner_rate = np.zeros((self.year_final - self.year_first + 1, CONST.N_SEX, CONST.N_AGE_ADULT, CONST.N_POP), dtype=self._dtype, order=self._order)
+        self._partner_factors = [None] * CONST.N_SEX # factors partner_rate was last calculated from, by sex (see update_partner_rates)
+        self.update_partner_rates()
+        self.age_mixing = self.calc_partner_prefs(age_prefs)
+        self.pop_assort = self.calc_pop_assort(pop_prefs)
+        self.mix_levels = self.calc_mix_levels(mix_raw)
+        self.condom_freq = np.array(0.01 * condom_freq[year_range,:], dtype=self._dtype, order=self._order)
+        self.needle_sharing = 0.01 * needle_sharing
+        self.p_married = 0.01 * np.array([self.p_married[CONST.SEX_FEMALE, CONST.POP_PWID - CONST.POP_KEY_MIN],
+                                          self.p_married[CONST.SEX_MALE,   CONST.POP_PWID - CONST.POP_KEY_MIN],
+                                          self.p_married[CONST.SEX_FEMALE, CONST.POP_FSW  - CONST.POP_KEY_MIN],
+                                          self.p_married[CONST.SEX_MALE,   CONST.POP_CSW  - CONST.POP_KEY_MIN],
+                                          self.p_married[CONST.SEX_MALE,   CONST.POP_MSM  - CONST.POP_KEY_MIN],
+                                          self.p_married[CONST.SEX_FEMALE, CONST.POP_TGW  - CONST.POP_KEY_MIN]])            
+        sti_trend, sti_age = inputs['sti_prev']
+        self.sti_prev = self.calc_sti_prev(sti_trend, sti_age)
+        
+        # Resize arrays before sharing memory with the calculation engine, otherwise
+        # modifying self.pwid_force or self.needle_sharing won't change the inputs
+        # the calculation engine uses.
+        self.pwid_force = self.pwid_force[year_range,:]
+        self.needle_sharing = self.needle_sharing[year_range]
+
+        self._proj.share_input_partner_rate(self.partner_rate)
+        self._proj.share_input_age_mixing(self.age_mixing)
+        self._proj.share_input_pop_assort(self.pop_assort)
+        self._proj.share_input_pwid_risk(self.pwid_force, self.needle_sharing)
+        self._proj.use_direct_incidence(False)
+        self._proj.init_keypop_married(self.p_married)
+        self._proj.init_mixing_matrix(self.mix_levels)
+        self._proj.init_sex_acts(self.sex_acts)
+        self._proj.share_input_condom_freq(self.condom_freq)
+        self._proj.share_input_sti_prev(self.sti_prev)
+
+    def _init_direct_clhiv(self, inputs):
+        direct_clhiv = inputs['direct_clhiv']
+        self._proj.init_clhiv_agein(direct_clhiv[self._year_range(),:])
+
+    def _init_hiv_fert(self, inputs):
+        self.hiv_frr = inputs['hiv_fert']
+        self._send_hiv_fert()
+
+    def _init_adult_prog(self, inputs):
+        dist, prog, mort, art1, art2, art3 = inputs['adult_prog']
+        self._proj.init_adult_prog_from_10yr(0.01 * dist, prog, mort)
 
-        self.likelihood_par = Utils.xlsx_load_likelihood_pars(wb[CONST.XLSX_TAB_LIKELIHOOD])
+    def _init_adult_art_mort(self, inputs):
+        dist, prog, mort, art1, art2, art3 = inputs['adult_prog']
+        art_elig, art_num, art_pct, art_stop, art_mrr, art_vs = inputs['adult_art']
+        self._proj.init_adult_art_mort_from_10yr(art1, art2, art3, art_mrr[self._year_range(),:])
 
-        frr_age = self.hiv_frr['age'] * self.hiv_frr['laf']
-        frr_art = self.hiv_frr['art'] * self.hiv_frr['laf']
-        self._proj.init_hiv_fertility(frr_age[year_range,:], self.hiv_frr['cd4'], frr_art)
-        self._proj.init_adult_prog_from_10yr(0.01 * dist, prog, mort)
-        self._proj.init_adult_art_mort_from_10yr(art1, art2, art3, art_mrr[year_range,:])
+    def _init_adult_art(self, inputs):
+        year_range = self._year_range()
+        art_elig, art_num, art_pct, art_stop, art_mrr, art_vs = inputs['adult_art']
         self._proj.init_adult_art_eligibility(art_elig[year_range])
-        self._proj.init_adult_art_curr(art_num[year_range,:], 0.01 * art_pct[year_range,:])
-        self._proj.init_adult_art_allocation(self.epi_pars[CONST.EPI_ART_MORT_WEIGHT])
-        self._proj.init_adult_art_interruption(-np.log(1.0 - 0.01 * art_stop[year_range,:])) # convert %/year to an event rate
-        self._proj.init_adult_art_suppressed(0.01 * art_vs[year_range,:])
 
-        self._proj.init_male_circumcision_uptake(uptake_mc[year_range,:])
-        self._initialized = True
-
-        wb.close()
+        # These inputs are shared rather than copied so that scenarios can modify
+        # them in place. After modifying one, call refresh_input(name, year) with
+        # the first year changed before re-projecting.
+        self.art_num = np.array(art_num[year_range,:], dtype=self._dtype, order=self._order)
+        self.art_prop = np.array(0.01 * art_pct[year_range,:], dtype=self._dtype, order=self._order)
+        self.art_exit_rate = np.array(-np.log(1.0 - 0.01 * art_stop[year_range,:]), dtype=self._dtype, order=self._order) # convert %/year to an event rate
+        self.art_suppressed = np.array(0.01 * art_vs[year_range,:], dtype=self._dtype, order=self._order)
+        self._proj.share_input_adult_art_curr(self.art_num, self.art_prop)
+        self._proj.share_input_adult_art_interruption(self.art_exit_rate)
+        self._proj.share_input_adult_art_suppressed(self.art_suppressed)
+
+    def _init_mc_uptake(self, inputs):
+        uptake_mc = inputs['mc_uptake']
+        self.uptake_mc = np.array(uptake_mc[self._year_range(),:], dtype=self._dtype, order=self._order)
+        self._proj.share_input_male_circumcision_uptake(self.uptake_mc)
+
+    def _init_likelihood_pars(self, inputs):
+        self.likelihood_par = inputs['likelihood_pars']
 
     def project(self, year_stop):
         """! Calculate the projection from the first year to the requested final year. The
         projection must be initialized (e.g., via init_from_xlsx) and the year_final must
         not exceed 
         """
-        self._proj.project(year_stop)
+        with self._profiler.timer("Model.project"):
+            self._proj.project(year_stop)
         self._projected = year_stop
 
+    def enable_year_timing(self):
+        """! Record the wall time the calculation engine spends on each projection year.
+        After each call to project(...), self.year_time[t] stores the seconds spent
+        calculating year year_first + t. Years not recalculated by that call keep
+        their previous values. The projection must be initialized first.
+        """
+        self.year_time = np.zeros((self.year_final - self.year_first + 1), dtype=self._dtype, order=self._order)
+        self._proj.share_output_year_time(self.year_time)
+
     def invalidate(self, year):
         """! Invalidate projections from a given year onward. Call this after project(year_stop) if
         you need to recalculate indicators for years before year_stop, otherwise projection will
-        resume from year_stop. """
+        resume from year_stop. This does not reload shared inputs modified in place; see refresh_input. """
         self._proj.invalidate(year)
-        self._projected = min(year, self._projected)
+        self._invalidate_from(year)
+
+    def _invalidate_from(self, year):
+        """! Record that projected years from year onward are no longer valid"""
+        self._projected = min(year - 1 if year > self.year_first else -1, self._projected)
+
+    def refresh_input(self, name, year):
+        """! Mark a shared input (see SHARED_INPUTS) as modified in place from year onward.
+        The engine keeps its own copies of some shared inputs (e.g., self.art_num), and the
+        next projection reloads only the inputs marked this way. Projected years from year
+        onward are invalidated.
+        @param name the input's attribute name, e.g., 'art_num'
+        @param year the first year modified
+        """
+        self._proj.refresh_input(name, year)
+        self._invalidate_from(year)
         
     def _initialize_population_sizes(self, med_age_debut, med_age_union, avg_dur_union, kp_size, kp_stay, kp_turnover):
         """! Convenience function for initializing model population sizes
@@ -199,37 +509,47 @@ class Model:
         self._proj.init_mean_duration_union(avg_dur_union)
         self._proj.init_keypop_size_params(0.01 * kp_size, kp_stay, kp_turnover)
 
+    def calc_partner_age_ratios(self, age_params, s):
+        """! Calculate partnership rate ratios by age for one sex
+        @param age_params beta distribution mean and size parameters that specify partner rates by age
+        @param s sex
+        @return an array of rate ratios by adult age
+        """
+        age_ratios = np.zeros(CONST.N_AGE_ADULT, dtype=self._dtype)
+        raw_ages = np.array(range(CONST.AGE_ADULT_MIN, CONST.AGE_ADULT_MAX + 1))
+        std_ages = (raw_ages - CONST.AGE_ADULT_MIN) / (CONST.AGE_ADULT_MAX - CONST.AGE_ADULT_MIN)
+        raw_mean = age_params[0,s]
+        std_mean = (raw_mean - CONST.AGE_ADULT_MIN) / (CONST.AGE_ADULT_MAX - CONST.AGE_ADULT_MIN)
+
+        ## The regularized incomplete beta function is the beta distribution CDF.
+        ## Calling it directly avoids building a scipy.stats distribution object.
+        ## This intentionally excludes CONST.AGE_ADULT_MAX so that its age_ratio is 0
+        cdf = sp.special.betainc(age_params[1,s] * std_mean, age_params[1,s] * (1.0 - std_mean), std_ages)
+        age_ratios[0:(CONST.N_AGE_ADULT - 1)] = np.diff(cdf)
+        return age_ratios
+
+    def calc_partner_pop_ratios(self, pop_ratios):
+        """! Reorganize rate ratios by behavioral risk group to include sexually inactive
+        people and to map gender identity to assigned sex at birth
+        @param pop_ratios rate ratios by behavioral risk group, excluding the sexually naive group
+        @return an array of rate ratios by behavioral risk group and sex
+        """
+        pop_ratios_aug = np.zeros((CONST.N_POP, CONST.N_SEX), dtype=self._dtype, order=self._order)
+        pop_ratios_aug[CONST.POP_NEVER:(CONST.POP_FSW+1), CONST.SEX_FEMALE] = pop_ratios[0:5, CONST.SEX_FEMALE]
+        pop_ratios_aug[CONST.POP_NEVER:(CONST.POP_MSM+1), CONST.SEX_MALE  ] = pop_ratios[0:6, CONST.SEX_MALE  ] 
+        pop_ratios_aug[CONST.POP_TGW, CONST.SEX_MALE] = pop_ratios[6, CONST.SEX_FEMALE]
+        return pop_ratios_aug
+
     def calc_partner_rates(self, time_trend, age_params, pop_ratios):
         """! Calculate partnership rates by year, sex, age, and behavioral risk group
         @param time_trend lifetime partnership-years by sex and year
         @param age_params beta distribution mean and size parameters that specify partner rates by age
         @param pop_params rate ratios by behavioral risk group, excluding the sexually naive group
         """
-        
-        ## Calculate age-specific rate ratios from age_params
-        age_ratios = np.zeros((CONST.N_SEX, CONST.N_AGE_ADULT), dtype=self._dtype, order=self._order)
-        raw_ages = np.array(range(CONST.AGE_ADULT_MIN, CONST.AGE_ADULT_MAX + 1))
-        std_ages = (raw_ages - CONST.AGE_ADULT_MIN) / (CONST.AGE_ADULT_MAX - CONST.AGE_ADULT_MIN)
-        for s in [CONST.SEX_FEMALE, CONST.SEX_MALE]: # not idiomatic...
-            raw_mean = age_params[0,s]
-            std_mean = (raw_mean - CONST.AGE_ADULT_MIN) / (CONST.AGE_ADULT_MAX - CONST.AGE_ADULT_MIN)
-            dist = sp.stats.beta(age_params[1,s] * std_mean, age_params[1,s] * (1.0 - std_mean))
-
-            ## This intentionally excludes CONST.AGE_ADULT_MAX so that its age_ratio is 0
-            age_ratios[s,0:(CONST.N_AGE_ADULT - 1)] = np.diff(dist.cdf(std_ages))
-
-        ## Calculate the full partner rate matrix
         num_yrs = self.year_final - self.year_first + 1
         yr_bgn = self.year_first - CONST.XLSX_FIRST_YEAR
         yr_end = self.year_final - CONST.XLSX_FIRST_YEAR + 1
-        partner_rate = np.zeros((num_yrs, CONST.N_SEX, CONST.N_AGE_ADULT, CONST.N_POP), dtype=self._dtype, order=self._order)
-
-        ## Reorganize pop_ratios to include sexually inactive people and to map gender
-        ## identity to assigned sex at birth
-        pop_ratios_aug = np.zeros((CONST.N_POP, CONST.N_SEX), dtype=self._dtype, order=self._order)
-        pop_ratios_aug[CONST.POP_NEVER:(CONST.POP_FSW+1), CONST.SEX_FEMALE] = pop_ratios[0:5, CONST.SEX_FEMALE]
-        pop_ratios_aug[CONST.POP_NEVER:(CONST.POP_MSM+1), CONST.SEX_MALE  ] = pop_ratios[0:6, CONST.SEX_MALE  ] 
-        pop_ratios_aug[CONST.POP_TGW, CONST.SEX_MALE] = pop_ratios[6, CONST.SEX_FEMALE]
+        pop_ratios_aug = self.calc_partner_pop_ratios(pop_ratios)
 
         # ## Loop variant (readable)
         # for s in range(CONST.N_SEX):
@@ -240,9 +560,43 @@ class Model:
         ## Vectorized variant (much faster)
         partner_rate = np.zeros((num_yrs, CONST.N_SEX, CONST.N_AGE_ADULT, CONST.N_POP), dtype=self._dtype, order=self._order)
         for s in range(CONST.N_SEX):
-            partner_rate[:,s,:,:] = np.outer(time_trend[s,yr_bgn:yr_end], np.outer(age_ratios[s,:], pop_ratios_aug[:,s])).reshape((num_yrs, CONST.N_AGE_ADULT, CONST.N_POP))
+            age_ratios = self.calc_partner_age_ratios(age_params, s)
+            partner_rate[:,s,:,:] = np.outer(time_trend[s,yr_bgn:yr_end], np.outer(age_ratios, pop_ratios_aug[:,s])).reshape((num_yrs, CONST.N_AGE_ADULT, CONST.N_POP))
 
         return partner_rate
+
+    def update_partner_rates(self, force=False):
+        """! Recalculate self.partner_rate in place after changing partner_time_trend,
+        partner_age_params or partner_pop_ratios. Partnership rates are the product of
+        a time trend, age ratios and behavioral risk group ratios for each sex. The
+        factors used for each sex are cached, and only the parts of partner_rate whose
+        factors changed are recalculated: a sex's whole slice when its time trend or age
+        parameters changed, otherwise only the risk groups whose ratios changed.
+        @param force True to recalculate every part, e.g., after writing to partner_rate directly
+        @return the sexes whose partnership rates were recalculated
+        """
+        yr_bgn = self.year_first - CONST.XLSX_FIRST_YEAR
+        yr_end = self.year_final - CONST.XLSX_FIRST_YEAR + 1
+        pop_ratios_aug = self.calc_partner_pop_ratios(self.partner_pop_ratios)
+        changed = []
+        for s in range(CONST.N_SEX):
+            time_trend = self.partner_time_trend[s,yr_bgn:yr_end]
+            age_params = self.partner_age_params[:,s]
+            pop_ratios = pop_ratios_aug[:,s]
+            cached = None if force else self._partner_factors[s]
+            if cached is None or not np.array_equal(time_trend, cached[0]) or not np.array_equal(age_params, cached[1]):
+                age_ratios = self.calc_partner_age_ratios(self.partner_age_params, s)
+                np.multiply(time_trend[:,np.newaxis,np.newaxis], np.multiply.outer(age_ratios, pop_ratios), out=self.partner_rate[:,s,:,:])
+            else:
+                age_ratios = cached[2]
+                pops = np.flatnonzero(pop_ratios != cached[3])
+                if len(pops) == 0:
+                    continue
+                for r in pops:
+                    np.multiply.outer(time_trend, age_ratios * pop_ratios[r], out=self.partner_rate[:,s,:,r])
+            self._partner_factors[s] = (time_trend.copy(), age_params.copy(), age_ratios, pop_ratios.copy())
+            changed.append(s)
+        return changed
     
     def calc_partner_prefs(self, age_prefs):
         ## age differences mean and variance
@@ -342,3 +696,17 @@ class Model:
                 sti[:, sex, 0:(CONST.N_AGE_ADULT-1), pop] = t_mtx * a_mtx / (1.0 - t_mtx + t_mtx * a_mtx)
 
         return sti
+
+def project_many(models, year_stop, num_threads=0):
+    """! Calculate projections for several models concurrently on native threads
+    @param models initialized Model instances. Each model must be distinct.
+    @param year_stop the last year to project
+    @param num_threads number of threads to use (0 to use one per hardware thread)
+    """
+    # Checked before the engine releases the GIL, since two threads projecting
+    # the same model would race on its outputs
+    if len(set(map(id, models))) != len(models):
+        raise ValueError('project_many requires distinct models')
+    Goals.project_many([model._proj for model in models], year_stop, num_threads)
+    for model in models:
+        model._projected = year_stop
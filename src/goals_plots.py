@@ -0,0 +1,166 @@
+import concurrent.futures
+import os
+import pickle
+import src.goals_estimates as Estimates
+import src.goals_lazy as Lazy
+
+pd       = Lazy.lazy_import('pandas')
+plotnine = Lazy.lazy_import('plotnine')
+
+## Figure sizes in inches, by figure name
+FIGURE_SIZES = {'ancfit' : (6.5, 5.0), 'hivfit' : (16.0, 9.0), 'deathsfit' : (16.0, 9.0)}
+
+def _model_years(hivsim):
+    return pd.DataFrame({'Year' : range(hivsim.year_first, hivsim.year_final + 1)})
+
+def anc_frames(hivsim, ancdat):
+    """! Observed and modeled ANC HIV prevalence for plotting
+    @param hivsim a projected Model
+    @param ancdat a percussion ancprev object with data loaded
+    @return data frames of observed and modeled prevalence
+    """
+    anc_data = ancdat.anc_data.copy()
+    anc_data['Source'] = ['Census' if site=='Census' else 'ANC-%s' % (kind) for site, kind in zip(anc_data['Site'], anc_data['Type'])]
+    mod_data = _model_years(hivsim)
+    mod_data['Prevalence'] = hivsim.births_exposed / hivsim.births.sum((1))
+    mod_data['Site'] = 'Goals'
+    mod_data['Source'] = 'Goals'
+    return anc_data, mod_data
+
+def hiv_frames(hivsim, hivdat):
+    """! Observed HIV prevalence, and modeled prevalence every year for the populations with data
+    @param hivsim a projected Model
+    @param hivdat a percussion hivprev object with data loaded
+    @return data frames of observed and modeled prevalence
+    """
+    hiv_data = hivdat.hiv_data.copy()
+    hiv_data['Age'] = ['%s-%s' % (amin, amax) for (amin, amax) in zip(hiv_data['AgeMin'], hiv_data['AgeMax'])]
+    hiv_data.rename(columns={'Value' : 'Prevalence'}, inplace=True)
+
+    pop_frame = hiv_data.groupby(['Population', 'Gender', 'AgeMin', 'AgeMax']).size().reset_index(name='Prevalence')
+    mod_data = _model_years(hivsim).join(pop_frame, how='cross')
+    mod_data['Prevalence'] = Estimates.HivPrevIndex(mod_data, hivsim.year_first).estimate(hivsim)
+    mod_data['Age'] = ['%s-%s' % (amin, amax) for (amin, amax) in zip(mod_data['AgeMin'], mod_data['AgeMax'])]
+    return hiv_data, mod_data
+
+def deaths_frames(hivsim, deathsdat):
+    """! Observed deaths, and modeled deaths every year for the strata with data
+    @param hivsim a projected Model
+    @param deathsdat a percussion alldeaths object with data loaded
+    @return data frames of observed and modeled deaths
+    """
+    death_data = deathsdat.death_data.copy()
+    death_data['Age'] = ['%s-%s' % (amin, amax) for (amin, amax) in zip(death_data['AgeMin'], death_data['AgeMax'])]
+    death_data.rename(columns={'Value' : 'Deaths'}, inplace=True)
+
+    pop_frame = death_data.groupby(['Gender', 'AgeMin', 'AgeMax']).size().reset_index(name='Deaths')
+    mod_data = _model_years(hivsim).join(pop_frame, how='cross')
+    mod_data['Deaths'] = Estimates.DeathsIndex(mod_data, hivsim.year_first).estimate(hivsim)
+    mod_data['Age'] = ['%s-%s' % (amin, amax) for (amin, amax) in zip(mod_data['AgeMin'], mod_data['AgeMax'])]
+    return death_data, mod_data
+
+def fit_bundle(hivsim, ancdat=None, hivdat=None, deathsdat=None):
+    """! Collect everything needed to draw calibration fit figures, so that
+    figures can be rendered later or in another process without the model
+    @param hivsim a projected Model
+    @param ancdat, hivdat, deathsdat percussion data objects, or None for data not used
+    @return a dict mapping figure names to (observed, modeled) data frame pairs
+    """
+    bundle = {}
+    if ancdat is not None:    bundle['ancfit'] = anc_frames(hivsim, ancdat)
+    if hivdat is not None:    bundle['hivfit'] = hiv_frames(hivsim, hivdat)
+    if deathsdat is not None: bundle['deathsfit'] = deaths_frames(hivsim, deathsdat)
+    return bundle
+
+def write_bundle(bundle, file_name):
+    with open(file_name, 'wb') as fh:
+        pickle.dump(bundle, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+def read_bundle(file_name):
+    with open(file_name, 'rb') as fh:
+        return pickle.load(fh)
+
+def anc_plot(anc_data, mod_data):
+    return (plotnine.ggplot(anc_data[anc_data['Site'] != 'Census'])
+            + plotnine.aes(x='Year', y='Prevalence', color='Source', group='Site')
+            + plotnine.geom_line()
+            + plotnine.geom_point()
+            + plotnine.geom_line(data=anc_data[anc_data['Site'] == 'Census'])
+            + plotnine.geom_point(data=anc_data[anc_data['Site'] == 'Census'])
+            + plotnine.geom_line(data=mod_data)
+            + plotnine.theme_bw())
+
+def hiv_plot(hiv_data, mod_data):
+    return (plotnine.ggplot(hiv_data[hiv_data['AgeMax'] > 14])
+            + plotnine.aes(x='Year', y='Prevalence', color='Gender')
+            + plotnine.geom_point()
+            + plotnine.geom_line(data=mod_data[mod_data['AgeMax'] > 14])
+            + plotnine.facet_grid('Population~Age', scales='free_y')
+            + plotnine.theme_bw()
+            + plotnine.theme(axis_text_x = plotnine.element_text(angle=90)))
+
+def deaths_plot(death_data, mod_data):
+    return (plotnine.ggplot(death_data[death_data['AgeMax'] > 14])
+            + plotnine.aes(x='Year', y='Deaths')
+            + plotnine.geom_point()
+            + plotnine.geom_line(data=mod_data[mod_data['AgeMax'] > 14])
+            + plotnine.facet_grid('Gender~Age', scales='free_y')
+            + plotnine.theme_bw()
+            + plotnine.theme(axis_text_x = plotnine.element_text(angle=90)))
+
+PLOTS = {'ancfit' : anc_plot, 'hivfit' : hiv_plot, 'deathsfit' : deaths_plot}
+
+def save_plot(name, frames, file_name, dpi=600):
+    """! Draw one figure from a bundle and save it. The file format follows the file
+    extension; TIFF files are LZW-compressed."""
+    width, height = FIGURE_SIZES[name]
+    kwargs = {'pil_kwargs' : {'compression' : 'tiff_lzw'}} if file_name.lower().endswith(('.tif', '.tiff')) else {}
+    PLOTS[name](*frames).save(filename=file_name, dpi=dpi, units="in", width=width, height=height, verbose=False, **kwargs)
+
+def render_bundle(bundle_name, output_path, formats=('tiff',), dpi=600):
+    """! Render every figure in a bundle file
+    @param bundle_name file written by write_bundle(...)
+    @param output_path directory to save figures in, named <figure>.<format>
+    @param formats file formats to save, e.g. ('tiff', 'png', 'pdf')
+    @param dpi resolution in dots per inch
+    @return names of the files written
+    """
+    written = []
+    for name, frames in read_bundle(bundle_name).items():
+        for fmt in formats:
+            file_name = os.path.join(output_path, '%s.%s' % (name, fmt))
+            save_plot(name, frames, file_name, dpi)
+            written.append(file_name)
+    return written
+
+class PlotRenderer:
+    """! Render figure bundles in background worker processes, so that callers
+    can continue with other work, such as the next calibration, meanwhile."""
+
+    def __init__(self, num_workers=1, formats=('tiff',), dpi=600):
+        """! Start the renderer
+        @param num_workers number of rendering processes
+        @param formats default file formats to save
+        @param dpi default resolution in dots per inch
+        """
+        self.formats = tuple(formats)
+        self.dpi = dpi
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers)
+
+    def submit(self, bundle_name, output_path, formats=None, dpi=None):
+        """! Queue a bundle for rendering (see render_bundle)
+        @return a concurrent.futures.Future for the names of the files written
+        """
+        return self._executor.submit(render_bundle, bundle_name, output_path,
+                                     self.formats if formats is None else tuple(formats),
+                                     self.dpi if dpi is None else dpi)
+
+    def close(self, wait=True):
+        """! Stop accepting bundles, optionally waiting for queued bundles to finish rendering"""
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,114 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+## Shared no-op context manager returned by disabled profilers. Reusing one
+## instance keeps the disabled cost to a method call and an attribute check.
+_NULL_TIMER = contextlib.nullcontext()
+
+class _Timer:
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler.record(self._name, self._start, time.perf_counter())
+        return False
+
+class Profiler:
+    """! Collect wall times for named phases of a calculation. Phases are timed
+    using context managers returned by timer(...):
+
+    with profiler.timer("project"):
+        model.project(year)
+
+    A disabled profiler returns a shared no-op context manager and records nothing.
+    """
+
+    def __init__(self, enabled=True):
+        """! Create a profiler
+        @param enabled True to record timings, False to make timers no-ops
+        """
+        self.enabled = enabled
+        self._origin = time.perf_counter()
+        self._events = {} # name -> list of (thread id, start, stop)
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        """! Return a context manager that times the enclosed block as phase name"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, t_start, t_stop):
+        """! Record one timed occurrence of phase name
+        @param name phase name
+        @param t_start start time from time.perf_counter()
+        @param t_stop stop time from time.perf_counter()
+        """
+        with self._lock:
+            self._events.setdefault(name, []).append((threading.get_ident(), t_start, t_stop))
+
+    def reset(self):
+        """! Discard all recorded timings"""
+        with self._lock:
+            self._events = {}
+            self._origin = time.perf_counter()
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """! Aggregate recorded timings by phase
+        @param percentiles percentiles of per-call time to report
+        @return a dict mapping phase names to dicts of counts, cumulative and per-call times in seconds
+        """
+        rval = {}
+        with self._lock:
+            events = {name : list(vals) for name, vals in self._events.items()}
+        for name, vals in events.items():
+            dur = np.array([t_stop - t_start for _, t_start, t_stop in vals])
+            stats = {'count' : len(dur),
+                     'total' : float(dur.sum()),
+                     'mean'  : float(dur.mean()),
+                     'max'   : float(dur.max())}
+            for p in percentiles:
+                stats['p%g' % (p)] = float(np.percentile(dur, p))
+            rval[name] = stats
+        return rval
+
+    def report(self, stream):
+        """! Write a plain-text table of summary(...) sorted by cumulative time"""
+        stats = sorted(self.summary().items(), key=lambda kv : -kv[1]['total'])
+        stream.write("%-48s %8s %10s %10s %10s\n" % ("Phase", "Count", "Total", "Mean", "p90"))
+        for name, val in stats:
+            stream.write("%-48s %8d %9.3fs %9.5fs %9.5fs\n" % (name, val['count'], val['total'], val['mean'], val['p90']))
+
+    def write_json(self, json_name):
+        """! Write summary(...) to a JSON file"""
+        with open(json_name, 'w') as fh:
+            json.dump(self.summary(), fh, indent=2, sort_keys=True)
+
+    def write_chrome_trace(self, json_name):
+        """! Write recorded timings in Chrome trace event format. Load the file
+        in chrome://tracing or https://ui.perfetto.dev to inspect it.
+        """
+        pid = os.getpid()
+        with self._lock:
+            trace = [{'name' : name,
+                      'ph'   : 'X',
+                      'ts'   : 1e6 * (t_start - self._origin),
+                      'dur'  : 1e6 * (t_stop - t_start),
+                      'pid'  : pid,
+                      'tid'  : tid} for name, vals in self._events.items() for tid, t_start, t_stop in vals]
+        with open(json_name, 'w') as fh:
+            json.dump({'traceEvents' : trace, 'displayTimeUnit' : 'ms'}, fh)
+
+## Default profiler used when instrumentation has not been requested
+DISABLED = Profiler(enabled=False)
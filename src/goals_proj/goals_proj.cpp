@@ -1,4 +1,11 @@
+#include <atomic>
+#include <chrono>
+#include <exception>
 #include <format>
+#include <map>
+#include <string>
+#include <thread>
+#include <unordered_set>
 #include <boost/math/interpolators/pchip.hpp>
 #include "goals_proj.h"
 
@@ -28,7 +35,19 @@ ValueType* prepare_array(py::array_t<ValueType> arr, const size_t ndim, size_t*
 }
 
 GoalsProj::GoalsProj(const int year_start, const int year_final)
-	: num_years(year_final - year_start + 1) {
+	: num_years(year_final - year_start + 1),
+	  year_start(year_start),
+	  year_valid(year_start - 1),
+	  year_time(nullptr),
+	  in_condom_freq(nullptr),
+	  in_sti_prev(nullptr),
+	  in_art_num(nullptr),
+	  in_art_prop(nullptr),
+	  in_art_exit(nullptr),
+	  in_art_supp(nullptr),
+	  in_uptake_mc(nullptr),
+	  years_refreshed(0) {
+	refresh_from.fill(static_cast<int>(num_years));
 	proj = new DP::Projection(year_start, year_final);
 }
 
@@ -86,6 +105,11 @@ void GoalsProj::share_output_births_exposed(array_double_t births) {
 	proj->dat.share_births_exposed(ptr_births);
 }
 
+void GoalsProj::share_output_year_time(array_double_t seconds) {
+	size_t shape[] = {num_years};
+	year_time = prepare_array(seconds, 1, shape);
+}
+
 void GoalsProj::share_input_partner_rate(array_double_t partner_rate) {
 	size_t shape[] = {num_years, DP::N_SEX, DP::N_AGE_ADULT, DP::N_POP};
 	double* ptr_partner_rate(prepare_array(partner_rate, 4, shape));
@@ -260,22 +284,39 @@ void GoalsProj::init_sex_acts(array_double_t acts) {
 
 void GoalsProj::init_condom_freq(array_double_t freq) {
 	size_t shape[] = {num_years, DP::N_BOND};
-	double* ptr_freq(prepare_array(freq, 2, shape));
-	boost::multi_array_ref<double, 2> arr_freq(ptr_freq, boost::extents[shape[0]][shape[1]]);
-	for (int t(0); t < proj->num_years(); ++t)
+	set_condom_freq(prepare_array(freq, 2, shape), 0);
+}
+
+void GoalsProj::share_input_condom_freq(array_double_t freq) {
+	size_t shape[] = {num_years, DP::N_BOND};
+	in_condom_freq = prepare_array(freq, 2, shape);
+	set_condom_freq(in_condom_freq, 0);
+}
+
+void GoalsProj::set_condom_freq(double* ptr_freq, const int t_first) {
+	boost::multi_array_ref<double, 2> arr_freq(ptr_freq, boost::extents[num_years][DP::N_BOND]);
+	for (int t(t_first); t < proj->num_years(); ++t)
 		for (int q(DP::BOND_MIN); q <= DP::BOND_MAX; ++q)
 			proj->dat.condom_freq(t, q, arr_freq[t][q]);
 }
 
 void GoalsProj::init_sti_prev(array_double_t sti_prev) {
-	const int ndim(4);
 	size_t shape[] = {num_years, DP::N_SEX, DP::N_AGE_ADULT, DP::N_POP};
-	double* ptr_sti_prev(prepare_array(sti_prev, ndim, shape));
-	boost::multi_array_ref<double, ndim> arr_sti_prev(ptr_sti_prev, boost::extents[shape[0]][shape[1]][shape[2]][shape[3]]);
-	for (int t(0); t < shape[0]; ++t)
-		for (int s(0); s < shape[1]; ++s)
-			for (int a(0); a < shape[2]; ++a)
-				for (int r(0); r < shape[3]; ++r)
+	set_sti_prev(prepare_array(sti_prev, 4, shape), 0);
+}
+
+void GoalsProj::share_input_sti_prev(array_double_t sti_prev) {
+	size_t shape[] = {num_years, DP::N_SEX, DP::N_AGE_ADULT, DP::N_POP};
+	in_sti_prev = prepare_array(sti_prev, 4, shape);
+	set_sti_prev(in_sti_prev, 0);
+}
+
+void GoalsProj::set_sti_prev(double* ptr_sti_prev, const int t_first) {
+	boost::multi_array_ref<double, 4> arr_sti_prev(ptr_sti_prev, boost::extents[num_years][DP::N_SEX][DP::N_AGE_ADULT][DP::N_POP]);
+	for (int t(t_first); t < num_years; ++t)
+		for (int s(0); s < DP::N_SEX; ++s)
+			for (int a(0); a < DP::N_AGE_ADULT; ++a)
+				for (int r(0); r < DP::N_POP; ++r)
 					proj->dat.sti_prev(t, s, a, r, arr_sti_prev[t][s][a][r]);
 }
 
@@ -360,9 +401,22 @@ void GoalsProj::init_adult_art_eligibility(array_int_t cd4) {
 
 void GoalsProj::init_adult_art_curr(array_double_t n_art, array_double_t p_art) {
 	size_t shape[] = {num_years, DP::N_SEX};
-	DP::year_sex_ref_t arr_n_art(prepare_array(n_art, 2, shape), boost::extents[shape[0]][shape[1]]);
-	DP::year_sex_ref_t arr_p_art(prepare_array(p_art, 2, shape), boost::extents[shape[0]][shape[1]]);
-	for (int t(0); t < proj->dat.num_years(); ++t) {
+	set_adult_art_curr(prepare_array(n_art, 2, shape), prepare_array(p_art, 2, shape), 0);
+}
+
+void GoalsProj::share_input_adult_art_curr(array_double_t n_art, array_double_t p_art) {
+	size_t shape[] = {num_years, DP::N_SEX};
+	double* ptr_n_art(prepare_array(n_art, 2, shape));
+	double* ptr_p_art(prepare_array(p_art, 2, shape));
+	in_art_num = ptr_n_art;
+	in_art_prop = ptr_p_art;
+	set_adult_art_curr(in_art_num, in_art_prop, 0);
+}
+
+void GoalsProj::set_adult_art_curr(double* ptr_n_art, double* ptr_p_art, const int t_first) {
+	DP::year_sex_ref_t arr_n_art(ptr_n_art, boost::extents[num_years][DP::N_SEX]);
+	DP::year_sex_ref_t arr_p_art(ptr_p_art, boost::extents[num_years][DP::N_SEX]);
+	for (int t(t_first); t < proj->dat.num_years(); ++t) {
 		proj->dat.art_num_adult(t, DP::MALE,   arr_n_art[t][0]);
 		proj->dat.art_num_adult(t, DP::FEMALE, arr_n_art[t][1]);
 		proj->dat.art_prop_adult(t, DP::MALE,   arr_p_art[t][0]);
@@ -376,19 +430,39 @@ void GoalsProj::init_adult_art_allocation(const double weight) {
 
 void GoalsProj::init_adult_art_interruption(array_double_t art_exit_rate) {
 	size_t shape[] = {num_years, DP::N_SEX};
-	DP::year_sex_ref_t arr_exit(prepare_array(art_exit_rate, 2, shape), boost::extents[shape[0]][shape[1]]);
-	for (int t(0); t < proj->dat.num_years(); ++t) {
+	set_adult_art_interruption(prepare_array(art_exit_rate, 2, shape), 0);
+}
+
+void GoalsProj::share_input_adult_art_interruption(array_double_t art_exit_rate) {
+	size_t shape[] = {num_years, DP::N_SEX};
+	in_art_exit = prepare_array(art_exit_rate, 2, shape);
+	set_adult_art_interruption(in_art_exit, 0);
+}
+
+void GoalsProj::set_adult_art_interruption(double* ptr_exit, const int t_first) {
+	DP::year_sex_ref_t arr_exit(ptr_exit, boost::extents[num_years][DP::N_SEX]);
+	for (int t(t_first); t < proj->dat.num_years(); ++t) {
 		proj->dat.art_exit_adult(t, DP::MALE,   arr_exit[t][0]);
 		proj->dat.art_exit_adult(t, DP::FEMALE, arr_exit[t][1]);
 	}
 }
 
 void GoalsProj::init_adult_art_suppressed(array_double_t art_supp_pct) {
+	size_t shape[] = {num_years, DP::N_SEX * 4};
+	set_adult_art_suppressed(prepare_array(art_supp_pct, 2, shape), 0);
+}
+
+void GoalsProj::share_input_adult_art_suppressed(array_double_t art_supp_pct) {
+	size_t shape[] = {num_years, DP::N_SEX * 4};
+	in_art_supp = prepare_array(art_supp_pct, 2, shape);
+	set_adult_art_suppressed(in_art_supp, 0);
+}
+
+void GoalsProj::set_adult_art_suppressed(double* ptr_supp, const int t_first) {
 	const int n_age(4);
-	size_t shape[] = {num_years, DP::N_SEX * n_age};
-	boost::multi_array_ref<double, 2> arr_supp(prepare_array(art_supp_pct, 2, shape), boost::extents[shape[0]][shape[1]]);
+	boost::multi_array_ref<double, 2> arr_supp(ptr_supp, boost::extents[num_years][DP::N_SEX * n_age]);
 	int col_m, col_f;
-	for (int t(0); t < proj->dat.num_years(); ++t) {
+	for (int t(t_first); t < proj->dat.num_years(); ++t) {
 		for (int a(0); a < DP::N_AGE_ADULT; ++a) {
 			col_m = std::min(a / 10, n_age - 1);
 			col_f = col_m + n_age;
@@ -399,6 +473,17 @@ void GoalsProj::init_adult_art_suppressed(array_double_t art_supp_pct) {
 }
 
 void GoalsProj::init_male_circumcision_uptake(array_double_t uptake) {
+	size_t shape[] = {num_years, 17};
+	set_male_circumcision_uptake(prepare_array(uptake, 2, shape), 0);
+}
+
+void GoalsProj::share_input_male_circumcision_uptake(array_double_t uptake) {
+	size_t shape[] = {num_years, 17};
+	in_uptake_mc = prepare_array(uptake, 2, shape);
+	set_male_circumcision_uptake(in_uptake_mc, 0);
+}
+
+void GoalsProj::set_male_circumcision_uptake(double* ptr_uptake, const int t_first) {
 	using boost::math::interpolators::pchip;
 
 	const size_t n(17); // number of 5-year age groups
@@ -407,11 +492,10 @@ void GoalsProj::init_male_circumcision_uptake(array_double_t uptake) {
 	double rate, prop;
 	double dy_bgn, dy_end; // derivatives at left and right boundaries
 
-	size_t shape[] = {num_years, n};
-	DP::year_age_ref_t arr_uptake(prepare_array(uptake, 2, shape), boost::extents[shape[0]][shape[1]]);
+	DP::year_age_ref_t arr_uptake(ptr_uptake, boost::extents[num_years][n]);
 
 	y[0] = 0.0;
-	for (int t(0); t < proj->dat.num_years(); ++t) {
+	for (int t(t_first); t < proj->dat.num_years(); ++t) {
 		// Calculate cumulative exposure to circumcision uptake at the
 		// boundaries of five-year age groups
 		for (int a(0); a < n; ++a) {
@@ -464,13 +548,109 @@ void GoalsProj::init_clhiv_agein(array_double_t clhiv) {
 }
 
 void GoalsProj::project(const int year_final) {
-	proj->project(year_final);
+	refresh_shared_inputs();
+	if (year_time == nullptr) {
+		proj->project(year_final);
+	} else {
+		// The engine resumes from the latest year calculated, so projecting
+		// one year at a time gives the same result as a single call
+		for (int year(year_valid + 1); year <= year_final; ++year) {
+			const auto t_start(std::chrono::steady_clock::now());
+			proj->project(year);
+			const std::chrono::duration<double> elapsed(std::chrono::steady_clock::now() - t_start);
+			year_time[year - year_start] = elapsed.count();
+		}
+	}
+	year_valid = std::max(year_valid, year_final);
 }
 
 void GoalsProj::invalidate(const int year) {
 	proj->invalidate(year);
+	year_valid = std::max(std::min(year_valid, year - 1), year_start - 1);
+}
+
+void GoalsProj::refresh_input(const std::string& name, const int year) {
+	// Inputs the engine reads from client memory need no reloading, so they
+	// map to N_REFRESH. Both ART inputs are reloaded together.
+	static const std::map<std::string, int> inputs{
+		{"condom_freq",    REFRESH_CONDOM_FREQ},
+		{"sti_prev",       REFRESH_STI_PREV},
+		{"art_num",        REFRESH_ART_CURR},
+		{"art_prop",       REFRESH_ART_CURR},
+		{"art_exit_rate",  REFRESH_ART_EXIT},
+		{"art_suppressed", REFRESH_ART_SUPP},
+		{"uptake_mc",      REFRESH_UPTAKE_MC},
+		{"partner_rate",   N_REFRESH},
+		{"age_mixing",     N_REFRESH},
+		{"pop_assort",     N_REFRESH},
+		{"pwid_force",     N_REFRESH},
+		{"needle_sharing", N_REFRESH}};
+	const auto it(inputs.find(name));
+	if (it == inputs.end())
+		throw std::runtime_error(std::format("{} is not a shared input", name));
+	if (it->second < N_REFRESH)
+		refresh_from[it->second] = std::min(refresh_from[it->second], std::max(year - year_start, 0));
+	invalidate(year);
+}
+
+size_t GoalsProj::refreshed_input_years() const {
+	return years_refreshed;
+}
+
+void GoalsProj::refresh_shared_inputs() {
+	for (int k(0); k < N_REFRESH; ++k) {
+		const int t_first(refresh_from[k]);
+		if (t_first >= num_years) continue;
+		bool loaded(false);
+		switch (k) {
+		case REFRESH_CONDOM_FREQ: if ((loaded = in_condom_freq)) set_condom_freq(in_condom_freq, t_first); break;
+		case REFRESH_STI_PREV:    if ((loaded = in_sti_prev))    set_sti_prev(in_sti_prev, t_first); break;
+		case REFRESH_ART_CURR:    if ((loaded = in_art_num))     set_adult_art_curr(in_art_num, in_art_prop, t_first); break;
+		case REFRESH_ART_EXIT:    if ((loaded = in_art_exit))    set_adult_art_interruption(in_art_exit, t_first); break;
+		case REFRESH_ART_SUPP:    if ((loaded = in_art_supp))    set_adult_art_suppressed(in_art_supp, t_first); break;
+		case REFRESH_UPTAKE_MC:   if ((loaded = in_uptake_mc))   set_male_circumcision_uptake(in_uptake_mc, t_first); break;
+		}
+		if (loaded) years_refreshed += num_years - t_first;
+		refresh_from[k] = static_cast<int>(num_years);
+	}
 }
 
 void GoalsProj::use_direct_incidence(const bool flag) {
 	proj->dat.direct_incidence(flag);
 }
+
+void project_many(std::vector<GoalsProj*> projections, const int year_final, const int num_threads) {
+	const size_t num_proj(projections.size());
+
+	// Two threads projecting the same projection would race on its outputs
+	if (std::unordered_set<GoalsProj*>(projections.begin(), projections.end()).size() != num_proj)
+		throw std::runtime_error(std::format("project_many requires distinct projections"));
+
+	size_t num_workers(num_threads > 0 ? num_threads : std::thread::hardware_concurrency());
+	num_workers = std::max<size_t>(1, std::min(num_workers, num_proj));
+
+	// Threads claim projections one at a time so that faster projections do not
+	// leave threads idle. Exceptions are stored and rethrown on this thread,
+	// since an exception escaping a std::thread terminates the process.
+	std::atomic<size_t> next(0);
+	std::vector<std::exception_ptr> errors(num_proj);
+	auto work = [&]() {
+		for (size_t k(next++); k < num_proj; k = next++) {
+			try {
+				projections[k]->project(year_final);
+			} catch (...) {
+				errors[k] = std::current_exception();
+			}
+		}
+	};
+
+	std::vector<std::thread> threads;
+	for (size_t i(1); i < num_workers; ++i)
+		threads.emplace_back(work);
+	work();
+	for (auto& thread : threads)
+		thread.join();
+
+	for (auto& err : errors)
+		if (err) std::rethrow_exception(err);
+}
@@ -1,8 +1,11 @@
 #ifndef GOALS_PROJ_H
 #define GOALS_PROJ_H
 
+#include <array>
+#include <string>
 #include <pybind11/pybind11.h>
 #include <pybind11/numpy.h>
+#include <pybind11/stl.h>
 #include <GoalsARM.h>
 
 namespace py = pybind11;
@@ -51,6 +54,13 @@ public:
 	/// @param births Births by year
 	void share_output_births_exposed(array_double_t births);
 
+	/// Pass memory for storing wall time spent calculating each projection year
+	/// @param seconds Wall time in seconds by year
+	/// @details Once shared, project(...) calculates one year at a time and records
+	/// the time taken for each year it calculates. Entries for years that a
+	/// project(...) call does not recalculate are left unchanged.
+	void share_output_year_time(array_double_t seconds);
+
 	/// Pass partner rate inputs
 	/// @param partner_rate matrix by year (year_start:year_final), sex (male,female), age (15:80), and behavioral risk group
 	void share_input_partner_rate(array_double_t partner_rate);
@@ -71,6 +81,24 @@ public:
 	/// @param needle_sharing proportion of PWID who share needles by year
 	void share_input_pwid_risk(array_double_t force, array_double_t needle_sharing);
 
+	/// Pass condom use inputs by year and partnership type. See init_condom_freq.
+	void share_input_condom_freq(array_double_t freq);
+
+	/// Pass STI symptom prevalence by year, sex, age, and behavioral risk group. See init_sti_prev.
+	void share_input_sti_prev(array_double_t sti_prev);
+
+	/// Pass adult ART program size by year and sex. See init_adult_art_curr.
+	void share_input_adult_art_curr(array_double_t n_art, array_double_t p_art);
+
+	/// Pass adult ART interruption rates by year and sex. See init_adult_art_interruption.
+	void share_input_adult_art_interruption(array_double_t art_exit_rate);
+
+	/// Pass adult viral suppression on ART by year, sex and age. See init_adult_art_suppressed.
+	void share_input_adult_art_suppressed(array_double_t art_supp_pct);
+
+	/// Pass male circumcision uptake by year and five-year age group. See init_male_circumcision_uptake.
+	void share_input_male_circumcision_uptake(array_double_t uptake);
+
 	/// Use a UPD file to initialize demographic inputs
 	/// @param upd_filename UPD file name
 	void initialize(const std::string& upd_filename);
@@ -288,18 +316,82 @@ public:
 	/// will not recalculate years <= t. Use invalidate(...) to reset 
 	/// this to a selected year. Setting year < 0 will cause the next
 	/// project(...) call to start from the first year of projection.
+	/// Invalidating does not reload shared inputs; see refresh_input(...).
 	inline void invalidate(const int year);
 
+	/// Mark a shared input as modified in client memory from year onward
+	/// @param name the input's name: condom_freq, sti_prev, art_num, art_prop,
+	/// art_exit_rate, art_suppressed, uptake_mc, partner_rate, age_mixing,
+	/// pop_assort, pwid_force or needle_sharing
+	/// @param year the first year modified
+	/// @details Inputs the engine stores in its own layout are reloaded from
+	/// year onward at the start of the next project(...) call. Other shared
+	/// inputs are read directly from client memory and need no reloading.
+	/// Projected years from year onward are invalidated.
+	void refresh_input(const std::string& name, const int year);
+
+	/// Total number of input years reloaded by refresh_input(...) requests, for testing
+	size_t refreshed_input_years() const;
+
 	/// Toggle use of direct incidence. If flag=TRUE, 
 	/// @param flag If TRUE if direct incidence inputs should be used,
 	/// FALSE if mechanistic incidence calculations should be done
 	void use_direct_incidence(const bool flag);
 
 private:
+	/// Helpers for init_* and share_input_* methods that set inputs from year index t_first onward
+	void set_condom_freq(double* ptr_freq, const int t_first);
+	void set_sti_prev(double* ptr_sti_prev, const int t_first);
+	void set_adult_art_curr(double* ptr_n_art, double* ptr_p_art, const int t_first);
+	void set_adult_art_interruption(double* ptr_exit, const int t_first);
+	void set_adult_art_suppressed(double* ptr_supp, const int t_first);
+	void set_male_circumcision_uptake(double* ptr_uptake, const int t_first);
+
+	/// Reload inputs marked by refresh_input(...) from the first year index marked
+	void refresh_shared_inputs();
+
+	/// Inputs that the engine copies into its own storage, indexing refresh_from
+	enum {
+		REFRESH_CONDOM_FREQ,
+		REFRESH_STI_PREV,
+		REFRESH_ART_CURR,
+		REFRESH_ART_EXIT,
+		REFRESH_ART_SUPP,
+		REFRESH_UPTAKE_MC,
+		N_REFRESH
+	};
+
 	DP::Projection* proj;
 	size_t num_years;
+	int year_start;
+	int year_valid; // latest year calculated, or year_start-1 if none
+	double* year_time;
+
+	// Client memory passed by share_input_* methods for inputs that the engine
+	// copies into its own storage. These are nullptr unless shared.
+	double* in_condom_freq;
+	double* in_sti_prev;
+	double* in_art_num;
+	double* in_art_prop;
+	double* in_art_exit;
+	double* in_art_supp;
+	double* in_uptake_mc;
+
+	// First year index to reload each copied input from, or num_years if unchanged
+	std::array<int, N_REFRESH> refresh_from;
+	size_t years_refreshed;
 };
 
+/// Calculate several independent projections concurrently
+/// @param projections projections to calculate. These must be distinct objects
+/// that do not share output storage.
+/// @param year_final the last year to project
+/// @param num_threads number of threads to use. If num_threads <= 0, one thread per hardware thread is used.
+/// @details Each projection resumes from its latest calculated year, as in
+/// GoalsProj::project. If any projection throws, the first exception (in
+/// the order of projections) is rethrown after all threads finish.
+void project_many(std::vector<GoalsProj*> projections, const int year_final, const int num_threads);
+
 // GoalsProj is an interface to the calculation engine
 // 
 // Memory management: The calculation engine uses some workspaces allocated by
@@ -309,7 +401,11 @@ private:
 // 
 // share_input: The calculation engine retains references to arguments for the
 // lifetime of the GoalsProj instance. These arguments are not modified by the
-// calculation engine.
+// calculation engine. Some engine inputs (condom use, STI prevalence, adult ART,
+// male circumcision) are stored by the engine in its own layout. After modifying
+// one of these in place from year y, call refresh_input(name, y) so the next
+// project(...) rereads it from y onward. Only inputs marked this way are
+// reread, so invalidate(...) alone does no input work.
 // 
 // share_output: The calculation engine retains references to arguments for the
 // lifetime of the GoalsProj instance. These arguments may be modified by the
@@ -321,6 +417,11 @@ private:
 // 
 // py::keep_alive<1,n>() keeps the garbage collector from deallocating argument 
 // n so long as the GoalsProj instance (argument 1) is still alive
+// 
+// project, invalidate and project_many release the global interpreter lock
+// while they run, so Python threads may calculate different projections
+// concurrently. Calling them on the same GoalsProj instance from several
+// threads at once is not safe.
 PYBIND11_MODULE(goals_proj, m) {
 	py::class_<GoalsProj>(m, "Projection")
 		.def(py::init<const int, const int>())
@@ -330,10 +431,17 @@ PYBIND11_MODULE(goals_proj, m) {
 		.def("share_output_deaths",         &GoalsProj::share_output_deaths,         py::keep_alive<1,2>(), py::keep_alive<1,3>(), py::keep_alive<1,4>(), py::keep_alive<1,5>())
 		.def("share_output_births_exposed", &GoalsProj::share_output_births_exposed, py::keep_alive<1,2>())
 		.def("share_output_new_infections", &GoalsProj::share_output_new_infections, py::keep_alive<1,2>())
+		.def("share_output_year_time",      &GoalsProj::share_output_year_time,      py::keep_alive<1,2>())
 		.def("share_input_partner_rate",    &GoalsProj::share_input_partner_rate,    py::keep_alive<1,2>())
 		.def("share_input_age_mixing",      &GoalsProj::share_input_age_mixing,      py::keep_alive<1,2>())
 		.def("share_input_pop_assort",	    &GoalsProj::share_input_pop_assort,      py::keep_alive<1,2>())
 		.def("share_input_pwid_risk",       &GoalsProj::share_input_pwid_risk,       py::keep_alive<1,2>(), py::keep_alive<1,3>())
+		.def("share_input_condom_freq",     &GoalsProj::share_input_condom_freq,     py::keep_alive<1,2>())
+		.def("share_input_sti_prev",        &GoalsProj::share_input_sti_prev,        py::keep_alive<1,2>())
+		.def("share_input_adult_art_curr",  &GoalsProj::share_input_adult_art_curr,  py::keep_alive<1,2>(), py::keep_alive<1,3>())
+		.def("share_input_adult_art_interruption",   &GoalsProj::share_input_adult_art_interruption,   py::keep_alive<1,2>())
+		.def("share_input_adult_art_suppressed",     &GoalsProj::share_input_adult_art_suppressed,     py::keep_alive<1,2>())
+		.def("share_input_male_circumcision_uptake", &GoalsProj::share_input_male_circumcision_uptake, py::keep_alive<1,2>())
 
 		.def("initialize",                    &GoalsProj::initialize)
 		.def("init_pasfrs_from_5yr",          &GoalsProj::init_pasfrs_from_5yr)
@@ -362,13 +470,18 @@ PYBIND11_MODULE(goals_proj, m) {
 		.def("init_effect_vmmc",              &GoalsProj::init_effect_vmmc)
 		.def("init_effect_condom",            &GoalsProj::init_effect_condom)
 
-		.def("project",    &GoalsProj::project)
-		.def("invalidate", &GoalsProj::invalidate)
+		.def("project",    &GoalsProj::project,    py::call_guard<py::gil_scoped_release>())
+		.def("invalidate", &GoalsProj::invalidate, py::call_guard<py::gil_scoped_release>())
+		.def("refresh_input", &GoalsProj::refresh_input)
+		.def("refreshed_input_years", &GoalsProj::refreshed_input_years)
 
 		.def("use_direct_incidence", &GoalsProj::use_direct_incidence)
 
 		;
 
+	m.def("project_many", &project_many, py::arg("projections"), py::arg("year_final"), py::arg("num_threads") = 0,
+		py::call_guard<py::gil_scoped_release>());
+
 #ifdef VERSION_INFO
 #else
 	m.attr("__version__") = "dev";
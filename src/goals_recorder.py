@@ -0,0 +1,144 @@
+import concurrent.futures
+import sys
+import time
+import numpy as np
+
+## Scalar columns stored for each evaluation, in file order
+COLUMNS = ['eval', 'time', 'posterior', 'lhood', 'lhood_hiv', 'lhood_anc', 'lhood_deaths', 'prior']
+
+class EvalRecorder:
+    """! Record likelihood evaluations during calibration. Records accumulate in
+    preallocated column buffers and are written to a trace file in batches by a
+    background thread, so the evaluation loop does not wait on file I/O.
+    Progress summaries are written every report_every evaluations.
+
+    Trace files store the parameter names, then each batch as consecutive .npy
+    arrays (one per column in COLUMNS, then the batch's parameter matrix). Use
+    read_trace(...) to load one.
+    """
+
+    def __init__(self, par_names, trace_name=None, batch_size=256, report_every=100, stream=sys.stderr):
+        """! Create a recorder
+        @param par_names names of the calibrated parameters, in the order they appear in parameter vectors
+        @param trace_name trace file name, or None to keep only the in-memory summary
+        @param batch_size number of evaluations buffered before a batch is written
+        @param report_every number of evaluations between progress summaries (0 to disable)
+        @param stream where progress summaries are written
+        """
+        self.par_names = list(par_names)
+        self.batch_size = batch_size
+        self.report_every = report_every
+        self.stream = stream
+
+        self._buffers = [self._allocate(), self._allocate()] # double-buffered so recording continues during writes
+        self._active = 0
+        self._fill = 0
+        self._pending = None
+
+        self.num_evals = 0
+        self.best_posterior = -np.inf
+        self.best_params = None
+        self._time_start = time.perf_counter()
+
+        self._file = None
+        self._writer = None
+        if trace_name is not None:
+            self._file = open(trace_name, 'wb')
+            np.save(self._file, np.array(self.par_names, dtype=str))
+            self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def _allocate(self):
+        cols = {name : np.zeros(self.batch_size, dtype=np.float64) for name in COLUMNS}
+        cols['eval'] = np.zeros(self.batch_size, dtype=np.int64)
+        cols['params'] = np.zeros((self.batch_size, len(self.par_names)), dtype=np.float64)
+        return cols
+
+    def record(self, params, lhood, lhood_hiv, lhood_anc, lhood_deaths, prior, seconds):
+        """! Record one evaluation
+        @param params parameter vector evaluated
+        @param lhood total log-likelihood
+        @param lhood_hiv log-likelihood of HIV prevalence data
+        @param lhood_anc log-likelihood of ANC prevalence data
+        @param lhood_deaths log-likelihood of deaths data
+        @param prior log prior density
+        @param seconds wall time spent on the evaluation
+        """
+        cols, k = self._buffers[self._active], self._fill
+        posterior = lhood + prior
+        cols['eval'][k] = self.num_evals
+        cols['time'][k] = seconds
+        cols['posterior'][k] = posterior
+        cols['lhood'][k] = lhood
+        cols['lhood_hiv'][k] = lhood_hiv
+        cols['lhood_anc'][k] = lhood_anc
+        cols['lhood_deaths'][k] = lhood_deaths
+        cols['prior'][k] = prior
+        cols['params'][k,:] = params
+
+        self.num_evals += 1
+        self._fill += 1
+        if posterior > self.best_posterior:
+            self.best_posterior = posterior
+            self.best_params = np.array(params, dtype=np.float64)
+
+        if self._fill == self.batch_size:
+            self.flush()
+        if self.report_every > 0 and self.num_evals % self.report_every == 0:
+            self.report()
+
+    def flush(self):
+        """! Hand buffered records to the background writer"""
+        if self._fill == 0:
+            return
+        if self._writer is not None:
+            if self._pending is not None:
+                self._pending.result() # the other buffer must be written out before we reuse it
+            self._pending = self._writer.submit(self._write, self._buffers[self._active], self._fill)
+        self._active = 1 - self._active
+        self._fill = 0
+
+    def _write(self, cols, n):
+        for name in COLUMNS:
+            np.save(self._file, cols[name][:n])
+        np.save(self._file, cols['params'][:n,:])
+
+    def report(self):
+        """! Write a one-line progress summary"""
+        elapsed = time.perf_counter() - self._time_start
+        self.stream.write("%d evaluations in %0.1fs (%0.2f/s), best log-posterior %0.3f\n"
+                          % (self.num_evals, elapsed, self.num_evals / max(elapsed, 1e-12), self.best_posterior))
+
+    def close(self):
+        """! Write any remaining records and close the trace file"""
+        self.flush()
+        if self._writer is not None:
+            if self._pending is not None:
+                self._pending.result()
+            self._writer.shutdown()
+            self._file.close()
+            self._writer, self._file, self._pending = None, None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def read_trace(trace_name):
+    """! Load a trace file written by EvalRecorder
+    @param trace_name trace file name
+    @return a dict with one array per column in COLUMNS, 'params' (evaluations by
+    parameters) and 'par_names'
+    """
+    batches = {name : [] for name in COLUMNS + ['params']}
+    with open(trace_name, 'rb') as fh:
+        par_names = [str(name) for name in np.load(fh)]
+        while fh.peek(1): # peek returns no bytes at end of file
+            for name in COLUMNS + ['params']:
+                batches[name].append(np.load(fh))
+    rval = {name : np.concatenate(vals) if len(vals) else np.zeros(0) for name, vals in batches.items()}
+    if len(batches['params']) == 0:
+        rval['params'] = np.zeros((0, len(par_names)))
+    rval['par_names'] = par_names
+    return rval
@@ -33,3 +33,48 @@ class Results:
             + self._model.pop_adult_hiv[:,CONST.SEX_FEMALE,:,:,:,:].sum((2,3,4))
         
         return(rval)
+
+    def _by_sex(self, array):
+        """! Collapse the sex and circumcision dimension (axis 1) to females and males"""
+        return np.stack([array[:,CONST.SEX_FEMALE], array[:,CONST.SEX_MALE_U:(CONST.SEX_MALE_C+1)].sum((1))], axis=1)
+
+    def adult_pop(self, age_min=15, age_max=49):
+        """! Calculate HIV-negative and HIV-positive adults by year and sex
+        @param age_min youngest age to include (15 or older)
+        @param age_max oldest age to include (80 or younger)
+        @return arrays of HIV-negative and HIV-positive adults, by year and sex (female, male)
+        """
+        amin, amax = age_min - CONST.AGE_ADULT_MIN, age_max - CONST.AGE_ADULT_MIN + 1
+        pop_neg = self._model.pop_adult_neg[:,:,amin:amax,:].sum((2,3))
+        pop_hiv = self._model.pop_adult_hiv[:,:,amin:amax,:,:,:].sum((2,3,4,5))
+        return self._by_sex(pop_neg), self._by_sex(pop_hiv)
+
+    def prevalence(self, age_min=15, age_max=49):
+        """! Calculate adult HIV prevalence by year and sex (female, male)
+        @param age_min youngest age to include (15 or older)
+        @param age_max oldest age to include (80 or younger)
+        """
+        pop_neg, pop_hiv = self.adult_pop(age_min, age_max)
+        return pop_hiv / (pop_neg + pop_hiv)
+
+    def incidence(self, age_min=15, age_max=49):
+        """! Calculate adult HIV incidence by year and sex (female, male). Incidence in
+        year t is new infections during year t per HIV-negative person at the end of year
+        t-1. Incidence is reported as zero in the first year of projection.
+        @param age_min youngest age to include (15 or older)
+        @param age_max oldest age to include (80 or younger)
+        """
+        pop_neg, _ = self.adult_pop(age_min, age_max)
+        new_hiv = self._by_sex(self._model.new_infections[:,:,age_min:(age_max+1),:].sum((2,3)))
+        rval = np.zeros(new_hiv.shape, dtype=self._dtype, order=self._order)
+        rval[1:,:] = new_hiv[1:,:] / pop_neg[:-1,:]
+        return rval
+
+    def deaths(self, hiv_only=False):
+        """! Calculate all-cause deaths by year and sex (female, male)
+        @param hiv_only if True, only count deaths among people living with HIV
+        """
+        rval = self._model.deaths_adult_hiv.sum((2,3,4,5)) + self._model.deaths_child_hiv.sum((2,3,4))
+        if not hiv_only:
+            rval = rval + self._model.deaths_adult_neg.sum((2,3)) + self._model.deaths_child_neg.sum((2))
+        return self._by_sex(rval)
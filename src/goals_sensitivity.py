@@ -0,0 +1,129 @@
+import numpy as np
+import src.goals_results as Results
+
+## Indicators available for sensitivity analysis. Each maps a Results object to
+## an array by year and sex (female, male).
+INDICATORS = {'prevalence' : lambda res : res.prevalence(),
+              'incidence'  : lambda res : res.incidence(),
+              'deaths'     : lambda res : res.deaths()}
+
+## Names of the likelihood components returned by GoalsFitter.likelihood, in order
+LIKELIHOOD_NAMES = ['lhood', 'lhood_hiv', 'lhood_anc', 'lhood_deaths']
+
+def evaluate(fitter, params, indicators=()):
+    """! Worker task: evaluate likelihood components and indicators at params
+    @param fitter a GoalsFitter
+    @param params parameter vector
+    @param indicators names of indicators (keys of INDICATORS) to calculate
+    @return an array of likelihood components and a dict of indicator arrays
+    """
+    lhood = np.array(fitter.likelihood(params))
+    res = Results.Results(fitter.hivsim)
+    return lhood, {name : INDICATORS[name](res) for name in indicators}
+
+class Sensitivity:
+    """! Finite-difference sensitivities of likelihood components and model
+    indicators to calibrated parameters. Perturbed parameter vectors are
+    evaluated in parallel on a goals_workers.FitterPool.
+    """
+
+    def __init__(self, pool, par_names, lower, upper, rel_step=1e-4, min_step=1e-8):
+        """! Set up sensitivity calculations
+        @param pool a goals_workers.FitterPool
+        @param par_names names of the parameters, in parameter vector order
+        @param lower lower parameter bounds
+        @param upper upper parameter bounds. Each upper bound must exceed its lower bound.
+        @param rel_step finite difference step size relative to each parameter's magnitude
+        @param min_step smallest step size allowed
+        """
+        self.pool = pool
+        self.par_names = list(par_names)
+        self.lower = np.array(lower, dtype=np.float64)
+        self.upper = np.array(upper, dtype=np.float64)
+        fixed = [name for name, lo, hi in zip(self.par_names, self.lower, self.upper) if not lo < hi]
+        if len(fixed) > 0:
+            raise ValueError('Parameters %s have no room between their bounds for finite differences' % (', '.join(fixed)))
+        self.rel_step = rel_step
+        self.min_step = min_step
+
+    def steps(self, params):
+        """! Finite difference step sizes for each parameter"""
+        return np.maximum(self.rel_step * np.abs(params), self.min_step)
+
+    def _stencil(self, params, scheme, base=False):
+        """! Build perturbed parameter vectors
+        @param base True to evaluate params itself even if no difference uses it. Central
+        differences use it only where they fall back to one-sided differences at a bound.
+        @return a list of parameter vectors to evaluate, starting with params if it is
+        evaluated, and, for each parameter, the indices of its upper and lower points in
+        that list and the distance between them
+        """
+        x = np.array(params, dtype=np.float64)
+        h = self.steps(x)
+        points, terms = [x], []
+        for i in range(len(x)):
+            x_hi, x_lo = x.copy(), x.copy()
+            if scheme == 'central':
+                x_hi[i] = min(x[i] + h[i], self.upper[i])
+                x_lo[i] = max(x[i] - h[i], self.lower[i])
+            elif x[i] + h[i] <= self.upper[i]:
+                x_hi[i] = x[i] + h[i] # forward difference
+            else:
+                x_lo[i] = x[i] - h[i] # backward difference at the upper bound
+            idx_hi, idx_lo = 0, 0
+            if x_hi[i] != x[i]:
+                idx_hi = len(points)
+                points.append(x_hi)
+            if x_lo[i] != x[i]:
+                idx_lo = len(points)
+                points.append(x_lo)
+            terms.append((idx_hi, idx_lo, x_hi[i] - x_lo[i]))
+        if not base and all(idx_hi > 0 and idx_lo > 0 for idx_hi, idx_lo, dx in terms):
+            return points[1:], [(idx_hi - 1, idx_lo - 1, dx) for idx_hi, idx_lo, dx in terms]
+        return points, terms
+
+    def jacobian(self, params, scheme='central', indicators=('prevalence', 'incidence', 'deaths')):
+        """! Calculate finite-difference Jacobians at params
+        @param params parameter vector
+        @param scheme 'central' or 'forward'. Central differences fall back to one-sided
+        differences at parameter bounds.
+        @param indicators names of indicators (keys of INDICATORS) to differentiate
+        @return a dict with entries
+        - 'par_names': parameter names
+        - 'likelihood_names': likelihood component names
+        - 'likelihood': likelihood components at params
+        - 'likelihood_jacobian': array by likelihood component and parameter
+        - 'indicators': dict of indicator arrays (year by sex) at params
+        - 'indicator_jacobians': dict of arrays by parameter, year and sex
+        """
+        if scheme not in ('central', 'forward'):
+            raise ValueError('Unrecognized finite difference scheme %s' % (scheme))
+
+        points, terms = self._stencil(params, scheme, base=True) # results[0] is returned at params
+        results = self.pool.map(evaluate, [(x, tuple(indicators)) for x in points])
+
+        lhood_jac = np.zeros((len(LIKELIHOOD_NAMES), len(terms)))
+        ind_jac = {name : np.zeros((len(terms),) + results[0][1][name].shape) for name in indicators}
+        for i, (idx_hi, idx_lo, dx) in enumerate(terms):
+            lhood_jac[:,i] = (results[idx_hi][0] - results[idx_lo][0]) / dx
+            for name in indicators:
+                ind_jac[name][i] = (results[idx_hi][1][name] - results[idx_lo][1][name]) / dx
+
+        return {'par_names'           : self.par_names,
+                'likelihood_names'    : LIKELIHOOD_NAMES,
+                'likelihood'          : results[0][0],
+                'likelihood_jacobian' : lhood_jac,
+                'indicators'          : results[0][1],
+                'indicator_jacobians' : ind_jac}
+
+    def gradient(self, params, prior=None, scheme='central'):
+        """! Gradient of the log-likelihood, or of the log-posterior if prior is given
+        @param params parameter vector
+        @param prior optional callable returning the log prior density of a parameter vector
+        @param scheme 'central' or 'forward'
+        """
+        points, terms = self._stencil(params, scheme)
+        lhood = [val[0][0] for val in self.pool.map(evaluate, [(x,) for x in points])]
+        if prior is not None:
+            lhood = [val + prior(x) for val, x in zip(lhood, points)]
+        return np.array([(lhood[idx_hi] - lhood[idx_lo]) / dx for idx_hi, idx_lo, dx in terms])
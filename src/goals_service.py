@@ -0,0 +1,228 @@
+import asyncio
+import http.client
+import io
+import json
+import time
+import numpy as np
+import src.goals_model as Goals
+import src.goals_results as Results
+import src.goals_sensitivity as Sensitivity
+
+## Model inputs that scenario requests may override. These are shared with the
+## calculation engine, so they can be modified in place and reloaded by
+## Model.refresh_input(name, year). All are arrays with year as the leading dimension.
+SCENARIO_INPUTS = ('art_num', 'art_prop', 'art_exit_rate', 'art_suppressed', 'uptake_mc',
+                   'condom_freq', 'sti_prev', 'partner_rate', 'pwid_force', 'needle_sharing')
+
+class RequestError(Exception):
+    """! A scenario request that cannot be processed as given"""
+    pass
+
+class ModelPool:
+    """! A pool of initialized models that share one workbook's inputs. Models
+    are checked out for one scenario at a time. After a scenario, overridden
+    inputs are restored from a baseline copy, and the model remembers the
+    earliest year affected so the next scenario recalculates only from there.
+    """
+
+    def __init__(self, xlsx_name, size, profiler=None):
+        """! Read a workbook and initialize size models from it
+        @param xlsx_name Excel workbook with Goals ARM inputs
+        @param size number of models in the pool
+        @param profiler optional goals_profile.Profiler used by the models
+        """
+        self.xlsx_name = xlsx_name
+        self.size = size
+        self.num_served = 0
+        inputs = Goals.Model(profiler=profiler).read_xlsx(xlsx_name)
+        self._models = asyncio.Queue()
+        for k in range(size):
+            model = Goals.Model(profiler=profiler)
+            model.init_from_inputs(inputs)
+            model.project(model.year_final)
+            model.stale_year = model.year_final + 1 # first year whose outputs do not match the baseline inputs
+            self._models.put_nowait(model)
+        self.year_first, self.year_final = model.year_first, model.year_final
+        self.baseline = {name : getattr(model, name).copy() for name in SCENARIO_INPUTS if hasattr(model, name)}
+
+    def idle(self):
+        """! Number of models available for new requests"""
+        return self._models.qsize()
+
+    def _apply(self, model, overrides):
+        """! Set scenario overrides into a model
+        @return the earliest year affected
+        """
+        year_min = model.year_final + 1
+        for name, spec in overrides.items():
+            if name not in self.baseline:
+                raise RequestError('Input %s cannot be overridden' % (name))
+            year = spec.get('from_year', model.year_first)
+            if year < model.year_first or year > model.year_final:
+                raise RequestError('Input %s from_year %s is outside the projection years' % (name, year))
+            t = year - model.year_first
+            target = getattr(model, name)[t:]
+            if 'values' in spec:
+                values = np.asarray(spec['values'], dtype=np.float64)
+                if values.size != target.size:
+                    raise RequestError('Input %s needs %d values from %s onward, got %d' % (name, target.size, year, values.size))
+                target[:] = values.reshape(target.shape)
+            elif 'scale' in spec:
+                target *= spec['scale']
+            else:
+                raise RequestError('Input %s override needs values or scale' % (name))
+            model.refresh_input(name, year)
+            year_min = min(year_min, year)
+        return year_min
+
+    def _run(self, model, overrides, year_stop, indicators):
+        """! Project one scenario on a checked-out model. Runs on a worker thread."""
+        try:
+            year = self._apply(model, overrides)
+            model.invalidate(min(year, model.stale_year))
+            model.project(year_stop)
+            res = Results.Results(model)
+            num_years = year_stop - model.year_first + 1 # later years may hold an earlier scenario's outputs
+            rval = {}
+            for name in indicators:
+                if name in Sensitivity.INDICATORS:
+                    rval[name] = Sensitivity.INDICATORS[name](res)[:num_years]
+                elif name in Goals.output_shapes(0):
+                    rval[name] = getattr(model, name)[:num_years].copy()
+                else:
+                    raise RequestError('Unrecognized indicator %s' % (name))
+            model.stale_year = year
+            return rval
+        except Exception:
+            model.stale_year = model.year_first # overrides may have been partly applied
+            raise
+        finally:
+            for name in overrides:
+                if name in self.baseline:
+                    getattr(model, name)[:] = self.baseline[name]
+                    model.refresh_input(name, model.stale_year)
+
+    async def project(self, overrides, year_stop, indicators):
+        """! Queue a scenario until a model is idle, then project it
+        @param overrides dict mapping names in SCENARIO_INPUTS to dicts with 'values' (an array for
+        years from_year onward) or 'scale' (a factor applied from from_year onward), and optionally
+        'from_year' (default: the first year of projection)
+        @param year_stop last year to project
+        @param indicators names of indicators (goals_sensitivity.INDICATORS) or model outputs to return
+        @return a dict mapping indicator names to arrays covering years year_first to year_stop
+        """
+        if not isinstance(year_stop, int) or isinstance(year_stop, bool) or not self.year_first <= year_stop <= self.year_final:
+            raise RequestError('year_stop %r is outside the projection years %d-%d' % (year_stop, self.year_first, self.year_final))
+        model = await self._models.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, self._run, model, overrides, year_stop, indicators)
+        finally:
+            self.num_served += 1
+            self._models.put_nowait(model)
+
+class ProjectionService:
+    """! A minimal HTTP/1.1 server for scenario projections on warm models.
+
+    POST /project with a JSON body
+        {"workbook" : name, "year_stop" : year, "indicators" : [...], "inputs" : {...}}
+    returns the requested indicators as a .npz archive (see ModelPool.project for
+    the inputs format). workbook may be omitted when the service has one workbook.
+    GET /status returns pool sizes and request counts as JSON.
+    """
+
+    def __init__(self, pools):
+        """! Create a service
+        @param pools dict mapping workbook names to ModelPool instances
+        """
+        self.pools = pools
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """! Start listening. Use port 0 to pick a free port.
+        @return the port number listened on
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _pool(self, request):
+        name = request.get('workbook')
+        if name is None and len(self.pools) == 1:
+            return next(iter(self.pools.values()))
+        if name not in self.pools:
+            raise RequestError('Unrecognized workbook %s' % (name))
+        return self.pools[name]
+
+    async def _dispatch(self, method, path, body):
+        if method == 'GET' and path == '/status':
+            status = {name : {'size' : pool.size, 'idle' : pool.idle(), 'served' : pool.num_served} for name, pool in self.pools.items()}
+            return 200, 'application/json', json.dumps(status).encode()
+        if method == 'POST' and path == '/project':
+            try:
+                request = json.loads(body)
+            except json.JSONDecodeError as err:
+                raise RequestError('Invalid JSON: %s' % (err))
+            pool = self._pool(request)
+            time_start = time.perf_counter()
+            result = await pool.project(request.get('inputs', {}), request.get('year_stop', pool.year_final),
+                                        request.get('indicators', list(Sensitivity.INDICATORS)))
+            result['seconds'] = np.array(time.perf_counter() - time_start)
+            buff = io.BytesIO()
+            np.savez(buff, **result)
+            return 200, 'application/octet-stream', buff.getvalue()
+        return 404, 'application/json', json.dumps({'error' : 'Not found'}).encode()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    key, val = line.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = val.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    code, kind, payload = await self._dispatch(method, path, body)
+                except RequestError as err:
+                    code, kind, payload = 400, 'application/json', json.dumps({'error' : str(err)}).encode()
+                except Exception as err:
+                    code, kind, payload = 500, 'application/json', json.dumps({'error' : repr(err)}).encode()
+
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n'
+                             % (code, http.client.responses[code].encode(), kind.encode(), len(payload)))
+                writer.write(payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+def request(host, port, payload, timeout=None):
+    """! Client helper: send a scenario to a running service
+    @param payload request dict (see ProjectionService)
+    @return a dict mapping indicator names to arrays
+    """
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request('POST', '/project', body=json.dumps(payload), headers={'Content-Type' : 'application/json'})
+        resp = conn.getresponse()
+        body = resp.read()
+    finally:
+        conn.close()
+    if resp.status != 200:
+        raise RequestError('%d %s' % (resp.status, json.loads(body).get('error', '')))
+    with np.load(io.BytesIO(body)) as npz:
+        return {name : npz[name] for name in npz.files}
@@ -0,0 +1,107 @@
+import time
+import numpy as np
+import src.goals_lazy as Lazy
+
+optimize = Lazy.lazy_import('scipy.optimize')
+
+class Stage:
+    """! Settings for one stage of a staged calibration"""
+
+    def __init__(self, name, truncate=False, fixed=(), tol=None, maxiter=None, num_starts=1, method='Nelder-Mead'):
+        """! Describe a stage
+        @param name stage name used in reports
+        @param truncate True to stop projections at the last year with calibration data
+        @param fixed names of parameters held at their starting values during this stage
+        @param tol optimizer tolerance (see scipy.optimize.minimize), or None for the method's default
+        @param maxiter maximum optimizer iterations per start, or None for the method's default
+        @param num_starts number of candidates, best first, to optimize from
+        @param method optimization method (see scipy.optimize.minimize)
+        """
+        self.name = name
+        self.truncate = truncate
+        self.fixed = tuple(fixed)
+        self.tol = tol
+        self.maxiter = maxiter
+        self.num_starts = num_starts
+        self.method = method
+
+def default_stages(fixed=()):
+    """! A two-stage schedule. The first stage optimizes from several starting points with
+    truncated projections, relaxed tolerances and the parameters in fixed held constant.
+    The second stage refines the best first-stage result at full fidelity.
+    """
+    return (Stage('coarse', truncate=True, fixed=fixed, tol=1e-2, num_starts=4),
+            Stage('full'))
+
+class StagedSearch:
+    """! Multi-fidelity calibration. Each stage optimizes from the best candidates found
+    by the previous stage, so expensive full-fidelity evaluations are spent only near
+    promising parameter values.
+
+    The fitter must provide parameter_names(), prior_quantile(u), bounds(), posterior(params)
+    and set_fidelity(truncate), as GoalsFitter does.
+    """
+
+    def __init__(self, fitter, stages=None, seed=None):
+        """! Set up a search
+        @param fitter the fitter to calibrate
+        @param stages sequence of Stage objects, or None for default_stages()
+        @param seed random seed for drawing starting points from the prior
+        """
+        self.fitter = fitter
+        self.stages = default_stages() if stages is None else tuple(stages)
+        self.rng = np.random.default_rng(seed)
+        self.names = fitter.parameter_names()
+        self.lower, self.upper = fitter.bounds()
+        self.report = []
+
+    def _starts(self, x_init, num_starts):
+        """! Starting points for the first stage: x_init, then draws from the prior"""
+        num_draws = num_starts if x_init is None else num_starts - 1
+        draws = self.fitter.prior_quantile(self.rng.uniform(size=(max(num_draws, 0), len(self.names))))
+        return ([] if x_init is None else [np.array(x_init, dtype=np.float64)]) + list(draws)
+
+    def _run_stage(self, stage, starts):
+        """! Optimize from each starting point at the stage's fidelity
+        @return (params, log-posterior) pairs, best first
+        """
+        free = np.array([idx for idx, name in enumerate(self.names) if name not in stage.fixed], dtype=int)
+        bounds = optimize.Bounds(lb=self.lower[free], ub=self.upper[free])
+        options = {} if stage.maxiter is None else {'maxiter' : stage.maxiter}
+        num_evals = 0
+        results = []
+        for x_start in starts:
+            params = np.array(x_start, dtype=np.float64)
+            def objective(p_free):
+                nonlocal num_evals
+                num_evals += 1
+                params[free] = p_free
+                return -self.fitter.posterior(params)
+            optres = optimize.minimize(objective, params[free], method=stage.method, bounds=bounds, tol=stage.tol, options=options)
+            params[free] = optres.x
+            results.append((params.copy(), -optres.fun))
+        results.sort(key=lambda res : -res[1])
+        return results, num_evals
+
+    def run(self, x_init=None):
+        """! Run every stage
+        @param x_init optional starting parameter values for the first stage
+        @return the best parameter values found at full fidelity, and their log-posterior.
+        Per-stage evaluation counts and times are in self.report.
+        """
+        self.report = []
+        candidates = self._starts(x_init, self.stages[0].num_starts)
+        for stage in self.stages:
+            time_start = time.perf_counter()
+            self.fitter.set_fidelity(truncate=stage.truncate)
+            results, num_evals = self._run_stage(stage, candidates[:stage.num_starts])
+            self.report.append({'stage'   : stage.name,
+                                'starts'  : min(stage.num_starts, len(candidates)),
+                                'evals'   : num_evals,
+                                'seconds' : time.perf_counter() - time_start,
+                                'best'    : results[0][1]})
+            candidates = [params for params, _ in results]
+        self.fitter.set_fidelity(truncate=False)
+        if self.stages[-1].truncate:
+            return candidates[0], self.fitter.posterior(candidates[0])
+        return results[0]
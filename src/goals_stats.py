@@ -0,0 +1,141 @@
+import numpy as np
+
+class RunningMoments:
+    """! Streaming element-wise mean and variance of equally-shaped arrays using
+    Welford's algorithm. Accumulators built from disjoint sets of arrays, e.g. in
+    different worker processes, can be combined with merge(...).
+    """
+
+    def __init__(self, shape):
+        """! Create an empty accumulator
+        @param shape shape of the arrays to accumulate
+        """
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self._m2 = np.zeros(shape, dtype=np.float64) # sum of squared deviations from the mean
+
+    def add(self, x):
+        """! Add one array"""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        """! Add all arrays accumulated by another RunningMoments instance"""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * (other.count / count)
+        self._m2 += other._m2 + delta**2 * (self.count * other.count / count)
+        self.count = count
+
+    def variance(self, ddof=1):
+        """! Element-wise variance, or nan if fewer than ddof+1 arrays have been added"""
+        if self.count <= ddof:
+            return np.full(self.mean.shape, np.nan)
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        """! Element-wise standard deviation"""
+        return np.sqrt(self.variance(ddof))
+
+class QuantileSketch:
+    """! Streaming element-wise quantiles of equally-shaped arrays in bounded
+    memory. This is a compactor-based sketch in the style of KLL: each level
+    holds up to k arrays, and a full level is sorted element-wise and every
+    other value is promoted to the next level with twice the weight. Memory is
+    O(k log(n/k)) values per element after n arrays, and rank error shrinks as
+    k grows. Sketches with the same shape and k can be combined with merge(...).
+    """
+
+    def __init__(self, shape, k=128, seed=None):
+        """! Create an empty sketch
+        @param shape shape of the arrays to summarize
+        @param k capacity of each level; must be even
+        @param seed seed for the random choices made during compaction
+        """
+        if k < 2 or k % 2:
+            raise ValueError('Sketch capacity k must be a positive even number, got %s' % (k))
+        self.shape = tuple(shape)
+        self.k = k
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+        self._buffer = np.zeros((k,) + self.shape, dtype=np.float64) # level 0
+        self._fill = 0
+        self._levels = [] # self._levels[i] holds level i+1 values, with weight 2**(i+1)
+
+    def add(self, x):
+        """! Add one array"""
+        self._buffer[self._fill] = x
+        self._fill += 1
+        self.count += 1
+        if self._fill == self.k:
+            self._fill = 0
+            self._promote(0, self._buffer)
+
+    def _promote(self, level, vals):
+        """! Compact vals from level and push the survivors up one level"""
+        vals = np.sort(vals, axis=0)
+        self._push(level, vals[self._rng.integers(2)::2])
+
+    def _push(self, level, vals):
+        """! Add vals to self._levels[level], compacting the level if it fills up"""
+        while len(self._levels) <= level:
+            self._levels.append(np.zeros((0,) + self.shape, dtype=np.float64))
+        self._levels[level] = np.concatenate((self._levels[level], vals))
+        if self._levels[level].shape[0] >= self.k:
+            full, self._levels[level] = self._levels[level], self._levels[level][:0]
+            self._promote(level + 1, full)
+
+    def merge(self, other):
+        """! Add all arrays summarized by another QuantileSketch"""
+        if other.shape != self.shape or other.k != self.k:
+            raise ValueError('Cannot merge sketches with different shapes or capacities')
+        for x in other._buffer[:other._fill]:
+            self._buffer[self._fill] = x
+            self._fill += 1
+            if self._fill == self.k:
+                self._fill = 0
+                self._promote(0, self._buffer)
+        for level, vals in enumerate(other._levels):
+            if len(vals) > 0:
+                self._push(level, vals)
+        self.count += other.count
+
+    def quantile(self, q):
+        """! Estimate element-wise quantiles
+        @param q a probability or sequence of probabilities in [0, 1]
+        @return an array of shape self.shape for scalar q, or len(q) x self.shape otherwise
+        """
+        if self.count == 0:
+            raise ValueError('Cannot calculate quantiles of an empty sketch')
+        vals = [self._buffer[:self._fill]] + self._levels
+        wgts = [np.full(len(v), 2.0**level) for level, v in enumerate(vals)]
+        vals, wgts = np.concatenate(vals), np.concatenate(wgts)
+
+        order = np.argsort(vals, axis=0)
+        vals = np.take_along_axis(vals, order, axis=0)
+        cum = np.cumsum(wgts[order], axis=0)
+
+        probs = np.atleast_1d(q)
+        rval = np.zeros((len(probs),) + self.shape, dtype=np.float64)
+        for i, p in enumerate(probs):
+            idx = np.argmax(cum >= p * cum[-1], axis=0)
+            rval[i] = np.take_along_axis(vals, idx[np.newaxis], axis=0)[0]
+        return rval[0] if np.ndim(q) == 0 else rval
+
+def latin_hypercube(num_draws, num_dims, seed=None):
+    """! Draw a Latin hypercube sample on the unit cube
+    @param num_draws number of points
+    @param num_dims number of dimensions
+    @param seed random number generator seed
+    @return an array of num_draws x num_dims points in (0,1). Each dimension has
+    exactly one point in each of num_draws equal-width strata.
+    """
+    rng = np.random.default_rng(seed)
+    u = (rng.random((num_draws, num_dims)) + np.arange(num_draws)[:,np.newaxis]) / num_draws
+    for j in range(num_dims):
+        u[:,j] = rng.permutation(u[:,j])
+    return u
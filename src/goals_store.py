@@ -0,0 +1,186 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import src.goals_model as Goals
+import src.goals_results as Results
+import src.goals_sensitivity as Sensitivity
+
+## Selectable sexes in query results, as indexed by goals_results.Results outputs
+SEXES = {'female' : 0, 'male' : 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    scenario      TEXT,
+    workbook      TEXT,
+    workbook_hash TEXT,
+    params        TEXT,
+    meta          TEXT,
+    year_first    INTEGER NOT NULL,
+    year_final    INTEGER NOT NULL,
+    created       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_scenario ON runs (scenario);
+CREATE INDEX IF NOT EXISTS runs_workbook_hash ON runs (workbook_hash);
+"""
+
+def file_hash(file_name):
+    """! SHA-256 digest of a file's contents, used to identify workbooks"""
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as fh:
+        for block in iter(lambda : fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class StoredRun:
+    """! Outputs of one stored run, memory-mapped from disk. StoredRun has the
+    same output attributes as Model over the years it covers, so indicators can
+    be calculated with goals_results.Results(run).
+    """
+
+    def __init__(self, run_path, year_first, year_final, years=None):
+        """! Map a run's outputs
+        @param run_path directory holding the run's output .npy files
+        @param year_first first year stored
+        @param year_final final year stored
+        @param years optional (first, final) pair of years to restrict the outputs to
+        """
+        first, final = (year_first, year_final) if years is None else years
+        if first < year_first or final > year_final or first > final:
+            raise ValueError('Years %d-%d are outside the stored years %d-%d' % (first, final, year_first, year_final))
+        self.year_first = first
+        self.year_final = final
+        self._dtype = np.float64
+        self._order = "C"
+        t_first, t_final = first - year_first, final - year_first + 1
+        for name in Goals.output_shapes(0):
+            setattr(self, name, np.load(os.path.join(run_path, name + '.npy'), mmap_mode='r')[t_first:t_final])
+
+class ResultsStore:
+    """! An archive of projection outputs with a searchable run index.
+
+    Each run's output arrays are saved as .npy files in their own directory, and
+    a SQLite index records each run's scenario, workbook, workbook hash,
+    parameter vector and other metadata. Outputs are laid out by year, then sex,
+    and read through memory maps, so a query for a few years or one sex reads
+    only the parts of each file that hold them.
+
+    The index may be shared by several processes adding runs at once.
+    """
+
+    def __init__(self, path):
+        """! Open a store, creating it if it does not exist
+        @param path store directory
+        """
+        self.path = path
+        os.makedirs(os.path.join(path, 'runs'), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """! Open the index for one transaction, committed on success and closed afterward"""
+        conn = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), timeout=60.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _run_path(self, run_id):
+        return os.path.join(self.path, 'runs', '%08d' % (run_id))
+
+    def add(self, model, scenario=None, workbook=None, params=None, meta=None):
+        """! Save a projected model's outputs
+        @param model a projected Model, or any object with Model's output attributes
+        @param scenario optional scenario name
+        @param workbook optional name of the workbook the model was initialized from.
+        The workbook's hash is stored so runs can be matched to their inputs later.
+        @param params optional parameter vector
+        @param meta optional dict of other JSON-serializable metadata
+        @return the new run's id
+        """
+        row = (scenario,
+               None if workbook is None else os.path.abspath(workbook),
+               None if workbook is None else file_hash(workbook),
+               None if params is None else json.dumps([float(p) for p in params]),
+               None if meta is None else json.dumps(meta),
+               model.year_first,
+               model.year_first - 1, # marks the run as incomplete until its outputs are written
+               time.time())
+
+        # Reserve the run id first, so concurrent writers never share a directory
+        with self._connect() as conn:
+            run_id = conn.execute('INSERT INTO runs (scenario, workbook, workbook_hash, params, meta, year_first, year_final, created) '
+                                  'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row).lastrowid
+        run_path = self._run_path(run_id)
+        os.makedirs(run_path, exist_ok=True)
+        for name in Goals.output_shapes(0):
+            np.save(os.path.join(run_path, name + '.npy'), np.ascontiguousarray(getattr(model, name)))
+        with self._connect() as conn:
+            conn.execute('UPDATE runs SET year_final = ? WHERE run_id = ?', (model.year_final, run_id))
+        return run_id
+
+    def runs(self, **filters):
+        """! List completely written runs, optionally filtered by index fields
+        @param filters field=value pairs to match, e.g. scenario='baseline' or workbook_hash=...
+        @return a list of dicts, one per run in run_id order, with params and meta decoded
+        """
+        fields = ('run_id', 'scenario', 'workbook', 'workbook_hash', 'year_first', 'year_final')
+        for key in filters:
+            if key not in fields:
+                raise ValueError('Cannot filter runs by %s' % (key))
+        where = ''.join(' AND %s = ?' % (key) for key in filters)
+        with self._connect() as conn:
+            rows = conn.execute('SELECT * FROM runs WHERE year_final >= year_first' + where + ' ORDER BY run_id',
+                                tuple(filters.values())).fetchall()
+        rval = []
+        for row in rows:
+            run = dict(row)
+            run['params'] = None if run['params'] is None else np.array(json.loads(run['params']))
+            run['meta'] = None if run['meta'] is None else json.loads(run['meta'])
+            rval.append(run)
+        return rval
+
+    def open_run(self, run_id, years=None):
+        """! Memory-map a stored run's outputs
+        @param run_id the run's id
+        @param years optional (first, final) pair of years to restrict the outputs to
+        @return a StoredRun
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT year_first, year_final FROM runs WHERE run_id = ? AND year_final >= year_first', (run_id,)).fetchone()
+        if row is None:
+            raise KeyError('No stored run %s' % (run_id))
+        return StoredRun(self._run_path(run_id), row['year_first'], row['year_final'], years)
+
+    def query(self, indicator, years=None, sex=None, **filters):
+        """! Calculate an indicator across stored runs. For example, prevalence among
+        women aged 15-49 from 2010 to 2030 in every baseline run is
+
+        store.query(lambda res : res.prevalence(15, 49), (2010, 2030), 'female', scenario='baseline')
+
+        @param indicator the name of an indicator in goals_sensitivity.INDICATORS, or a
+        callable that takes goals_results.Results and returns an array by year and sex
+        @param years optional (first, final) pair of years; defaults to each run's stored years
+        @param sex optional 'female' or 'male' to select one sex
+        @param filters index field=value pairs selecting runs (see runs)
+        @return run ids, and the indicator stacked by run, year and (unless sex is given) sex.
+        Runs must cover the same years.
+        """
+        calc = Sensitivity.INDICATORS[indicator] if isinstance(indicator, str) else indicator
+        run_ids, values = [], []
+        for run in self.runs(**filters):
+            # Indicators such as incidence use the year before each year reported, so
+            # include the year before the first requested when it is stored
+            lead = 0 if years is None or years[0] <= run['year_first'] else 1
+            run_years = None if years is None else (years[0] - lead, years[1])
+            val = calc(Results.Results(self.open_run(run['run_id'], run_years)))[lead:]
+            run_ids.append(run['run_id'])
+            values.append(val if sex is None else val[:,SEXES[sex]])
+        return run_ids, np.array(values)
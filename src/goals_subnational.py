@@ -0,0 +1,113 @@
+import concurrent.futures
+import threading
+import numpy as np
+import src.goals_const as CONST
+import src.goals_model as Goals
+
+class NationalTotals:
+    """! Sums of regional model outputs. NationalTotals has the same output
+    attributes as Model (pop_adult_hiv, births, etc.), so national indicators
+    can be calculated with goals_results.Results(totals).
+    """
+
+    def __init__(self, year_first, year_final):
+        """! Create zeroed totals
+        @param year_first first year of projection
+        @param year_final final year of projection
+        """
+        self.year_first = year_first
+        self.year_final = year_final
+        self._dtype = np.float64
+        self._order = "C"
+        self.regions = []
+        self._lock = threading.Lock()
+        self._shapes = Goals.output_shapes(year_final - year_first + 1)
+        for name, shape in self._shapes.items():
+            setattr(self, name, np.zeros(shape, dtype=self._dtype, order=self._order))
+
+    def add(self, name, model):
+        """! Add a projected regional model's outputs to the totals
+        @param name region name
+        @param model a projected Model
+        """
+        with self._lock:
+            for output in self._shapes:
+                getattr(self, output)[:] += getattr(model, output)
+            self.regions.append(name)
+
+class Subnational:
+    """! Regional models derived from one national template workbook. Each region
+    uses the template's inputs except for those it overrides, and regional
+    outputs are summed into national totals as regions finish projecting.
+    """
+
+    def __init__(self, template_xlsx, profiler=None):
+        """! Read the template workbook
+        @param template_xlsx Excel workbook with inputs shared by all regions
+        @param profiler optional goals_profile.Profiler used by regional models
+        """
+        self._profiler = profiler
+        self.template = Goals.Model(profiler=profiler).read_xlsx(template_xlsx)
+        self.overrides = {}
+
+    def add_region(self, name, overrides=None, xlsx_name=None, names=()):
+        """! Add a region. Region inputs can be given directly, read from a regional
+        workbook, or both; inputs given directly take precedence.
+        @param name region name
+        @param overrides dict mapping input names (see Model.read_xlsx) to regional values
+        @param xlsx_name optional regional workbook to read inputs from
+        @param names names of inputs to read from xlsx_name, e.g., ('popsize', 'adult_art')
+        """
+        if name in self.overrides:
+            raise ValueError('Region %s has already been added' % (name))
+        region = {}
+        if xlsx_name is not None:
+            region = Goals.Model(profiler=self._profiler).read_xlsx(xlsx_name, names)
+            region = {key : val for key, val in region.items() if key in names}
+        if overrides is not None:
+            region |= overrides
+
+        if 'config' in region:
+            for key in (CONST.CFG_FIRST_YEAR, CONST.CFG_FINAL_YEAR):
+                if region['config'][key] != self.template['config'][key]:
+                    raise ValueError('Region %s must have the same projection years as the template' % (name))
+        self.overrides[name] = region
+
+    def region_inputs(self, name):
+        """! Raw inputs for a region: the template's inputs with the region's overrides applied"""
+        return self.template | self.overrides[name]
+
+    def _project_region(self, name, year_stop, totals, keep):
+        model = Goals.Model(profiler=self._profiler)
+        model.init_from_inputs(self.region_inputs(name))
+        model.project(year_stop)
+        totals.add(name, model)
+        return model if keep else None
+
+    def project(self, year_stop=None, num_workers=None, keep_regions=False, callback=None):
+        """! Initialize and project every region, summing outputs into national totals
+        @param year_stop last year to project (default: the template's final year)
+        @param num_workers number of regions initialized and projected at once. Projection
+        releases the GIL, so regions project in parallel on threads. Only this many regional
+        models are in memory at a time unless keep_regions is True.
+        @param keep_regions True to keep each projected regional Model
+        @param callback optional callable(name, totals) run after each region is added to the
+        totals. Totals may already include regions that finished while the callback was pending.
+        @return NationalTotals, and a dict of regional Models (empty unless keep_regions is True)
+        """
+        cfg_opts = self.template['config']
+        totals = NationalTotals(cfg_opts[CONST.CFG_FIRST_YEAR], cfg_opts[CONST.CFG_FINAL_YEAR])
+        if year_stop is None:
+            year_stop = totals.year_final
+
+        models = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = {executor.submit(self._project_region, name, year_stop, totals, keep_regions) : name for name in self.overrides}
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                model = future.result()
+                if keep_regions:
+                    models[name] = model
+                if callback is not None:
+                    callback(name, totals)
+        return totals, models
@@ -0,0 +1,190 @@
+import time
+import numpy as np
+import src.goals_lazy as Lazy
+import src.goals_sensitivity as Sensitivity
+import src.goals_stats as Stats
+
+linalg   = Lazy.lazy_import('scipy.linalg')
+optimize = Lazy.lazy_import('scipy.optimize')
+stats    = Lazy.lazy_import('scipy.stats')
+
+class GaussianProcess:
+    """! Gaussian process regression with a squared exponential kernel and one
+    length scale per input dimension. Inputs should be scaled to the unit cube.
+    Hyperparameters are fitted by maximizing the log marginal likelihood.
+    """
+
+    def __init__(self, num_dims, noise=1e-6):
+        """! Create an unfitted Gaussian process
+        @param num_dims number of input dimensions
+        @param noise smallest observation noise variance allowed, relative to the output variance
+        """
+        self.min_noise = noise
+        # log length scales, log signal variance, log noise variance
+        self.theta = np.concatenate((np.full(num_dims, np.log(0.3)), [0.0, np.log(1e-3)]))
+
+    def _kernel(self, theta, X1, X2):
+        d = X1.shape[1]
+        scale = np.exp(theta[:d])
+        sq = (((X1[:,np.newaxis,:] - X2[np.newaxis,:,:]) / scale)**2).sum(axis=2)
+        return np.exp(theta[d]) * np.exp(-0.5 * sq)
+
+    def _factor(self, theta, X, y):
+        K = self._kernel(theta, X, X)
+        K[np.diag_indices_from(K)] += np.exp(theta[-1]) + self.min_noise
+        chol = linalg.cho_factor(K, lower=True)
+        return chol, linalg.cho_solve(chol, y)
+
+    def _neg_log_marginal(self, theta, X, y):
+        try:
+            chol, alpha = self._factor(theta, X, y)
+        except linalg.LinAlgError:
+            return np.inf
+        return 0.5 * y.dot(alpha) + np.log(np.diag(chol[0])).sum()
+
+    def fit(self, X, y, fit_hyperparameters=True):
+        """! Condition the process on observations
+        @param X inputs by observation and dimension
+        @param y outputs
+        @param fit_hyperparameters True to refit hyperparameters, False to keep the current ones
+        """
+        self._X = np.array(X, dtype=np.float64)
+        self._y_mean, self._y_sd = y.mean(), max(y.std(), 1e-12)
+        self._y = (y - self._y_mean) / self._y_sd
+        if fit_hyperparameters:
+            d = self._X.shape[1]
+            bounds = [(np.log(1e-2), np.log(10.0))] * d + [(np.log(1e-2), np.log(1e2)), (np.log(1e-8), np.log(1.0))]
+            res = optimize.minimize(self._neg_log_marginal, self.theta, args=(self._X, self._y), method='L-BFGS-B', bounds=bounds)
+            if np.isfinite(res.fun):
+                self.theta = res.x
+        self._chol, self._alpha = self._factor(self.theta, self._X, self._y)
+
+    def predict(self, Xs):
+        """! Predictive mean and standard deviation at inputs Xs"""
+        Ks = self._kernel(self.theta, Xs, self._X)
+        mu = Ks.dot(self._alpha)
+        v = linalg.cho_solve(self._chol, Ks.T)
+        var = np.maximum(np.exp(self.theta[-2]) - (Ks * v.T).sum(axis=1), 1e-12)
+        return self._y_mean + self._y_sd * mu, self._y_sd * np.sqrt(var)
+
+def expected_improvement(mu, sd, best, xi=0.01):
+    """! Expected improvement over best for maximization
+    @param mu predictive means
+    @param sd predictive standard deviations
+    @param best best value observed so far
+    @param xi minimum improvement of interest
+    """
+    z = (mu - best - xi) / sd
+    return (mu - best - xi) * stats.norm.cdf(z) + sd * stats.norm.pdf(z)
+
+class SurrogateSearch:
+    """! Surrogate-assisted maximization of the calibration log-posterior.
+
+    A Gaussian process is fitted to the log-posterior values evaluated so far,
+    and each iteration evaluates a batch of points chosen by expected
+    improvement. Batches are built with the constant liar heuristic: after a
+    point is chosen, it is added to the surrogate with the best value seen so
+    far so that later points in the batch explore elsewhere. Batches are
+    evaluated in parallel when a goals_workers.FitterPool is given.
+    """
+
+    def __init__(self, fitter, pool=None, box=None, num_candidates=2000, seed=None):
+        """! Set up a search
+        @param fitter a GoalsFitter, used for priors and, without a pool, for evaluations
+        @param pool optional goals_workers.FitterPool used to evaluate batches in parallel
+        @param box lower and upper parameter bounds for the search. The default is
+        the central 99.8% of each parameter's prior.
+        @param num_candidates number of random candidate points scored per proposal
+        @param seed random number generator seed
+        """
+        self.fitter = fitter
+        self.pool = pool
+        if box is None:
+            box = (fitter.prior_quantile(np.full(len(fitter.parameter_names()), 0.001)),
+                   fitter.prior_quantile(np.full(len(fitter.parameter_names()), 0.999)))
+        self.lower, self.upper = np.array(box[0], dtype=np.float64), np.array(box[1], dtype=np.float64)
+        self.num_candidates = num_candidates
+        self._rng = np.random.default_rng(seed)
+        self.gp = GaussianProcess(len(self.lower))
+        self.X = np.zeros((0, len(self.lower))) # evaluated points, scaled to the unit cube
+        self.y = np.zeros(0)                    # log-posterior values at self.X
+
+    def _to_params(self, u):
+        return self.lower + u * (self.upper - self.lower)
+
+    def _to_unit(self, params):
+        return (np.asarray(params) - self.lower) / (self.upper - self.lower)
+
+    def evaluate(self, U):
+        """! Evaluate the log-posterior at points in the unit cube and add them to the history"""
+        P = self._to_params(U)
+        if self.pool is None:
+            vals = [self.fitter.posterior(p) for p in P]
+        else:
+            time_start = time.perf_counter()
+            results = self.pool.map(Sensitivity.evaluate, [(p,) for p in P])
+            seconds = (time.perf_counter() - time_start) / len(P)
+            vals = []
+            for p, (lhood, _) in zip(P, results):
+                prior = self.fitter.prior(p)
+                if self.fitter.recorder is not None:
+                    self.fitter.recorder.record(p, *lhood, prior, seconds)
+                vals.append(lhood[0] + prior)
+        self.X = np.vstack((self.X, U))
+        self.y = np.concatenate((self.y, vals))
+
+    def _targets(self):
+        """! Log-posterior values transformed for fitting. Values far below the mode
+        are clipped so that the surrogate concentrates on the region near it."""
+        y = self.y.copy()
+        finite = np.isfinite(y)
+        floor = np.percentile(y[finite], 10) if finite.any() else 0.0
+        y[~finite] = floor
+        return np.maximum(y, floor)
+
+    def propose(self, batch_size):
+        """! Choose a batch of points in the unit cube by expected improvement with constant liar"""
+        y = self._targets()
+        self.gp.fit(self.X, y)
+        best = y.max()
+
+        # Candidates: a space-filling design plus perturbations of the best points
+        num_local = self.num_candidates // 2
+        top = self.X[np.argsort(-y)[:max(1, len(y) // 10)]]
+        local = top[self._rng.integers(len(top), size=num_local)] + self._rng.normal(scale=0.05, size=(num_local, self.X.shape[1]))
+        cand = np.vstack((Stats.latin_hypercube(self.num_candidates - num_local, self.X.shape[1], self._rng.integers(2**31)),
+                          np.clip(local, 0.0, 1.0)))
+
+        X, batch = self.X, []
+        for _ in range(batch_size):
+            mu, sd = self.gp.predict(cand)
+            k = np.argmax(expected_improvement(mu, sd, best))
+            batch.append(cand[k])
+            cand = np.delete(cand, k, axis=0)
+            X, y = np.vstack((X, batch[-1])), np.append(y, best)
+            self.gp.fit(X, y, fit_hyperparameters=False)
+        return np.array(batch)
+
+    def run(self, num_init=None, max_evals=200, batch_size=None, x_init=None):
+        """! Search for the posterior mode
+        @param num_init size of the initial Latin hypercube design (default: 4 per parameter, at least 10)
+        @param max_evals maximum number of log-posterior evaluations
+        @param batch_size points evaluated per iteration (default: one per pool worker)
+        @param x_init optional parameter vector to include in the initial design
+        @return the best parameter vector found and its log-posterior value
+        """
+        num_dims = len(self.lower)
+        if num_init is None:
+            num_init = max(10, 4 * num_dims)
+        if batch_size is None:
+            batch_size = 1 if self.pool is None else self.pool.num_workers
+
+        U = Stats.latin_hypercube(num_init, num_dims, self._rng.integers(2**31))
+        if x_init is not None:
+            U = np.vstack((np.clip(self._to_unit(x_init), 0.0, 1.0), U))
+        self.evaluate(U)
+        while len(self.y) < max_evals:
+            self.evaluate(self.propose(min(batch_size, max_evals - len(self.y))))
+
+        best = np.nanargmax(np.where(np.isfinite(self.y), self.y, np.nan))
+        return self._to_params(self.X[best]), self.y[best]
@@ -1,6 +1,51 @@
+import hashlib
+import zipfile
+import xml.etree.ElementTree as ET
 import numpy as np
 import src.goals_const as CONST
 
+_XLSX_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_NS_RELS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+def _xlsx_sheet_hash(data, strings):
+    """! Hash the cells of a tab, with shared string indices resolved to their text"""
+    digest = hashlib.sha256()
+    for cell in ET.fromstring(data).iter(_XLSX_NS_MAIN + 'c'):
+        kind = cell.get('t', 'n')
+        value = cell.find(_XLSX_NS_MAIN + 'v')
+        value = '' if value is None or value.text is None else value.text
+        if kind == 's':
+            value = strings[int(value)]
+        elif kind == 'inlineStr':
+            value = ''.join(text.text or '' for text in cell.iter(_XLSX_NS_MAIN + 't'))
+        formula = cell.find(_XLSX_NS_MAIN + 'f')
+        formula = '' if formula is None else '%s\x1f%s' % (sorted(formula.attrib.items()), formula.text or '')
+        digest.update(('%s\x1f%s\x1f%s\x1f%s\x1e' % (cell.get('r'), kind, value, formula)).encode())
+    return digest.hexdigest()
+
+def xlsx_tab_hashes(xlsx_name):
+    """! Hash the cell values and formulas of each tab in an Excel workbook. Text cells
+    are hashed by their text rather than their index in the table of text shared by
+    all tabs, so editing one tab does not change the hashes of the others.
+    @param xlsx_name an Excel workbook
+    @return a dict mapping tab names to hexadecimal digests
+    """
+    with zipfile.ZipFile(xlsx_name) as zf:
+        files = set(zf.namelist())
+        rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id') : rel.get('Target') for rel in rels}
+        strings = []
+        if 'xl/sharedStrings.xml' in files:
+            table = ET.fromstring(zf.read('xl/sharedStrings.xml'))
+            runs = [_XLSX_NS_MAIN + 't', _XLSX_NS_MAIN + 'r/' + _XLSX_NS_MAIN + 't'] # excludes phonetic hints
+            strings = [''.join(text.text or '' for path in runs for text in item.findall(path)) for item in table.iter(_XLSX_NS_MAIN + 'si')]
+        rval = {}
+        for sheet in ET.fromstring(zf.read('xl/workbook.xml')).iter(_XLSX_NS_MAIN + 'sheet'):
+            target = targets[sheet.get(_XLSX_NS_RELS + 'id')]
+            path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            rval[sheet.get('name')] = _xlsx_sheet_hash(zf.read(path), strings)
+    return rval
+
 def xlsx_load_range(tab, cell_first, cell_final, dtype=np.float64, order="C"):
     """! Return the contents of a range in an Excel tab as a numpy array
     @param tab an openpyxl workbook tab
@@ -0,0 +1,125 @@
+import mmap
+import os
+import tempfile
+import numpy as np
+import src.goals_async as Async
+import src.goals_const as CONST
+import src.goals_model as Goals
+
+class OutputStore:
+    """! Model output arrays backed by memory-mapped .npy files, one per output.
+
+    The calculation engine needs an output array that spans every projection
+    year, so outputs cannot be a true ring buffer. Instead, years that are no
+    longer needed in memory are written back to disk and their pages released
+    (see evict). Resident memory then covers only recently projected years,
+    while evicted years stay readable from disk and are paged back in if used.
+    """
+
+    def __init__(self, path, year_first, year_final, dtype=np.float64):
+        """! Create zeroed output files
+        @param path directory to store outputs in, or None for a temporary directory
+        that is deleted on close(). Use None to keep only aggregates of evicted years.
+        @param year_first first year of projection
+        @param year_final final year of projection
+        @param dtype output element type
+        """
+        if path is None:
+            self._tempdir = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+            path = self._tempdir.name
+        else:
+            self._tempdir = None
+            os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.year_first = year_first
+        self.year_final = year_final
+        self.outputs = {}
+        self._maps = {}
+        for name, shape in Goals.output_shapes(year_final - year_first + 1).items():
+            file_name = os.path.join(path, name + '.npy')
+            arr = np.lib.format.open_memmap(file_name, mode='w+', dtype=dtype, shape=shape)
+            offset = arr.offset
+            del arr
+            with open(file_name, 'r+b') as fh:
+                mm = mmap.mmap(fh.fileno(), 0) # the mapping stays valid after the file is closed
+            self._maps[name] = (mm, offset)
+            self.outputs[name] = np.ndarray(shape, dtype=dtype, buffer=mm, offset=offset, order="C")
+
+    @staticmethod
+    def from_inputs(path, inputs, dtype=np.float64):
+        """! Create a store sized for a model initialized from inputs (see Model.read_xlsx)"""
+        cfg_opts = inputs['config']
+        return OutputStore(path, cfg_opts[CONST.CFG_FIRST_YEAR], cfg_opts[CONST.CFG_FINAL_YEAR], dtype)
+
+    def _page_range(self, name, year_lo, year_hi):
+        """! Page-aligned byte range of the mapping that holds years year_lo through year_hi"""
+        mm, offset = self._maps[name]
+        arr = self.outputs[name]
+        row = arr.strides[0]
+        start = offset + (year_lo - self.year_first) * row
+        stop = offset + (year_hi - self.year_first + 1) * row
+        start -= start % mmap.ALLOCATIONGRANULARITY
+        return mm, start, stop - start
+
+    def evict(self, year_lo, year_hi=None):
+        """! Write outputs for years year_lo through year_hi to disk and release their
+        memory. Evicted years remain valid; reading them again pages them back in.
+        Pages are released where the platform supports madvise, and otherwise left
+        to the operating system to reclaim.
+        """
+        year_hi = year_lo if year_hi is None else year_hi
+        for name in self.outputs:
+            mm, start, length = self._page_range(name, year_lo, year_hi)
+            if length > 0:
+                mm.flush(start, length)
+                if hasattr(mmap, 'MADV_DONTNEED'):
+                    mm.madvise(mmap.MADV_DONTNEED, start, length)
+
+    def flush(self):
+        """! Write all outputs to disk"""
+        for mm, _ in self._maps.values():
+            mm.flush()
+
+    def close(self):
+        """! Flush outputs and release the store's references to them. Files are unmapped
+        once no arrays or models use them. The model sharing these outputs must not be
+        projected after a temporary store is closed."""
+        self.outputs = {}
+        for mm, _ in self._maps.values():
+            mm.flush()
+            try:
+                mm.close()
+            except BufferError:
+                pass # still exported to output arrays, unmapped when they are released
+        self._maps = {}
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+
+def open_outputs(path):
+    """! Open outputs written by an OutputStore for reading
+    @return a dict mapping output names to read-only memory-mapped arrays
+    """
+    return {name : np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in Goals.output_shapes(0)}
+
+def project_windowed(model, store, year_stop, window, callback=None):
+    """! Project year by year, keeping only the most recent years of outputs in memory
+    @param model a Model initialized with outputs=store.outputs
+    @param store the OutputStore holding the model's outputs
+    @param year_stop the last year to project
+    @param window number of most recent years kept in memory in full detail
+    @param callback optional callable(year, outputs) run after each year is projected,
+    where outputs are views of that year's slice (see goals_async.year_outputs). Use
+    this to reduce years to aggregates before they leave the window.
+    @return the last year projected
+    """
+    if window < 1:
+        raise ValueError('window must be at least one year')
+    year = max(model.last_valid_year(), model.year_first - 1)
+    while year < year_stop:
+        year += 1
+        model.project(year) # resumes from the last year calculated
+        if callback is not None:
+            callback(year, Async.year_outputs(model, year))
+        if year - window >= model.year_first:
+            store.evict(year - window)
+    return year
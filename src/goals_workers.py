@@ -0,0 +1,70 @@
+import concurrent.futures
+
+## Each worker process builds one fitter when it starts and reuses it for
+## every task, so Excel parsing and projection setup are paid once per worker.
+_fitter = None
+
+def _init_worker(factory):
+    global _fitter
+    _fitter = factory()
+
+def _run_task(task, args):
+    return task(_fitter, *args)
+
+class FitterPool:
+    """! A pool of worker processes, each holding its own calibration fitter.
+
+    Tasks are module-level functions called as task(fitter, *args) in a worker.
+    The factory must be picklable, for example
+    functools.partial(calibrate.GoalsFitter, par_xlsx, anc_csv, hiv_csv, deaths_csv).
+    With num_workers=0, tasks run synchronously in the calling process, which is
+    useful for debugging and for machines with a single core.
+    """
+
+    def __init__(self, factory, num_workers=None):
+        """! Start the pool
+        @param factory callable that returns a new fitter
+        @param num_workers number of worker processes (None: one per CPU, 0: run tasks in this process)
+        """
+        self._factory = factory
+        self._fitter = None
+        self._executor = None
+        if num_workers == 0:
+            self.num_workers = 1
+        else:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(factory,))
+            self.num_workers = self._executor._max_workers
+
+    def submit(self, task, *args):
+        """! Schedule task(fitter, *args) and return a concurrent.futures.Future for its result"""
+        if self._executor is not None:
+            return self._executor.submit(_run_task, task, args)
+
+        if self._fitter is None:
+            self._fitter = self._factory()
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(task(self._fitter, *args))
+        except Exception as err:
+            future.set_exception(err)
+        return future
+
+    def map(self, task, arg_list):
+        """! Run task(fitter, *args) for each args tuple in arg_list
+        @return a list of results, in the same order as arg_list
+        """
+        futures = [self.submit(task, *args) for args in arg_list]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """! Shut down worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
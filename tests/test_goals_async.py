@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+import src.goals_async as Async
+from src.goals_model import Model
+
+class Test_TestGoalsAsync(unittest.TestCase):
+    def setUp(self):
+        self.model = Model()
+        self.model.init_from_xlsx("tests/test-external-clhiv.xlsx")
+
+    def test_callback_years(self):
+        years = []
+        task = Async.project_async(self.model, 1980, lambda year, outputs : years.append(year))
+        self.assertEqual(task.result(), 1980)
+        self.assertEqual(years, list(range(self.model.year_first, 1981)))
+        self.assertFalse(task.cancelled())
+
+    def test_callback_after_invalidate(self):
+        self.model.project(1980)
+        self.model.invalidate(1976)
+        self.assertEqual(self.model.last_valid_year(), 1975)
+        years = []
+        task = Async.project_async(self.model, 1980, lambda year, outputs : years.append(year))
+        self.assertEqual(task.result(), 1980)
+        self.assertEqual(years, list(range(1976, 1981)))
+
+    def test_iterator_cancel(self):
+        async def consume():
+            async for year, outputs in Async.project_years(self.model, self.model.year_final):
+                self.assertIn('births', outputs)
+                if year == 1975:
+                    break
+        asyncio.run(consume())
+        self.assertEqual(self.model.last_valid_year(), 1975)
+
+if __name__ == "__main__":
+    unittest.main()
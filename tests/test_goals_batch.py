@@ -0,0 +1,36 @@
+import numpy as np
+import unittest
+import src.goals_const as CONST
+import src.goals_batch as Batch
+from src.goals_model import Model
+
+class Test_TestGoalsBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.xlsx_name = "inputs/example-inputs.xlsx"
+        self.batch = Batch.BatchModel(3)
+        self.batch.init_from_xlsx(self.xlsx_name)
+
+    def test_shapes(self):
+        self.assertEqual(self.batch.pop_adult_hiv.shape[0], 3)
+        self.assertEqual(self.batch.births.shape, (3, self.batch.year_final - self.batch.year_first + 1, CONST.N_SEX))
+
+    def test_matches_serial(self):
+        model = Model()
+        model.init_from_xlsx(self.xlsx_name)
+        model.project(model.year_final)
+
+        self.batch.invalidate(-1)
+        self.batch.project(self.batch.year_final)
+        for b in range(len(self.batch)):
+            np.testing.assert_allclose(self.batch.pop_adult_hiv[b], model.pop_adult_hiv)
+            np.testing.assert_allclose(self.batch.births[b], model.births)
+
+    def test_independent_inputs(self):
+        value = self.batch[0].art_num[0,0]
+        self.batch[0].art_num[0,0] = value + 1.0
+        self.assertEqual(self.batch[1].art_num[0,0], value)
+        self.batch[0].art_num[0,0] = value
+
+if __name__ == "__main__":
+    unittest.main()
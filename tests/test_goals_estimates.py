@@ -0,0 +1,60 @@
+import types
+import numpy as np
+import pandas as pd
+import unittest
+import src.goals_const as CONST
+import src.goals_estimates as Estimates
+import src.goals_model as Goals
+
+YEAR_FIRST, YEAR_FINAL = 1970, 2050
+
+def random_model(seed):
+    """! An object with random Model outputs"""
+    rng = np.random.default_rng(seed)
+    model = types.SimpleNamespace(year_first=YEAR_FIRST, year_final=YEAR_FINAL)
+    for name, shape in Goals.output_shapes(YEAR_FINAL - YEAR_FIRST + 1).items():
+        setattr(model, name, rng.random(shape))
+    return model
+
+def slice_prevalence(model, pop, sex, year, age_min, age_max):
+    """! Reference prevalence calculated by slicing model outputs directly"""
+    sex_min, sex_max = Estimates.SEX_RANGES['Men' if pop == 'TGW' else sex]
+    pop_min, pop_max = Estimates.POP_RANGES[pop]
+    t, a_min, a_max = year - model.year_first, age_min - CONST.AGE_ADULT_MIN, age_max - CONST.AGE_ADULT_MIN + 1
+    pop_hiv = model.pop_adult_hiv[t, sex_min:sex_max, a_min:a_max, pop_min:pop_max, :, :].sum()
+    pop_neg = model.pop_adult_neg[t, sex_min:sex_max, a_min:a_max, pop_min:pop_max].sum()
+    return pop_hiv / (pop_hiv + pop_neg)
+
+class Test_TestGoalsEstimates(unittest.TestCase):
+    def test_hiv_prevalence(self):
+        model = random_model(1)
+        template = pd.read_csv("inputs/mwi-2023-hiv-prev.csv")
+        template = template[template['AgeMax'] >= CONST.AGE_ADULT_MIN].reset_index(drop=True)
+        estimate = Estimates.HivPrevIndex(template, model.year_first).estimate(model)
+        expected = [slice_prevalence(model, *row) for row in template[['Population', 'Gender', 'Year', 'AgeMin', 'AgeMax']].itertuples(index=False)]
+        self.assertTrue(np.allclose(estimate, expected, rtol=1e-12))
+
+    def test_deaths(self):
+        model = random_model(2)
+        template = pd.DataFrame({'Gender' : ['Women', 'Men', 'All', 'Men'],
+                                 'Year'   : [2000, 2000, 2010, 2049],
+                                 'AgeMin' : [15, 20, 15, 50],
+                                 'AgeMax' : [19, 80, 49, 54]})
+        estimate = Estimates.DeathsIndex(template, model.year_first).estimate(model)
+        for row, (sex, year, age_min, age_max) in enumerate(template.itertuples(index=False)):
+            sex_min, sex_max = Estimates.SEX_RANGES[sex]
+            t, a_min, a_max = year - model.year_first, age_min - CONST.AGE_ADULT_MIN, age_max - CONST.AGE_ADULT_MIN + 1
+            expected = model.deaths_adult_hiv[t, sex_min:sex_max, a_min:a_max].sum() + model.deaths_adult_neg[t, sex_min:sex_max, a_min:a_max].sum()
+            self.assertAlmostEqual(estimate[row], expected, places=9)
+
+    def test_empty_template(self):
+        template = pd.DataFrame(columns=['Population', 'Gender', 'Year', 'AgeMin', 'AgeMax'])
+        self.assertEqual(Estimates.HivPrevIndex(template, YEAR_FIRST).estimate(random_model(3)).shape, (0,))
+
+    def test_unrecognized_population(self):
+        template = pd.DataFrame({'Population' : ['Truckers'], 'Gender' : ['Men'], 'Year' : [2000], 'AgeMin' : [15], 'AgeMax' : [49]})
+        with self.assertRaises(ValueError):
+            Estimates.HivPrevIndex(template, YEAR_FIRST)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import types
+import numpy as np
+import unittest
+import src.goals_golden as Golden
+import src.goals_model as Goals
+import regress
+
+def random_outputs(seed, year_first=1970, year_final=1990):
+    rng = np.random.default_rng(seed)
+    model = types.SimpleNamespace(year_first=year_first, year_final=year_final)
+    for name, shape in Goals.output_shapes(year_final - year_first + 1).items():
+        setattr(model, name, rng.random(shape))
+    return model
+
+class Test_TestGoalsGolden(unittest.TestCase):
+    def test_identical(self):
+        model = random_outputs(1)
+        result = Golden.compare(Golden.fingerprint(model), Golden.fingerprint(model))
+        self.assertEqual(result.status, Golden.IDENTICAL)
+        self.assertIsNone(result.first_divergence())
+
+    def test_within_tolerance(self):
+        model = random_outputs(1)
+        reference = Golden.fingerprint(model)
+        model.births[5,0] *= 1.0 + 1e-14
+        result = Golden.compare(reference, Golden.fingerprint(model))
+        self.assertEqual(result.status, Golden.WITHIN_TOLERANCE)
+        self.assertEqual({diff['year'] for diff in result.differences}, {1975})
+
+    def test_redistributed(self):
+        # Swapping values between ages keeps the year's sum and norm
+        model = random_outputs(1)
+        reference = Golden.fingerprint(model)
+        model.pop_adult_neg[8,0,[3,40]] = model.pop_adult_neg[8,0,[40,3]]
+        result = Golden.compare(reference, Golden.fingerprint(model))
+        self.assertEqual(result.status, Golden.DIVERGED)
+        self.assertEqual([(diff['statistic'], diff['within_tolerance']) for diff in result.differences],
+                         [('sum', True), ('norm', True), ('margin', False)])
+
+    def test_first_divergence(self):
+        model = random_outputs(1)
+        reference = Golden.fingerprint(model)
+        model.pop_adult_hiv[12,1,20,0,3,2] += 1.0
+        model.new_infections[15] += 0.5
+        result = Golden.compare(reference, Golden.fingerprint(model))
+        self.assertEqual(result.status, Golden.DIVERGED)
+        first = result.first_divergence()
+        self.assertEqual((first['output'], first['year']), ('pop_adult_hiv', 1982))
+        self.assertIn("pop_adult_hiv in 1982", result.report())
+
+    def test_bundled_workbooks(self):
+        for xlsx_name in regress.WORKBOOKS:
+            file_name = regress.golden_name(regress.GOLDEN_PATH, xlsx_name)
+            with self.subTest(workbook=xlsx_name):
+                if not os.path.exists(file_name):
+                    self.skipTest('No reference outputs for %s; record them with python regress.py --record' % (xlsx_name))
+                result = Golden.compare(Golden.read_fingerprint(file_name), Golden.fingerprint(regress.project(xlsx_name)))
+                self.assertNotEqual(result.status, Golden.DIVERGED, result.report())
+
+if __name__ == "__main__":
+    unittest.main()
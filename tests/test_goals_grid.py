@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import numpy as np
+import unittest
+import src.goals_grid as Grid
+import src.goals_workers as Workers
+
+## Unit tests for profile likelihood grids, using a correlated quadratic
+## stand-in for the log-posterior so that no projections are needed
+
+class QuadraticFitter:
+    def __init__(self):
+        self.mode = np.array([0.5, -1.0, 1.5])
+        self.evals = 0
+
+    def bounds(self):
+        return np.full(3, -5.0), np.full(3, 5.0)
+
+    def likelihood(self, params):
+        self.evals += 1
+        d = np.asarray(params) - self.mode
+        lhood = -(d**2).sum() - (d[0] - d[1])**2
+        return lhood, lhood, 0.0, 0.0
+
+    def prior(self, params):
+        return 0.0
+
+    def posterior(self, params):
+        return self.likelihood(params)[0] + self.prior(params)
+
+class Test_TestGoalsGrid(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmpdir.name, 'grid.jsonl')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_profile_1d(self):
+        grid = Grid.ProfileGrid(['a', 'b', 'c'], {'a' : np.linspace(0.0, 1.0, 5)}, np.zeros(3))
+        with Workers.FitterPool(QuadraticFitter, 0) as pool:
+            frame = grid.run(pool, self.output, tol=1e-10)
+        self.assertEqual(len(frame.index), 5)
+        # with a fixed, b's optimum is halfway between its mode and a's offset from its mode
+        a = frame['a'].to_numpy()
+        expected = -2.0 * (a - 0.5)**2 + 0.5 * (a - 0.5)**2
+        self.assertTrue(np.allclose(frame['posterior'], expected, atol=1e-6))
+        self.assertTrue(np.allclose(frame['lhood_hiv'], frame['lhood']))
+
+    def test_warm_start_and_resume(self):
+        axes = {'a' : np.linspace(0.0, 1.0, 4), 'b' : np.linspace(-1.5, -0.5, 3)}
+        with Workers.FitterPool(QuadraticFitter, 0) as pool:
+            Grid.ProfileGrid(['a', 'b', 'c'], axes, np.array([0.5, -1.0, 0.0])).run(pool, self.output)
+        with open(self.output) as fh:
+            records = [json.loads(line) for line in fh]
+        self.assertEqual(len(records), 12)
+        self.assertIsNone(records[0]['start'])
+        for record in records[1:]:
+            self.assertIsNotNone(record['start'])
+            self.assertEqual(np.abs(np.subtract(record['start'], record['index'])).sum(), 1)
+
+        # Drop the last points and cut a line short, as if the run were interrupted
+        with open(self.output, 'w') as fh:
+            fh.write(''.join(json.dumps(record) + '\n' for record in records[:7]) + '{"params": [')
+        with Workers.FitterPool(QuadraticFitter, 0) as pool:
+            frame = Grid.ProfileGrid(['a', 'b', 'c'], axes, np.zeros(3)).run(pool, self.output)
+        self.assertEqual(len(frame.index), 12)
+        with open(self.output) as fh:
+            lines = fh.read().splitlines()
+        resumed = [json.loads(line)['index'] for line in lines[8:]]
+        self.assertEqual(len(lines), 13)
+        self.assertEqual(sorted(resumed), sorted(record['index'] for record in records[7:]))
+        self.assertEqual(len(Grid.read_grid(self.output).index), 12)
+
+    def test_worker_processes(self):
+        with Workers.FitterPool(QuadraticFitter, 2) as pool:
+            frame = Grid.ProfileGrid(['a', 'b', 'c'], {'c' : [1.0, 1.5, 2.0]}, np.zeros(3)).run(pool, self.output)
+        self.assertEqual(frame['c'].tolist(), [1.0, 1.5, 2.0])
+        self.assertEqual(frame['posterior'].idxmax(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
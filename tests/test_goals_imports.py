@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import unittest
+import src.goals_lazy as Lazy
+
+## Packages that the projection core must not import until they are used
+HEAVY_MODULES = ["scipy", "openpyxl", "pandas", "plotnine", "percussion"]
+
+def loaded_after(statement):
+    """! Names in HEAVY_MODULES that are loaded after running statement in a fresh interpreter"""
+    script = "%s\nimport sys\nprint(' '.join(name for name in %r if name in sys.modules))" % (statement, HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return proc.stdout.split()
+
+class Test_TestGoalsImports(unittest.TestCase):
+    def test_core_imports(self):
+        self.assertEqual(loaded_after("import src.goals_model, src.goals_results, src.goals_batch"), [])
+
+    def test_calibrate_imports(self):
+        self.assertEqual(loaded_after("import calibrate"), [])
+
+    def test_lazy_import(self):
+        json = Lazy.lazy_import("json")
+        self.assertEqual(json.loads("[1, 2]"), [1, 2])
+        self.assertIn("dumps", vars(json))
+
+    def test_lazy_import_missing(self):
+        missing = Lazy.lazy_import("no_such_module_for_goals")
+        with self.assertRaises(ModuleNotFoundError):
+            missing.anything
+
+if __name__ == "__main__":
+    unittest.main()
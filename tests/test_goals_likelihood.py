@@ -0,0 +1,183 @@
+import csv
+import importlib.util
+import json
+import math
+import os
+import sys
+import tempfile
+import types
+import unittest
+import numpy as np
+import src.goals_const as CONST
+import src.goals_estimates as Estimates
+import src.goals_likelihood as Likelihood
+import src.goals_model as Goals
+
+YEAR_FIRST, YEAR_FINAL = 1970, 2030
+ANC_CSV = "inputs/mwi-2023-anc-prev.csv"
+HIV_CSV = "inputs/mwi-2023-hiv-prev.csv"
+HAS_PERCUSSION = importlib.util.find_spec("percussion") is not None
+REFERENCE_JSON = "tests/golden/likelihood-percussion.json" # recorded by record_reference()
+
+def random_model(seed):
+    """! An object with random Model outputs and likelihood parameters"""
+    rng = np.random.default_rng(seed)
+    model = types.SimpleNamespace(year_first=YEAR_FIRST, year_final=YEAR_FINAL, _dtype=np.float64, _order="C")
+    for name, shape in Goals.output_shapes(YEAR_FINAL - YEAR_FIRST + 1).items():
+        setattr(model, name, rng.uniform(1.0, 2.0, shape))
+    model.births_exposed = 0.1 * model.births.sum((1)) * rng.uniform(0.5, 1.5, model.births.shape[0])
+    model.likelihood_par = {CONST.LHOOD_ANCSS_BIAS     : 0.2,
+                            CONST.LHOOD_ANCRT_BIAS     : -0.1,
+                            CONST.LHOOD_VARINFL_SITE   : 0.01,
+                            CONST.LHOOD_VARINFL_CENSUS : 0.002}
+    return model
+
+def read_rows(csv_name):
+    with open(csv_name, newline='') as fh:
+        return [row for row in csv.DictReader(fh) if row['UseDataInFit'] == 'TRUE']
+
+def norm_logpdf(x, mean, sd):
+    return -math.log(sd * math.sqrt(2.0 * math.pi)) - 0.5 * ((x - mean) / sd)**2
+
+def probit(p):
+    # Invert the standard normal CDF by bisection, independently of scipy
+    lo, hi = -10.0, 10.0
+    for k in range(200):
+        mid = 0.5 * (lo + hi)
+        lo, hi = (mid, hi) if 0.5 * math.erfc(-mid / math.sqrt(2.0)) < p else (lo, mid)
+    return 0.5 * (lo + hi)
+
+def write_deaths_csv(csv_name):
+    """! Write synthetic all-cause deaths data, with some rows excluded from fitting"""
+    rng = np.random.default_rng(2)
+    with open(csv_name, "w", newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["Gender", "AgeMin", "AgeMax", "Value", "Lower", "Upper", "Year", "UseDataInFit"])
+        for year in range(2000, 2020):
+            for sex in ["Women", "Men"]:
+                for age in range(15, 80, 5):
+                    val = rng.uniform(50.0, 200.0)
+                    writer.writerow([sex, age, age + 4, val, 0.8 * val, 1.3 * val, year, 'TRUE' if year % 7 > 0 else 'FALSE'])
+
+def percussion_likelihoods(model, deaths_csv):
+    """! Log-likelihoods calculated by percussion at a model's estimates"""
+    from percussion import alldeaths, ancprev, hivprev
+    par = model.likelihood_par
+    hivdat = hivprev.hivprev(YEAR_FIRST)
+    hivdat.read_csv(HIV_CSV)
+    hivest = hivdat.projection_template()
+    hivest['Prevalence'] = Estimates.HivPrevIndex(hivest, YEAR_FIRST).estimate(model)
+    ancdat = ancprev.ancprev(YEAR_FIRST)
+    ancdat.read_csv(ANC_CSV)
+    ancdat.set_parameters(par[CONST.LHOOD_ANCSS_BIAS], par[CONST.LHOOD_ANCRT_BIAS],
+                          par[CONST.LHOOD_VARINFL_SITE], par[CONST.LHOOD_VARINFL_CENSUS])
+    deathsdat = alldeaths.alldeaths(YEAR_FIRST)
+    deathsdat.read_csv(deaths_csv)
+    deathsest = deathsdat.projection_template()
+    deathsest['Deaths'] = Estimates.DeathsIndex(deathsest, YEAR_FIRST).estimate(model)
+    return {'hivprev' : float(hivdat.likelihood(hivest)),
+            'ancprev' : float(ancdat.likelihood(model.births_exposed / model.births.sum((1)))),
+            'deaths'  : float(deathsdat.likelihood(deathsest))}
+
+def record_reference():
+    """! Save percussion log-likelihoods for the test model, so test_percussion_reference runs without percussion"""
+    with tempfile.TemporaryDirectory() as path:
+        deaths_csv = os.path.join(path, "deaths.csv")
+        write_deaths_csv(deaths_csv)
+        reference = percussion_likelihoods(random_model(1), deaths_csv)
+    os.makedirs(os.path.dirname(REFERENCE_JSON), exist_ok=True)
+    with open(REFERENCE_JSON, 'w') as fh:
+        json.dump(reference, fh, indent=1)
+
+class Test_TestGoalsLikelihood(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.model = random_model(1)
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.deaths_csv = os.path.join(self.tempdir.name, "deaths.csv")
+        write_deaths_csv(self.deaths_csv)
+
+    @classmethod
+    def tearDownClass(self):
+        self.tempdir.cleanup()
+
+    def test_hivprev(self):
+        rows = read_rows(HIV_CSV)
+        lhood = Likelihood.HivPrevLikelihood(HIV_CSV, YEAR_FIRST)
+        prev = Estimates.HivPrevIndex(Likelihood.read_data(HIV_CSV), YEAR_FIRST).estimate(self.model)
+        self.assertEqual(len(prev), len(rows))
+        expected = 0.0
+        for row, p in zip(rows, prev):
+            n = float(row['NumTested'])
+            k = float(row['Value']) * n
+            expected += math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1) + k * math.log(p) + (n - k) * math.log(1.0 - p)
+        self.assertAlmostEqual(lhood.likelihood(self.model), expected, delta=1e-9 * abs(expected))
+
+    def test_ancprev(self):
+        par = self.model.likelihood_par
+        lhood = Likelihood.AncPrevLikelihood(ANC_CSV, YEAR_FIRST)
+        expected = 0.0
+        for row in read_rows(ANC_CSV):
+            t = int(row['Year']) - YEAR_FIRST
+            p_obs = float(row['Prevalence'])
+            w = probit(p_obs)
+            var = 2.0 * math.pi * math.exp(w**2) * p_obs * (1.0 - p_obs) / float(row['N'])
+            var += par[CONST.LHOOD_VARINFL_CENSUS] if row['Site'] == 'Census' else par[CONST.LHOOD_VARINFL_SITE]
+            bias = par[CONST.LHOOD_ANCSS_BIAS] if row['Type'] == 'SS' else par[CONST.LHOOD_ANCRT_BIAS]
+            mean = probit(self.model.births_exposed[t] / self.model.births[t].sum()) + bias
+            expected += norm_logpdf(w, mean, math.sqrt(var))
+        self.assertAlmostEqual(lhood.likelihood(self.model), expected, delta=1e-9 * abs(expected))
+
+        # Bias and variance inflation are read at each evaluation
+        model = random_model(1)
+        model.likelihood_par = dict(par)
+        model.likelihood_par[CONST.LHOOD_ANCSS_BIAS] = 0.0
+        self.assertNotEqual(lhood.likelihood(model), lhood.likelihood(self.model))
+
+    def test_deaths(self):
+        rows = read_rows(self.deaths_csv)
+        lhood = Likelihood.DeathsLikelihood(self.deaths_csv, YEAR_FIRST)
+        expected = 0.0
+        for row in rows:
+            t = int(row['Year']) - YEAR_FIRST
+            a, b = int(row['AgeMin']) - CONST.AGE_ADULT_MIN, int(row['AgeMax']) - CONST.AGE_ADULT_MIN + 1
+            s = CONST.SEX_FEMALE if row['Gender'] == 'Women' else slice(CONST.SEX_MALE_U, CONST.SEX_MALE_C + 1)
+            deaths = self.model.deaths_adult_hiv[t,s,a:b].sum() + self.model.deaths_adult_neg[t,s,a:b].sum()
+            sd = (float(row['Upper']) - float(row['Lower'])) / (2.0 * Likelihood.Z975)
+            expected += norm_logpdf(float(row['Value']), deaths, sd)
+        self.assertAlmostEqual(lhood.likelihood(self.model), expected, delta=1e-9 * abs(expected))
+
+    def array_likelihoods(self):
+        return {'hivprev' : Likelihood.HivPrevLikelihood(HIV_CSV, YEAR_FIRST).likelihood(self.model),
+                'ancprev' : Likelihood.AncPrevLikelihood(ANC_CSV, YEAR_FIRST).likelihood(self.model),
+                'deaths'  : Likelihood.DeathsLikelihood(self.deaths_csv, YEAR_FIRST).likelihood(self.model)}
+
+    def test_percussion_reference(self):
+        if not os.path.exists(REFERENCE_JSON):
+            self.skipTest('No percussion reference log-likelihoods; record them with python -m tests.test_goals_likelihood --record')
+        with open(REFERENCE_JSON) as fh:
+            reference = json.load(fh)
+        for name, value in self.array_likelihoods().items():
+            with self.subTest(likelihood=name):
+                self.assertAlmostEqual(value, reference[name], delta=1e-9 * abs(reference[name]))
+
+    @unittest.skipUnless(HAS_PERCUSSION, "percussion is not installed")
+    def test_percussion(self):
+        reference = percussion_likelihoods(self.model, self.deaths_csv)
+        for name, value in self.array_likelihoods().items():
+            with self.subTest(likelihood=name):
+                self.assertAlmostEqual(value, reference[name], delta=1e-9 * abs(reference[name]))
+
+    @unittest.skipUnless(HAS_PERCUSSION, "percussion is not installed")
+    def test_fitter_flag(self):
+        import calibrate
+        fitters = [calibrate.GoalsFitter("inputs/mwi-2023-inputs.xlsx", ANC_CSV, HIV_CSV, None, array_likelihood=flag) for flag in (False, True)]
+        params = np.array([fitters[0]._pardat[key].initial_value for key in fitters[0]._par_keys])
+        lhood_frames, lhood_arrays = [np.array(fitter.likelihood(params)) for fitter in fitters]
+        self.assertTrue(np.allclose(lhood_arrays, lhood_frames, rtol=1e-9, atol=0.0))
+
+if __name__ == "__main__":
+    if "--record" in sys.argv:
+        record_reference()
+    else:
+        unittest.main()
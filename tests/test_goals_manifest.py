@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+import batch
+
+## Unit tests for the batch driver's manifest handling and job error capture
+
+class Test_TestGoalsManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.manifest_name = os.path.join(self.tmpdir.name, 'manifest.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, manifest):
+        with open(self.manifest_name, 'w') as fh:
+            json.dump(manifest, fh)
+
+    def test_job_list(self):
+        self.write([{'workbook' : 'inputs/a.xlsx'}, {'workbook' : 'inputs/b.xlsx', 'task' : 'calibrate', 'name' : 'b'}])
+        jobs = batch.load_manifest(self.manifest_name)
+        self.assertEqual(jobs[0], {'task' : 'simulate', 'workbook' : 'inputs/a.xlsx', 'name' : 'a-0'})
+        self.assertEqual(jobs[1], {'task' : 'calibrate', 'workbook' : 'inputs/b.xlsx', 'name' : 'b'})
+
+    def test_defaults(self):
+        self.write({'defaults' : {'task' : 'calibrate', 'maxiter' : 50},
+                    'jobs' : [{'workbook' : 'a.xlsx'}, {'workbook' : 'a.xlsx', 'maxiter' : 10, 'task' : 'simulate'}]})
+        jobs = batch.load_manifest(self.manifest_name)
+        self.assertEqual([job['task'] for job in jobs], ['calibrate', 'simulate'])
+        self.assertEqual([job['maxiter'] for job in jobs], [50, 10])
+        self.assertEqual([job['name'] for job in jobs], ['a-0', 'a-1'])
+
+    def test_validation(self):
+        invalid = [[{'task' : 'simulate'}],                                       # no workbook
+                   [{'workbook' : 'a.xlsx', 'task' : 'forecast'}],                # unrecognized task
+                   [{'workbook' : 'a.xlsx', 'name' : 'x'}, {'workbook' : 'b.xlsx', 'name' : 'x'}],
+                   [{'workbook' : 'a.xlsx', 'name' : '../x'}],
+                   [{'workbook' : 'a.xlsx', 'name' : 'x/y'}],
+                   [{'workbook' : 'a.xlsx', 'name' : 'x\\y'}],
+                   [{'workbook' : 'a.xlsx', 'name' : '..'}],
+                   [{'workbook' : 'a.xlsx', 'name' : ''}]]
+        for manifest in invalid:
+            self.write(manifest)
+            with self.assertRaises(ValueError, msg=json.dumps(manifest)):
+                batch.load_manifest(self.manifest_name)
+
+    def test_run_job(self):
+        job = {'name' : 'a', 'task' : 'simulate', 'workbook' : 'a.xlsx'}
+        with unittest.mock.patch.object(batch, 'run_simulate') as run_simulate:
+            result = batch.run_job(job, self.tmpdir.name)
+        run_simulate.assert_called_once_with(job, os.path.join(self.tmpdir.name, 'a'))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmpdir.name, 'a')))
+        self.assertEqual((result['status'], result['error'], result['bundle']), ('ok', '', None))
+
+    def test_run_job_failure(self):
+        job = {'name' : 'b', 'task' : 'calibrate', 'workbook' : 'b.xlsx'}
+        with unittest.mock.patch.object(batch, 'run_calibrate', side_effect=RuntimeError('fit diverged')):
+            result = batch.run_job(job, self.tmpdir.name)
+        self.assertEqual((result['name'], result['task'], result['status']), ('b', 'calibrate', 'failed'))
+        self.assertIn('RuntimeError: fit diverged', result['error'])
+        self.assertIsNone(result['bundle'])
+        self.assertEqual(result['pid'], os.getpid())
+
+    def test_read_fitting(self):
+        xlsx_name = os.path.join(self.tmpdir.name, 'a.xlsx')
+        open(xlsx_name, 'w').close()
+        fitting = unittest.mock.Mock()
+        fitting.read_fitting_pars.return_value = {'par' : (0.5, 'uniform', 0.0, 1.0, True)}
+        with unittest.mock.patch.object(batch, 'calibrate', fitting, create=True):
+            first, second = batch.read_fitting(xlsx_name), batch.read_fitting(xlsx_name)
+        fitting.read_fitting_pars.assert_called_once_with(xlsx_name)
+        self.assertIs(first, second)
+
+if __name__ == "__main__":
+    unittest.main()
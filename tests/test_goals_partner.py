@@ -0,0 +1,54 @@
+import numpy as np
+import unittest
+import src.goals_const as CONST
+from src.goals_model import Model
+
+## Unit tests for cached partnership rate updates. Partnership inputs are set
+## directly, so no workbook or projection is needed.
+
+class Test_TestGoalsPartner(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.model = Model()
+        self.model.year_first, self.model.year_final = 1970, 2030
+        self.model.partner_time_trend = rng.uniform(0.5, 1.5, (CONST.N_SEX, 2050 - CONST.XLSX_FIRST_YEAR + 1))
+        self.model.partner_age_params = np.array([[22.0, 27.0], [6.0, 8.0]])
+        self.model.partner_pop_ratios = rng.uniform(0.5, 5.0, (7, CONST.N_SEX))
+        self.model.partner_rate = np.zeros((61, CONST.N_SEX, CONST.N_AGE_ADULT, CONST.N_POP))
+        self.model._partner_factors = [None] * CONST.N_SEX
+        self.model.update_partner_rates()
+
+    def expected(self):
+        m = self.model
+        return m.calc_partner_rates(m.partner_time_trend, m.partner_age_params, m.partner_pop_ratios)
+
+    def test_initial(self):
+        self.assertTrue(np.array_equal(self.model.partner_rate, self.expected()))
+        self.assertTrue(np.all(self.model.partner_rate[:,:,-1,:] == 0.0))
+
+    def test_unchanged(self):
+        self.assertEqual(self.model.update_partner_rates(), [])
+
+    def test_pop_ratio_change(self):
+        self.model.partner_pop_ratios[CONST.POP_FSW-1,CONST.SEX_FEMALE] = 9.0
+        self.assertEqual(self.model.update_partner_rates(), [CONST.SEX_FEMALE])
+        self.assertTrue(np.array_equal(self.model.partner_rate, self.expected()))
+
+    def test_age_param_change(self):
+        self.model.partner_age_params[0,CONST.SEX_MALE] = 31.0
+        self.assertEqual(self.model.update_partner_rates(), [CONST.SEX_MALE])
+        self.assertTrue(np.array_equal(self.model.partner_rate, self.expected()))
+
+    def test_time_trend_change(self):
+        self.model.partner_time_trend[CONST.SEX_FEMALE,:] = 0.8
+        self.model.partner_time_trend[CONST.SEX_MALE,:] = 1.2
+        self.assertEqual(self.model.update_partner_rates(), [CONST.SEX_FEMALE, CONST.SEX_MALE])
+        self.assertTrue(np.array_equal(self.model.partner_rate, self.expected()))
+
+    def test_force(self):
+        self.model.partner_rate[:] = 0.0
+        self.assertEqual(self.model.update_partner_rates(force=True), [CONST.SEX_FEMALE, CONST.SEX_MALE])
+        self.assertTrue(np.array_equal(self.model.partner_rate, self.expected()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import pickle
+import numpy as np
+import unittest
+from src.goals_model import Model
+
+class Test_TestGoalsPickle(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.model = Model()
+        self.model.init_from_xlsx("inputs/example-inputs.xlsx")
+        self.model.art_prop[-10:,:] = 0.9
+        self.model.refresh_input('art_prop', self.model.year_final - 9)
+        self.model.project(self.model.year_final)
+
+    def roundtrip(self, model):
+        buffers = []
+        data = pickle.dumps(model, protocol=5, buffer_callback=buffers.append)
+        return pickle.loads(data, buffers=buffers)
+
+    def test_projection_matches(self):
+        clone = self.roundtrip(self.model)
+        self.assertEqual(clone.last_valid_year(), -1)
+        np.testing.assert_array_equal(clone.art_prop, self.model.art_prop)
+        clone.project(clone.year_final)
+        np.testing.assert_allclose(clone.pop_adult_hiv, self.model.pop_adult_hiv)
+        self.assertFalse(np.shares_memory(clone.pop_adult_hiv, self.model.pop_adult_hiv))
+
+    def test_uninitialized(self):
+        self.assertFalse(self.roundtrip(Model()).is_initialized())
+
+if __name__ == "__main__":
+    unittest.main()
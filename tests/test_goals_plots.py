@@ -0,0 +1,45 @@
+import os
+import tempfile
+import types
+import numpy as np
+import pandas as pd
+import unittest
+import src.goals_estimates as Estimates
+import src.goals_model as Goals
+import src.goals_plots as Plots
+
+def random_model(seed, year_first=1970, year_final=2030):
+    rng = np.random.default_rng(seed)
+    model = types.SimpleNamespace(year_first=year_first, year_final=year_final)
+    for name, shape in Goals.output_shapes(year_final - year_first + 1).items():
+        setattr(model, name, rng.random(shape))
+    return model
+
+class Test_TestGoalsPlots(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.model = random_model(1)
+        hiv_data = pd.read_csv("inputs/mwi-2023-hiv-prev.csv")
+        anc_data = pd.read_csv("inputs/mwi-2023-anc-prev.csv")
+        self.hivdat = types.SimpleNamespace(hiv_data=hiv_data[hiv_data['Year'] <= 2030])
+        self.ancdat = types.SimpleNamespace(anc_data=anc_data)
+
+    def test_bundle(self):
+        bundle = Plots.fit_bundle(self.model, self.ancdat, self.hivdat)
+        self.assertEqual(sorted(bundle), ['ancfit', 'hivfit'])
+        hiv_data, mod_data = bundle['hivfit']
+        self.assertEqual(len(mod_data), (self.model.year_final - self.model.year_first + 1) * len(hiv_data.groupby(['Population', 'Gender', 'AgeMin', 'AgeMax'])))
+        row = mod_data.iloc[[100]].reset_index(drop=True)
+        self.assertAlmostEqual(mod_data['Prevalence'].iloc[100], Estimates.HivPrevIndex(row, self.model.year_first).estimate(self.model)[0])
+
+    def test_render(self):
+        with tempfile.TemporaryDirectory() as path:
+            bundle_name = os.path.join(path, "fit-plots.pkl")
+            Plots.write_bundle(Plots.fit_bundle(self.model, self.ancdat), bundle_name)
+            with Plots.PlotRenderer(1, formats=('png',), dpi=50) as renderer:
+                written = renderer.submit(bundle_name, path).result()
+            self.assertEqual(written, [os.path.join(path, "ancfit.png")])
+            self.assertTrue(os.path.getsize(written[0]) > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import numpy as np
+import unittest
+import src.goals_model as Goals
+from src.goals_model import Model
+
+XLSX_NAME = "tests/test-external-clhiv.xlsx"
+
+class Test_TestGoalsProjectMany(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        inputs = Model().read_xlsx(XLSX_NAME)
+        cls.serial, cls.threaded = [], []
+        for k in range(3):
+            for models in (cls.serial, cls.threaded):
+                model = Model()
+                model.init_from_inputs(inputs)
+                models.append(model)
+
+    def test_matches_serial(self):
+        for model in self.serial:
+            model.project(model.year_final)
+        Goals.project_many(self.threaded, self.threaded[0].year_final, num_threads=2)
+        for model_serial, model_threaded in zip(self.serial, self.threaded):
+            self.assertEqual(model_threaded.last_valid_year(), model_serial.year_final)
+            for name in Goals.output_shapes(0):
+                self.assertTrue(np.array_equal(getattr(model_serial, name), getattr(model_threaded, name)), name)
+
+    def test_duplicates(self):
+        model = Model()
+        with self.assertRaises(ValueError):
+            Goals.project_many([model, Model(), model], 2030)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import io
+import os
+import tempfile
+import numpy as np
+import unittest
+import src.goals_recorder as Recorder
+
+## Unit tests for calibration evaluation traces
+
+class Test_TestGoalsRecorder(unittest.TestCase):
+    def test_trace_roundtrip(self):
+        params = np.array([[0.1 * k, -0.1 * k] for k in range(11)])
+        with tempfile.TemporaryDirectory() as path:
+            trace_name = os.path.join(path, "trace.bin")
+            with Recorder.EvalRecorder(['a', 'b'], trace_name, batch_size=4, report_every=5, stream=io.StringIO()) as recorder:
+                for k in range(params.shape[0]):
+                    recorder.record(params[k], -float(k), -1.0, -2.0, -3.0, 0.5, 0.01)
+            trace = Recorder.read_trace(trace_name)
+
+        self.assertEqual(trace['par_names'], ['a', 'b'])
+        self.assertTrue(np.array_equal(trace['eval'], np.arange(11)))
+        self.assertTrue(np.array_equal(trace['params'], params))
+        self.assertTrue(np.allclose(trace['posterior'], -np.arange(11) + 0.5))
+        self.assertTrue(np.array_equal(recorder.best_params, params[0]))
+
+    def test_progress_reports(self):
+        stream = io.StringIO()
+        recorder = Recorder.EvalRecorder(['a'], None, report_every=3, stream=stream)
+        for k in range(7):
+            recorder.record([k], 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        recorder.close()
+        self.assertEqual(len(stream.getvalue().splitlines()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
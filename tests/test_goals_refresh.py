@@ -0,0 +1,64 @@
+import numpy as np
+import unittest
+import src.goals_async as Async
+from src.goals_model import Model
+
+## Shared inputs that the engine copies are reloaded only when marked with
+## refresh_input, so invalidate alone does no input work
+
+class Test_TestGoalsRefresh(unittest.TestCase):
+    def setUp(self):
+        self.model = Model()
+        self.model.init_from_xlsx("tests/test-external-clhiv.xlsx")
+        self.model.project(self.model.year_final)
+        self.num_years = self.model.year_final - self.model.year_first + 1
+
+    def test_invalidate_only(self):
+        refreshed = self.model._proj.refreshed_input_years()
+        pop_adult_hiv = self.model.pop_adult_hiv.copy()
+        for k in range(3):
+            self.model.invalidate(-1)
+            self.model.project(self.model.year_final)
+        self.assertEqual(self.model._proj.refreshed_input_years(), refreshed)
+        np.testing.assert_array_equal(self.model.pop_adult_hiv, pop_adult_hiv)
+
+    def test_refresh_input(self):
+        year = 2015
+        refreshed = self.model._proj.refreshed_input_years()
+        pop_adult_hiv = self.model.pop_adult_hiv.copy()
+        self.model.art_prop[year - self.model.year_first:,:] = 0.95
+        self.model.art_num[year - self.model.year_first:,:] = 0.0
+        self.model.refresh_input('art_prop', year)
+        self.model.refresh_input('art_num', year + 5) # ART inputs reload together from the earliest year marked
+        self.assertEqual(self.model.last_valid_year(), year - 1)
+        self.model.project(self.model.year_final)
+        self.assertEqual(self.model._proj.refreshed_input_years() - refreshed, self.model.year_final - year + 1)
+        t = year - self.model.year_first
+        np.testing.assert_array_equal(self.model.pop_adult_hiv[:t], pop_adult_hiv[:t])
+        self.assertFalse(np.array_equal(self.model.pop_adult_hiv[t+1:], pop_adult_hiv[t+1:]))
+
+        # Marks are cleared once reloaded
+        self.model.invalidate(year)
+        self.model.project(self.model.year_final)
+        self.assertEqual(self.model._proj.refreshed_input_years() - refreshed, self.model.year_final - year + 1)
+
+    def test_direct_shared_input(self):
+        refreshed = self.model._proj.refreshed_input_years()
+        self.model.refresh_input('partner_rate', self.model.year_first) # read directly by the engine, nothing to reload
+        self.assertEqual(self.model.last_valid_year(), -1)
+        self.model.project(self.model.year_final)
+        self.assertEqual(self.model._proj.refreshed_input_years(), refreshed)
+
+    def test_refresh_resumes(self):
+        # Year-by-year drivers resume from last_valid_year, so refresh_input alone must lower it
+        year = 2020
+        self.model.art_prop[year - self.model.year_first:,:] = 0.95
+        self.model.refresh_input('art_prop', year)
+        self.assertEqual(self.model.last_valid_year(), year - 1)
+        years = []
+        task = Async.project_async(self.model, self.model.year_final, lambda y, outputs : years.append(y))
+        self.assertEqual(task.result(), self.model.year_final)
+        self.assertEqual(years, list(range(year, self.model.year_final + 1)))
+
+if __name__ == "__main__":
+    unittest.main()
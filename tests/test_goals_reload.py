@@ -0,0 +1,82 @@
+import os
+import tempfile
+import numpy as np
+import openpyxl as xlsx
+import unittest
+import src.goals_const as CONST
+import src.goals_model as Goals
+import src.goals_utils as Utils
+from src.goals_model import Model
+
+XLSX_NAME = "tests/test-external-clhiv.xlsx"
+
+class Test_TestGoalsReload(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.xlsx_name = os.path.join(self.tempdir.name, "inputs.xlsx")
+        xlsx.load_workbook(XLSX_NAME).save(self.xlsx_name) # resave so later edits change only the edited tabs
+        self.model = Model()
+        self.model.init_from_xlsx(self.xlsx_name)
+        self.model.project(self.model.year_final)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def edit(self, tab, cell, value):
+        wb = xlsx.load_workbook(self.xlsx_name)
+        wb[tab][cell] = value
+        wb.save(self.xlsx_name)
+
+    def assert_matches_fresh(self):
+        fresh = Model()
+        fresh.init_from_xlsx(self.xlsx_name)
+        fresh.project(fresh.year_final)
+        self.model.project(self.model.year_final)
+        for name in ('pop_adult_hiv', 'deaths_adult_hiv', 'new_infections', 'births'):
+            self.assertTrue(np.allclose(getattr(self.model, name), getattr(fresh, name)), name)
+
+    def test_unchanged(self):
+        self.assertIsNone(self.model.reload(self.xlsx_name))
+
+    def test_year_indexed_change(self):
+        self.edit(CONST.XLSX_TAB_ADULT_ART, "AZ8", 95.0) # % on ART, 2020
+        self.assertEqual(self.model.reload(self.xlsx_name), 2020)
+        self.assertAlmostEqual(self.model.art_prop[2020 - self.model.year_first, 1], 0.95)
+        self.assert_matches_fresh()
+
+    def test_scalar_change(self):
+        self.edit(CONST.XLSX_TAB_HIV_FERT, "B29", 0.8)
+        self.assertEqual(self.model.reload(self.xlsx_name), self.model.year_first)
+        self.assertEqual(self.model.hiv_frr['laf'], 0.8)
+        self.assert_matches_fresh()
+
+class Test_TestGoalsReloadChanges(unittest.TestCase):
+    def test_tab_hashes(self):
+        with tempfile.TemporaryDirectory() as path:
+            xlsx_name = os.path.join(path, "inputs.xlsx")
+            wb = xlsx.Workbook()
+            wb.active.title = "A"
+            wb["A"]["A1"] = "text"
+            wb.create_sheet("B")["A1"] = "more text"
+            wb.save(xlsx_name)
+            hashes = Utils.xlsx_tab_hashes(xlsx_name)
+
+            wb["A"]["A2"] = "new text" # adds to the strings shared by both tabs
+            wb.save(xlsx_name)
+            edited = Utils.xlsx_tab_hashes(xlsx_name)
+            self.assertNotEqual(edited["A"], hashes["A"])
+            self.assertEqual(edited["B"], hashes["B"])
+
+    def test_row_origin(self):
+        year_first = 1980
+        sti_trend = np.zeros((CONST.XLSX_FINAL_YEAR - CONST.XLSX_FIRST_YEAR + 1, CONST.N_SEX, CONST.N_POP))
+        sti_age = np.zeros((CONST.N_SEX, CONST.N_POP, 2))
+        by_year = Goals.YEAR_INDEXED_INPUTS['sti_prev']
+        for year, expected in [(2000, 2000), (1975, year_first)]:
+            edited = sti_trend.copy()
+            edited[year - CONST.XLSX_FIRST_YEAR, CONST.SEX_FEMALE, CONST.POP_NEVER] = 0.1
+            self.assertEqual(Goals._first_changed_year((sti_trend, sti_age), (edited, sti_age), by_year, year_first), expected)
+        self.assertIsNone(Goals._first_changed_year((sti_trend, sti_age), (sti_trend.copy(), sti_age), by_year, year_first))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import types
+import unittest
+import unittest.mock
+import numpy as np
+import src.goals_const as CONST
+import src.goals_model as Goals
+import src.goals_results as Results
+import src.goals_sensitivity as Sensitivity
+import src.goals_workers as Workers
+
+YEAR_FIRST, YEAR_FINAL = 1970, 2050
+
+def random_model(seed):
+    """! An object with random Model outputs"""
+    rng = np.random.default_rng(seed)
+    model = types.SimpleNamespace(year_first=YEAR_FIRST, year_final=YEAR_FINAL, _dtype=np.float64, _order="C")
+    for name, shape in Goals.output_shapes(YEAR_FINAL - YEAR_FIRST + 1).items():
+        setattr(model, name, rng.random(shape))
+    return model
+
+class SmoothFitter:
+    """! Stand-in fitter with smooth likelihood components of known derivatives"""
+    def __init__(self):
+        self.hivsim = random_model(0)
+        self.base = self.hivsim.new_infections.copy()
+
+    def likelihood(self, params):
+        x = np.asarray(params)
+        self.hivsim.new_infections[:] = self.base * x[0] # so indicators depend on parameters
+        lhood_hiv = -((x - 0.5)**2).sum()
+        lhood_anc = np.sin(x[0]) * x[1]
+        lhood_deaths = x[2]**3
+        return lhood_hiv + lhood_anc + lhood_deaths, lhood_hiv, lhood_anc, lhood_deaths
+
+    @staticmethod
+    def jacobian(params):
+        x = np.asarray(params)
+        d_hiv = -2.0 * (x - 0.5)
+        d_anc = np.array([np.cos(x[0]) * x[1], np.sin(x[0]), 0.0])
+        d_deaths = np.array([0.0, 0.0, 3.0 * x[2]**2])
+        return np.array([d_hiv + d_anc + d_deaths, d_hiv, d_anc, d_deaths])
+
+class Test_TestGoalsSensitivity(unittest.TestCase):
+    names = ['a', 'b', 'c']
+    lower, upper = np.zeros(3), np.full(3, 2.0)
+
+    def test_jacobian(self):
+        params = np.array([0.3, 1.2, 0.7])
+        with Workers.FitterPool(SmoothFitter, 0) as pool:
+            sens = Sensitivity.Sensitivity(pool, self.names, self.lower, self.upper)
+            for scheme, tol in (('central', 1e-6), ('forward', 1e-3)):
+                jac = sens.jacobian(params, scheme=scheme, indicators=('incidence',))
+                self.assertTrue(np.allclose(jac['likelihood_jacobian'], SmoothFitter.jacobian(params), atol=tol))
+            # incidence is proportional to a, so its derivative is incidence / a
+            self.assertTrue(np.allclose(jac['indicator_jacobians']['incidence'][0], jac['indicators']['incidence'] / params[0], rtol=1e-3))
+            self.assertTrue(np.allclose(jac['indicator_jacobians']['incidence'][1:], 0.0))
+
+    def test_gradient_at_bounds(self):
+        params = np.array([0.0, 2.0, 1.0]) # one-sided differences at both bounds
+        with Workers.FitterPool(SmoothFitter, 0) as pool:
+            grad = Sensitivity.Sensitivity(pool, self.names, self.lower, self.upper).gradient(params)
+        self.assertTrue(np.allclose(grad, SmoothFitter.jacobian(params)[0], atol=1e-3))
+
+    def test_gradient_evaluations(self):
+        sens = Sensitivity.Sensitivity(None, self.names, self.lower, self.upper)
+        for params, scheme, num_points, uses_params in ((np.array([0.3, 1.2, 0.7]), 'central', 6, False),
+                                                        (np.array([0.3, 1.2, 0.7]), 'forward', 4, True),
+                                                        (np.array([0.0, 1.2, 0.7]), 'central', 6, True)): # one-sided at a bound
+            points, terms = sens._stencil(params, scheme)
+            self.assertEqual(len(points), num_points)
+            self.assertEqual(any(np.array_equal(x, params) for x in points), uses_params)
+        with Workers.FitterPool(SmoothFitter, 0) as pool:
+            params = np.array([0.3, 1.2, 0.7])
+            grad = Sensitivity.Sensitivity(pool, self.names, self.lower, self.upper).gradient(params)
+        self.assertTrue(np.allclose(grad, SmoothFitter.jacobian(params)[0], atol=1e-6))
+
+    def test_worker_processes(self):
+        params = np.array([0.3, 1.2, 0.7])
+        with Workers.FitterPool(SmoothFitter, 0) as pool:
+            serial = Sensitivity.Sensitivity(pool, self.names, self.lower, self.upper).jacobian(params)
+        with Workers.FitterPool(SmoothFitter, 2) as pool:
+            self.assertEqual(pool.num_workers, 2)
+            parallel = Sensitivity.Sensitivity(pool, self.names, self.lower, self.upper).jacobian(params)
+        self.assertTrue(np.array_equal(serial['likelihood_jacobian'], parallel['likelihood_jacobian']))
+        for name in serial['indicators']:
+            self.assertTrue(np.array_equal(serial['indicator_jacobians'][name], parallel['indicator_jacobians'][name]))
+
+    def test_pool_errors(self):
+        with Workers.FitterPool(SmoothFitter, 0) as pool:
+            future = pool.submit(lambda fitter : fitter.missing)
+            self.assertRaises(AttributeError, future.result)
+
+    def test_equal_bounds(self):
+        with self.assertRaises(ValueError):
+            Sensitivity.Sensitivity(None, self.names, self.lower, np.array([2.0, 0.0, 2.0]))
+
+class Test_TestGoalsResults(unittest.TestCase):
+    def test_indicators(self):
+        model = random_model(1)
+        res = Results.Results(model)
+        female, male = CONST.SEX_FEMALE, slice(CONST.SEX_MALE_U, CONST.SEX_MALE_C + 1)
+        ages = slice(0, 49 - CONST.AGE_ADULT_MIN + 1)
+        for s, sex in ((0, female), (1, male)):
+            neg = model.pop_adult_neg[:,sex,ages].reshape(model.pop_adult_neg.shape[0], -1).sum(1)
+            hiv = model.pop_adult_hiv[:,sex,ages].reshape(model.pop_adult_hiv.shape[0], -1).sum(1)
+            self.assertTrue(np.allclose(res.prevalence()[:,s], hiv / (neg + hiv)))
+
+            new_hiv = model.new_infections[:,sex,15:50].reshape(model.new_infections.shape[0], -1).sum(1)
+            self.assertEqual(res.incidence()[0,s], 0.0)
+            self.assertTrue(np.allclose(res.incidence()[1:,s], new_hiv[1:] / neg[:-1]))
+
+            deaths = sum(getattr(model, name)[:,sex].reshape(model.births.shape[0], -1).sum(1)
+                         for name in ('deaths_adult_hiv', 'deaths_child_hiv', 'deaths_adult_neg', 'deaths_child_neg'))
+            self.assertTrue(np.allclose(res.deaths()[:,s], deaths))
+
+class Test_TestGoalsFitterCache(unittest.TestCase):
+    """! The project-skip cache in GoalsFitter.project. Requires the calculation engine."""
+
+    @classmethod
+    def setUpClass(cls):
+        import calibrate
+        cls.fitter = calibrate.GoalsFitter("inputs/mwi-2023-inputs.xlsx", None, None, None)
+
+    def count_projections(self, params_list):
+        fitter = self.fitter
+        with unittest.mock.patch.object(fitter.hivsim, 'project', wraps=fitter.hivsim.project) as project:
+            for params in params_list:
+                fitter.project(params)
+            return project.call_count
+
+    def test_cache(self):
+        names = self.fitter.parameter_names()
+        p_init = np.array([self.fitter._pardat[key].initial_value for key in names])
+        lhood_only = [idx for idx, key in enumerate(names) if key in CONST.FIT_LIKELIHOOD_ONLY]
+        other = [idx for idx, key in enumerate(names) if key not in CONST.FIT_LIKELIHOOD_ONLY]
+
+        # Changing only likelihood parameters reuses the projection but still sets them
+        self.fitter.invalidate()
+        p_lhood = p_init.copy()
+        p_lhood[lhood_only] *= 1.1
+        self.assertEqual(self.count_projections([p_init, p_init, p_lhood]), 1)
+        for idx in lhood_only:
+            self.assertEqual(self.fitter.hivsim.likelihood_par[names[idx]], p_lhood[idx])
+
+        # Changing any other parameter projects again
+        p_proj = p_init.copy()
+        p_proj[other[0]] *= 1.1
+        self.assertEqual(self.count_projections([p_init, p_proj, p_init]), 2)
+
+        self.assertEqual(self.count_projections([p_init]), 0)
+        self.fitter.invalidate()
+        self.assertEqual(self.count_projections([p_init]), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import numpy as np
+import unittest
+import src.goals_service as Service
+
+class Test_TestGoalsService(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.pool = Service.ModelPool("tests/test-external-clhiv.xlsx", 2)
+        self.service = Service.ProjectionService({"test" : self.pool})
+        self.loop = asyncio.new_event_loop()
+        self.port = self.loop.run_until_complete(self.service.start(port=0))
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def tearDownClass(self):
+        asyncio.run_coroutine_threadsafe(self.service.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def test_baseline_repeatable(self):
+        payload = {"indicators" : ["births", "prevalence"]}
+        first = Service.request("127.0.0.1", self.port, payload)
+        scenario = Service.request("127.0.0.1", self.port, {"indicators" : ["births"], "inputs" : {"art_prop" : {"scale" : 0.5, "from_year" : 2010}}})
+        second = Service.request("127.0.0.1", self.port, payload)
+        self.assertEqual(first['prevalence'].shape[1], 2)
+        np.testing.assert_allclose(first['births'], second['births'])
+        np.testing.assert_allclose(first['births'][:2010 - self.pool.year_first], scenario['births'][:2010 - self.pool.year_first])
+
+    def test_year_stop(self):
+        # A short scenario must not return later years left over from an earlier request
+        year_stop = 2000
+        Service.request("127.0.0.1", self.port, {"indicators" : ["births"], "inputs" : {"art_prop" : {"scale" : 0.5, "from_year" : 1990}}})
+        result = Service.request("127.0.0.1", self.port, {"year_stop" : year_stop, "indicators" : ["births", "incidence"]})
+        self.assertEqual(result['births'].shape[0], year_stop - self.pool.year_first + 1)
+        self.assertEqual(result['incidence'].shape[0], year_stop - self.pool.year_first + 1)
+        for year_stop in [self.pool.year_first - 1, self.pool.year_final + 1, "2000"]:
+            self.assertRaises(Service.RequestError, Service.request, "127.0.0.1", self.port, {"year_stop" : year_stop})
+
+    def test_bad_input(self):
+        self.assertRaises(Service.RequestError, Service.request, "127.0.0.1", self.port, {"inputs" : {"epi_pars" : {"scale" : 2.0}}})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import numpy as np
+import scipy.stats as stats
+import unittest
+import src.goals_staged as Staged
+
+## Unit tests for staged calibration, using a quadratic stand-in for the
+## log-posterior whose truncated-fidelity version has a slightly shifted mode
+
+class QuadraticFitter:
+    def __init__(self):
+        self.mode = np.array([0.5, -1.0, 1.5])
+        self.truncate = False
+        self.evals = {False : [], True : []}
+
+    def parameter_names(self):
+        return ['a', 'b', 'c']
+
+    def prior_quantile(self, u):
+        return stats.norm.ppf(u)
+
+    def bounds(self):
+        return np.full(3, -5.0), np.full(3, 5.0)
+
+    def set_fidelity(self, truncate=False):
+        self.truncate = truncate
+
+    def posterior(self, params):
+        self.evals[self.truncate].append(np.array(params))
+        mode = self.mode + (0.05 if self.truncate else 0.0)
+        return -((np.asarray(params) - mode)**2).sum()
+
+class Test_TestGoalsStaged(unittest.TestCase):
+    def test_search_finds_mode(self):
+        fitter = QuadraticFitter()
+        search = Staged.StagedSearch(fitter, seed=1)
+        p_best, post = search.run(x_init=np.zeros(3))
+        self.assertTrue(np.allclose(p_best, fitter.mode, atol=1e-3))
+        self.assertAlmostEqual(post, fitter.posterior(p_best))
+        self.assertFalse(fitter.truncate)
+        self.assertEqual([rep['stage'] for rep in search.report], ['coarse', 'full'])
+        self.assertEqual([rep['starts'] for rep in search.report], [4, 1])
+        self.assertEqual(search.report[0]['evals'], len(fitter.evals[True]))
+
+    def test_fixed_parameters(self):
+        fitter = QuadraticFitter()
+        stages = Staged.default_stages(fixed=['c'])
+        search = Staged.StagedSearch(fitter, stages, seed=1)
+        p_best, post = search.run(x_init=np.zeros(3))
+        # each coarse start keeps its own value of c
+        self.assertEqual(len({p[2] for p in fitter.evals[True]}), 4)
+        self.assertEqual(fitter.evals[True][0][2], 0.0)
+        self.assertTrue(np.allclose(p_best, fitter.mode, atol=1e-3))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import numpy as np
+import unittest
+import src.goals_ensemble as Ensemble
+import src.goals_stats as Stats
+
+## Unit tests for streaming ensemble statistics
+
+class Test_TestGoalsStats(unittest.TestCase):
+    def test_moments_merge(self):
+        rng = np.random.default_rng(1)
+        x = rng.normal(size=(50, 3, 2))
+        lo, hi = Stats.RunningMoments((3, 2)), Stats.RunningMoments((3, 2))
+        for k in range(20): lo.add(x[k])
+        for k in range(20, 50): hi.add(x[k])
+        lo.merge(hi)
+        self.assertEqual(lo.count, 50)
+        self.assertTrue(np.allclose(lo.mean, x.mean(axis=0)))
+        self.assertTrue(np.allclose(lo.variance(), x.var(axis=0, ddof=1)))
+
+    def test_sketch_quantiles(self):
+        rng = np.random.default_rng(2)
+        x = rng.normal(size=(5000, 4))
+        parts = [Stats.QuantileSketch((4,), k=64, seed=s) for s in range(3)]
+        for k in range(x.shape[0]):
+            parts[k % 3].add(x[k])
+        parts[0].merge(parts[1])
+        parts[0].merge(parts[2])
+        q = parts[0].quantile([0.1, 0.5, 0.9])
+        self.assertEqual(parts[0].count, 5000)
+        self.assertEqual(q.shape, (3, 4))
+        self.assertTrue(np.allclose(q, np.quantile(x, [0.1, 0.5, 0.9], axis=0), atol=0.1))
+
+    def test_sketch_merge_unequal(self):
+        rng = np.random.default_rng(4)
+        x = rng.normal(size=(9, 2))
+        # One sketch holds a compacted upper level and an empty lower level, the other has no levels
+        for order in [(0, 1), (1, 0)]:
+            parts = [Stats.QuantileSketch((2,), k=4, seed=s) for s in range(2)]
+            for k in range(8): parts[1].add(x[k])
+            parts[0].add(x[8])
+            whole = Stats.QuantileSketch((2,), k=4, seed=5)
+            for k in range(9): whole.add(x[k])
+            parts[order[0]].merge(parts[order[1]])
+            merged = parts[order[0]]
+            self.assertEqual(merged.count, 9)
+            q = merged.quantile([0.0, 0.5, 1.0])
+            self.assertEqual(q.shape, (3, 2))
+            self.assertTrue(np.all((q >= x.min(axis=0)) & (q <= x.max(axis=0))))
+            self.assertTrue(np.allclose(q, whole.quantile([0.0, 0.5, 1.0]), atol=1.5))
+
+        rng = np.random.default_rng(6)
+        x = rng.normal(size=(3000, 3))
+        for sizes in [(2900, 100), (100, 2900)]:
+            lo, hi = Stats.QuantileSketch((3,), k=64, seed=7), Stats.QuantileSketch((3,), k=64, seed=8)
+            for k in range(sizes[0]): lo.add(x[k])
+            for k in range(sizes[0], 3000): hi.add(x[k])
+            whole = Stats.QuantileSketch((3,), k=64, seed=9)
+            for k in range(3000): whole.add(x[k])
+            lo.merge(hi)
+            self.assertEqual(lo.count, 3000)
+            q = lo.quantile([0.1, 0.5, 0.9])
+            self.assertTrue(np.allclose(q, whole.quantile([0.1, 0.5, 0.9]), atol=0.15))
+            self.assertTrue(np.allclose(q, np.quantile(x, [0.1, 0.5, 0.9], axis=0), atol=0.1))
+
+    def test_sketch_exact_when_small(self):
+        sketch = Stats.QuantileSketch((), k=16)
+        for val in [5.0, 1.0, 3.0, 2.0, 4.0]:
+            sketch.add(val)
+        self.assertEqual(sketch.quantile(0.5), 3.0)
+
+    def test_latin_hypercube(self):
+        u = Stats.latin_hypercube(20, 3, seed=3)
+        for j in range(3):
+            self.assertTrue(np.array_equal(np.sort(np.floor(20 * u[:,j])), np.arange(20)))
+
+    def test_empty_ensemble(self):
+        with self.assertRaises(ValueError):
+            Ensemble.run_ensemble(None, np.zeros((0, 4)))
+
+if __name__ == "__main__":
+    unittest.main()
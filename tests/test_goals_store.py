@@ -0,0 +1,66 @@
+import tempfile
+import numpy as np
+import unittest
+import src.goals_results as Results
+import src.goals_store as Store
+from src.goals_model import Model
+
+XLSX_NAME = "tests/test-external-clhiv.xlsx"
+
+class Test_TestGoalsStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.model = Model()
+        self.model.init_from_xlsx(XLSX_NAME)
+        self.model.project(self.model.year_final)
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.store = Store.ResultsStore(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_index(self):
+        run_a = self.store.add(self.model, scenario="baseline", workbook=XLSX_NAME, params=[0.5, 1.0])
+        run_b = self.store.add(self.model, scenario="scale-up", meta={"draw" : 3})
+        self.assertEqual([run['run_id'] for run in self.store.runs()], [run_a, run_b])
+        baseline = self.store.runs(scenario="baseline")
+        self.assertEqual(len(baseline), 1)
+        self.assertEqual(baseline[0]['workbook_hash'], Store.file_hash(XLSX_NAME))
+        self.assertEqual(baseline[0]['params'].tolist(), [0.5, 1.0])
+        self.assertEqual(self.store.runs(scenario="scale-up")[0]['meta'], {"draw" : 3})
+        with self.assertRaises(ValueError):
+            self.store.runs(params="[]")
+
+    def test_query_slice(self):
+        self.store.add(self.model, scenario="baseline")
+        self.store.add(self.model, scenario="baseline")
+        run_ids, prev = self.store.query(lambda res : res.prevalence(15, 49), (2010, 2030), "female", scenario="baseline")
+        self.assertEqual(len(run_ids), 2)
+        self.assertEqual(prev.shape, (2, 21))
+        expected = Results.Results(self.model).prevalence(15, 49)[(2010 - self.model.year_first):(2031 - self.model.year_first), 0]
+        self.assertTrue(np.allclose(prev[1], expected))
+
+    def test_query_incidence(self):
+        self.store.add(self.model, scenario="baseline")
+        full = Results.Results(self.model).incidence()
+        _, inci = self.store.query('incidence', (2010, 2030))
+        self.assertEqual(inci.shape, (1, 21, 2))
+        self.assertTrue(np.all(inci[0,0] > 0.0))
+        self.assertTrue(np.allclose(inci[0], full[(2010 - self.model.year_first):(2031 - self.model.year_first)]))
+        _, inci = self.store.query('incidence', (self.model.year_first, 2030))
+        self.assertTrue(np.allclose(inci[0], full[:(2031 - self.model.year_first)]))
+
+    def test_open_run(self):
+        run_id = self.store.add(self.model)
+        run = self.store.open_run(run_id, (2000, 2005))
+        self.assertEqual(run.pop_adult_hiv.shape[0], 6)
+        self.assertTrue(np.array_equal(run.births, self.model.births[(2000 - self.model.year_first):(2006 - self.model.year_first)]))
+        with self.assertRaises(ValueError):
+            self.store.open_run(run_id, (1900, 2005))
+        with self.assertRaises(KeyError):
+            self.store.open_run(run_id + 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import numpy as np
+import unittest
+import src.goals_const as CONST
+import src.goals_subnational as Subnational
+from src.goals_model import Model
+
+class Test_TestGoalsSubnational(unittest.TestCase):
+    def test_national_totals(self):
+        xlsx_name = "tests/test-external-clhiv.xlsx"
+        model = Model()
+        model.init_from_xlsx(xlsx_name)
+        model.project(model.year_final)
+
+        sub = Subnational.Subnational(xlsx_name)
+        sub.add_region("north")
+        sub.add_region("south", xlsx_name=xlsx_name, names=('popsize',))
+        totals, regions = sub.project(num_workers=2)
+
+        self.assertEqual(sorted(totals.regions), ["north", "south"])
+        self.assertEqual(regions, {})
+        np.testing.assert_allclose(totals.pop_adult_hiv, 2.0 * model.pop_adult_hiv)
+        np.testing.assert_allclose(totals.births, 2.0 * model.births)
+
+    def test_region_years(self):
+        sub = Subnational.Subnational("tests/test-external-clhiv.xlsx")
+        config = dict(sub.template['config'])
+        config[CONST.CFG_FINAL_YEAR] += 1
+        self.assertRaises(ValueError, sub.add_region, "east", {'config' : config})
+
+if __name__ == "__main__":
+    unittest.main()
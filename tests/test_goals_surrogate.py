@@ -0,0 +1,42 @@
+import numpy as np
+import scipy.stats as stats
+import unittest
+import src.goals_surrogate as Surrogate
+
+## Unit tests for surrogate-assisted calibration, using a quadratic stand-in
+## for the log-posterior so that no projections are needed
+
+class QuadraticFitter:
+    recorder = None
+
+    def __init__(self):
+        self.mode = np.array([0.5, -1.0, 1.5])
+
+    def parameter_names(self):
+        return ['a', 'b', 'c']
+
+    def prior_quantile(self, u):
+        return stats.norm.ppf(u)
+
+    def posterior(self, params):
+        return -((np.asarray(params) - self.mode)**2).sum()
+
+class Test_TestGoalsSurrogate(unittest.TestCase):
+    def test_gp_interpolates(self):
+        X = np.linspace(0.0, 1.0, 8)[:,np.newaxis]
+        y = np.sin(4.0 * X[:,0])
+        gp = Surrogate.GaussianProcess(1)
+        gp.fit(X, y)
+        mu, sd = gp.predict(X)
+        self.assertTrue(np.allclose(mu, y, atol=1e-3))
+        self.assertTrue(np.all(sd < 0.05))
+
+    def test_search_finds_mode(self):
+        fitter = QuadraticFitter()
+        search = Surrogate.SurrogateSearch(fitter, seed=1)
+        p_best, post = search.run(max_evals=60, batch_size=4)
+        self.assertEqual(len(search.y), 60)
+        self.assertTrue(np.allclose(p_best, fitter.mode, atol=0.1))
+
+if __name__ == "__main__":
+    unittest.main()
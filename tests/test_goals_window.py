@@ -0,0 +1,41 @@
+import tempfile
+import numpy as np
+import unittest
+import src.goals_window as Window
+from src.goals_model import Model
+
+class Test_TestGoalsWindow(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.inputs = Model().read_xlsx("tests/test-external-clhiv.xlsx")
+        self.reference = Model()
+        self.reference.init_from_inputs(self.inputs)
+        self.reference.project(self.reference.year_final)
+
+    def test_projection_matches(self):
+        store = Window.OutputStore.from_inputs(None, self.inputs)
+        model = Model()
+        model.init_from_inputs(self.inputs, store.outputs)
+        births = {}
+        year = Window.project_windowed(model, store, model.year_final, 3, lambda year, outputs : births.update({year : outputs['births'].sum()}))
+        self.assertEqual(year, model.year_final)
+        for name in ('pop_adult_hiv', 'deaths_adult_hiv', 'new_infections'):
+            self.assertTrue(np.array_equal(getattr(model, name), getattr(self.reference, name)), name)
+        self.assertEqual(sorted(births), list(range(model.year_first, model.year_final + 1)))
+        self.assertAlmostEqual(births[model.year_final], self.reference.births[-1].sum())
+        store.close()
+
+    def test_evicted_years_on_disk(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = Window.OutputStore(path, 1970, 1980)
+            store.outputs['births'][2] = [1.0, 2.0]
+            store.evict(1970, 1975)
+            self.assertEqual(store.outputs['births'][2].tolist(), [1.0, 2.0])
+            saved = Window.open_outputs(path)
+            self.assertEqual(saved['births'].shape, (11, 2))
+            self.assertEqual(saved['births'][2].tolist(), [1.0, 2.0])
+            del saved
+            store.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,40 @@ class Test_TestMemorySharing(unittest.TestCase):
     def test_births_layout(self):
         births = np.zeros((self.num_years, CONST.N_SEX), dtype=self.dtype, order="F")
         self.assertRaises(RuntimeError, self.proj.share_output_births, births)
+
+    def test_year_time(self):
+        year_time = np.zeros((self.num_years), dtype=self.dtype, order=self.order)
+        try:
+            self.proj.share_output_year_time(year_time)
+        except RuntimeError:
+            self.fail("Unexpected runtime error during share_output_year_time(year_time)")
+
+    def test_year_time_shape(self):
+        year_time = np.zeros((self.num_years + 1), dtype=self.dtype, order=self.order)
+        self.assertRaises(RuntimeError, self.proj.share_output_year_time, year_time)
+
+    def test_adult_art_curr(self):
+        art_num = np.zeros((self.num_years, CONST.N_SEX), dtype=self.dtype, order=self.order)
+        art_prop = np.zeros((self.num_years, CONST.N_SEX), dtype=self.dtype, order=self.order)
+        try:
+            self.proj.share_input_adult_art_curr(art_num, art_prop)
+            art_num[-1,:] = 1000.0
+            self.proj.refresh_input("art_num", self.year_final)
+        except RuntimeError:
+            self.fail("Unexpected runtime error during share_input_adult_art_curr(art_num, art_prop)")
+
+    def test_refresh_input_name(self):
+        self.assertRaises(RuntimeError, self.proj.refresh_input, "births", self.year_first)
+
+    def test_adult_art_curr_shape(self):
+        art_num = np.zeros((CONST.N_SEX, self.num_years), dtype=self.dtype, order=self.order)
+        art_prop = np.zeros((self.num_years, CONST.N_SEX), dtype=self.dtype, order=self.order)
+        self.assertRaises(RuntimeError, self.proj.share_input_adult_art_curr, art_num, art_prop)
+
+    def test_adult_art_curr_layout(self):
+        art_num = np.zeros((self.num_years, CONST.N_SEX), dtype=self.dtype, order=self.order)
+        art_prop = np.zeros((self.num_years, CONST.N_SEX), dtype=self.dtype, order="F")
+        self.assertRaises(RuntimeError, self.proj.share_input_adult_art_curr, art_num, art_prop)
     
 if __name__ == "__main__":
     unittest.main()